@@ -1,37 +1,23 @@
-import json
+import argparse
 
-# Παλιό αρχείο
-old_file_path = "open_orders.json"
-# Νέο αρχείο
-new_file_path = "new_orders.json"
+from state_format import STATE_VERSION, STATE_FORMATS, migrate_state_file
 
-# Φόρτωμα του παλιού JSON
-with open(old_file_path, "r") as f:
-    data = json.load(f)
+# Μεταφορά αρχείων κατάστασης (main_open_orders.json, worker_open_orders.json, ...) στην τρέχουσα έκδοση.
+#   python convert.py main_open_orders.json                  (στο ίδιο αρχείο, με αντίγραφο .bak)
+#   python convert.py open_orders.json new_orders.json       (σε νέο αρχείο / άλλη μορφή, βάσει κατάληξης)
+#   python convert.py main_open_orders.json main_open_orders.msgpack   (JSON -> binary snapshot και αντίστροφα)
+parser = argparse.ArgumentParser(description="Migrate a grid bot state file to the current schema version.")
+parser.add_argument("source", help="State file to migrate.")
+parser.add_argument("destination", nargs="?", help="Output file (default: migrate in place and keep a .bak copy). "
+                                                   f"Format by extension: {', '.join(sorted(STATE_FORMATS))}.")
+parser.add_argument("--kind", choices=("main", "worker"), help="File kind (default: 'worker' if the file name contains 'worker').")
+args = parser.parse_args()
 
-# Έλεγχος αν το "orders" είναι ήδη λίστα
-if isinstance(data["orders"], list):
-    print("Το 'orders' είναι ήδη λίστα. Δεν απαιτείται μετατροπή.")
+from_version, orders = migrate_state_file(args.source, args.destination, args.kind)
+destination = args.destination or args.source
+if from_version == STATE_VERSION and destination == args.source:
+    print(f"Το {args.source} είναι ήδη στην έκδοση {STATE_VERSION} ({orders} παραγγελίες).")
 else:
-    # Μετατροπή του dictionary "orders" σε λίστα
-    data["orders"] = [
-        {
-            "id": order["id"],
-            "symbol": order["symbol"],
-            "price": float(price),  # Το price γίνεται float για συνέπεια
-            "side": order["side"],
-            "status": order["status"],
-            "amount": order["amount"],
-            "remaining": order["remaining"],
-            "datetime": order["datetime"],
-            "timestamp": order["timestamp"],
-        }
-        for price, order in data["orders"].items()
-    ]
-    print("Η μετατροπή του 'orders' σε λίστα ολοκληρώθηκε.")
-
-    # Αποθήκευση στο νέο αρχείο
-    with open(new_file_path, "w") as f:
-        json.dump(data, f, indent=4)
-
-    print(f"Το αρχείο αποθηκεύτηκε στο {new_file_path}.")
+    if from_version != STATE_VERSION:
+        print(f"Η μετατροπή από την έκδοση {from_version} στην {STATE_VERSION} ολοκληρώθηκε.")
+    print(f"Το αρχείο αποθηκεύτηκε στο {destination} ({orders} παραγγελίες).")
@@ -1,34 +1,236 @@
+import atexit
+import bisect
+import gzip
 import ccxt
 import json
 import time
 import os
+import queue
+import shutil
+import signal
+import sys
 import logging
+import logging.handlers
+import threading
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pushover
+from state_format import STATE_VERSION, StateFileError, load_state, save_state
+from trade_archive import TradeArchive
 
 # Configuration
-# Διαδρομές αρχείων συστήματος
-OPEN_ORDERS_FILE = "/opt/python/grid-trading-bot/worker_open_orders.json"
-JSON_PATH = "/opt/python/grid-trading-bot/config.json"
-PAUSE_FLAG_PATH = "/opt/python/grid-trading-bot/pause.flag"
-
-# Για το function cancel_orders_outside_range
+# Διαδρομές αρχείων συστήματος (ο φάκελος ορίζεται ανά λογαριασμό από το grid-supervisor.py)
+BOT_HOME = os.environ.get("GRID_BOT_HOME", "/opt/python/grid-trading-bot")
+OPEN_ORDERS_FILE = os.path.join(BOT_HOME, "worker_open_orders.json")
+JSON_PATH = os.path.join(BOT_HOME, "config.json")
+PAUSE_FLAG_PATH = os.path.join(BOT_HOME, "pause.flag")
+
+# Επιβεβαίωση ακυρώσεων με ασαφή απάντηση: έως MAX_RETRIES ελέγχους ανά ID,
+# με αρχική καθυστέρηση RETRY_DELAY_SECONDS που διπλασιάζεται σε κάθε γύρο
 MAX_RETRIES = 5
-RETRY_DELAY_SECONDS = 2
+RETRY_DELAY_SECONDS = 0.5
+
+# Μέγιστος αριθμός παράλληλων αιτημάτων ακύρωσης (όταν το exchange δεν έχει cancel_orders)
+CANCEL_MAX_WORKERS = 5
+
+# Client order IDs των παραγγελιών του grid: "<bot>-<ζεύγος>-<b|s>-<τιμή σε 1/10000>", π.χ. "ga-XRPUSDT-s-23500".
+# Ο worker και το main bot ("gb") αναγνωρίζουν ως δικές τους μόνο παραγγελίες με αυτά τα προθέματα.
+CLIENT_ORDER_ID_PREFIX = "ga"
+GRID_CLIENT_ORDER_ID_PREFIXES = ("gb", "ga")
+
+# Τοπικό αρχείο γεγονότων παραγγελιών (βλ. trade_archive.py), κοινό με το main bot
+ENABLE_TRADE_ARCHIVE = True
+TRADE_ARCHIVE_DIR = os.path.join(BOT_HOME, "archive")
 
 # Παράμετροι Αποστολής E-mail
 ENABLE_EMAIL_NOTIFICATIONS = True
 ENABLE_PUSH_NOTIFICATIONS = True
 
+# Daemon mode: το script τρέχει συνεχώς αντί για μία προσαρμογή ανά εκτέλεση (cron)
+RUN_AS_DAEMON = os.environ.get("GRID_BOT_DAEMON") == "1"
+DAEMON_INTERVAL_SECONDS = 300
+
+# Metrics σε μορφή Prometheus: HTTP endpoint σε daemon mode, textfile collector σε cron mode
+METRICS_PREFIX = "grid_adjustment"
+METRICS_HTTP_PORT = int(os.environ.get("GRID_BOT_METRICS_PORT", 9102))
+METRICS_TEXTFILE_PATH = os.path.join(BOT_HOME, "metrics", "grid_adjustment.prom")
+
 # Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("/opt/python/grid-trading-bot/grid_adjustment.log"),
+LOG_FILE_PATH = os.path.join(BOT_HOME, "grid_adjustment.log")
+LOG_FORMAT = "text"  # "text" (κλασική μορφή) ή "json" (μία εγγραφή JSON ανά γραμμή)
+LOG_LEVEL = "INFO"
+
+# Περιστροφή του αρχείου log: "size" (στα LOG_MAX_BYTES) ή "time" (κάθε μεσάνυχτα), με LOG_BACKUP_COUNT
+# παλιά αρχεία, συμπιεσμένα με gzip όταν LOG_COMPRESS_ROTATED = True
+LOG_ROTATION = "size"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 7
+LOG_COMPRESS_ROTATED = True
+
+# Επίπεδο logging ανά φάση του adjust_grid_range (βλ. enter_phase), π.χ. {"cancel": "DEBUG"}
+PHASE_LOG_LEVELS = {}
+
+# Όρια μεγέθους για τις συνόψεις παραγγελιών / τιμών που γράφονται στα logs
+LOG_PAYLOAD_MAX_ITEMS = 10
+LOG_PAYLOAD_MAX_CHARS = 1000
+
+# Τα πεδία που έχει κάθε LogRecord, ώστε στο JSON να προστίθενται μόνο όσα δόθηκαν με extra=...
+STANDARD_LOG_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "phase"}
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Μορφοποιεί κάθε εγγραφή ως μία γραμμή JSON, με τη φάση του iteration και τα extra πεδία."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "phase": getattr(record, "phase", None),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_LOG_RECORD_FIELDS:
+                entry[key] = value
+        # Οι εγγραφές από την ουρά (βλ. PreparedQueueHandler) έχουν ήδη μορφοποιημένο το traceback στο exc_text
+        exception = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class PhaseLevelFilter(logging.Filter):
+    """
+    Εφαρμόζει το επίπεδο της τρέχουσας φάσης (PHASE_LOG_LEVELS) πριν από τη μορφοποίηση,
+    ώστε τα μηνύματα που απορρίπτονται να μην κοστίζουν τίποτα.
+    """
+
+    def filter(self, record):
+        record.phase = current_phase
+        level = PHASE_LOG_LEVELS.get(current_phase, LOG_LEVEL)
+        return record.levelno >= logging.getLevelName(level)
+
+
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Βάζει τις εγγραφές σε ουρά για το thread του QueueListener, που κάνει τη μορφοποίηση και το I/O.
+    Στο thread του bot γίνεται μόνο η συγχώνευση του μηνύματος (τα ορίσματα μπορεί να αλλάξουν αργότερα)
+    και του traceback· η φάση και το φίλτρο επιπέδου εφαρμόζονται πριν μπει η εγγραφή στην ουρά.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def compress_rotated_log(source, dest):
+    """Rotator των handlers του log: συμπιέζει το αρχείο που περιστράφηκε σε gzip."""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class LazySummary:
+    """
+    Σύνοψη ενός payload που υπολογίζεται μόνο όταν το μήνυμα γραφτεί πραγματικά
+    (χρήση ως όρισμα %s στο logging, όχι μέσα σε f-string).
+    """
+
+    def __init__(self, func, payload):
+        self.func = func
+        self.payload = payload
+
+    def __str__(self):
+        text = self.func(self.payload)
+        if len(text) > LOG_PAYLOAD_MAX_CHARS:
+            text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}... ({len(text)} chars)"
+        return text
+
+
+def _describe_order(order):
+    if not isinstance(order, dict):
+        return str(order)
+    return f"{order.get('id')}@{order.get('price')} {order.get('side')}/{order.get('status')}"
+
+
+def _describe_orders(orders):
+    items = list(orders.values()) if isinstance(orders, dict) else list(orders or [])
+    buys = sum(1 for order in items if isinstance(order, dict) and order.get("side") == "buy")
+    shown = ", ".join(_describe_order(order) for order in items[:LOG_PAYLOAD_MAX_ITEMS])
+    if len(items) > LOG_PAYLOAD_MAX_ITEMS:
+        shown += f", ... (+{len(items) - LOG_PAYLOAD_MAX_ITEMS} more)"
+    return f"{len(items)} orders (buy={buys}, sell={len(items) - buys}) [{shown}]"
+
+
+def _describe_prices(prices):
+    prices = list(prices or [])
+    if not prices:
+        return "[]"
+    shown = ", ".join(f"{price:.4f}" for price in prices[:LOG_PAYLOAD_MAX_ITEMS])
+    if len(prices) > LOG_PAYLOAD_MAX_ITEMS:
+        shown += f", ... (+{len(prices) - LOG_PAYLOAD_MAX_ITEMS} more)"
+    return f"{len(prices)} levels {min(prices):.4f}..{max(prices):.4f} [{shown}]"
+
+
+def summarize_order(order):
+    return LazySummary(_describe_order, order)
+
+
+def summarize_orders(orders):
+    return LazySummary(_describe_orders, orders)
+
+
+def summarize_prices(prices):
+    return LazySummary(_describe_prices, prices)
+
+
+def setup_logging():
+    """Ρυθμίζει αρχείο log και κονσόλα με τη μορφή LOG_FORMAT και το φίλτρο επιπέδου ανά φάση."""
+    levels = [logging.getLevelName(LOG_LEVEL)] + [logging.getLevelName(level) for level in PHASE_LOG_LEVELS.values()]
+    if LOG_FORMAT == "json":
+        formatter = JsonLogFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    if LOG_ROTATION == "time":
+        file_handler = logging.handlers.TimedRotatingFileHandler(LOG_FILE_PATH, when="midnight", backupCount=LOG_BACKUP_COUNT)
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    if LOG_COMPRESS_ROTATED:
+        file_handler.namer = lambda name: name + ".gz"
+        file_handler.rotator = compress_rotated_log
+
+    handlers = [
+        file_handler,
         logging.StreamHandler()
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Το αρχείο και η κονσόλα γράφονται από το thread του listener, ώστε η καθυστέρηση του δίσκου
+    # να μην επιβαρύνει το iteration. Το φίλτρο ανά φάση τρέχει πριν από την ουρά, με τη φάση της στιγμής του log.
+    log_queue = queue.SimpleQueue()
+    queue_handler = PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(PhaseLevelFilter())
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)  # Γράφει ό,τι έχει μείνει στην ουρά πριν από την έξοδο
+
+    # Με SIGTERM (π.χ. από τον grid-supervisor.py) η έξοδος γίνεται με SystemExit, ώστε να τρέξει το atexit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Το root logger δέχεται το χαμηλότερο επίπεδο, το φίλτρο αποφασίζει ανά φάση
+    logging.basicConfig(level=min(levels), handlers=[queue_handler])
+
+
+setup_logging()
 
 # Load API keys
 def load_keys():
@@ -48,17 +250,11 @@ def load_keys():
             email_sender = keys.get("EMAIL_SENDER")
             email_recipient = keys.get("EMAIL_RECIPIENT")
 
-            # Ρυθμίσεις Grid Configuration
+            # Ρυθμίσεις Grid Configuration: ένα dictionary (ένα ζεύγος) ή λίστα από dictionaries (πολλά ζεύγη)
             grid_config = keys.get("GRID_CONFIG", {})
-            exchange_name = grid_config.get("EXCHANGE_NAME")
-            symbol = grid_config.get("SYMBOL")
-            crypto_symbol = grid_config.get("CRYPTO_SYMBOL")
-            crypto_currency = grid_config.get("CRYPTO_CURRENCY")
-            grid_size = grid_config.get("GRID_SIZE")
-            amount = grid_config.get("AMOUNT")
-            grid_count = grid_config.get("GRID_COUNT")
-            max_orders = grid_config.get("MAX_ORDERS")
-            
+            grid_configs = grid_config if isinstance(grid_config, list) else [grid_config]
+            exchange_name = grid_configs[0].get("EXCHANGE_NAME") if grid_configs else None
+
             # Έλεγχος για κενές τιμές
             missing_keys = []
             if not api_key or not api_secret:
@@ -73,25 +269,280 @@ def load_keys():
                 missing_keys.append("EMAIL_SENDER")
             if not email_recipient:
                 missing_keys.append("EMAIL_RECIPIENT")
-            if not exchange_name or not symbol or not crypto_symbol or not crypto_currency:
-                missing_keys.extend(["EXCHANGE_NAME", "SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY"])
-            if grid_size is None or amount is None or grid_count is None or max_orders is None:
-                missing_keys.extend(["GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS"])
+            if not grid_configs:
+                missing_keys.append("GRID_CONFIG")
+            for index, grid in enumerate(grid_configs):
+                prefix = f"GRID_CONFIG[{index}]." if isinstance(grid_config, list) else ""
+                if not all(grid.get(key) for key in ("EXCHANGE_NAME", "SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY")):
+                    missing_keys.extend(prefix + key for key in ["EXCHANGE_NAME", "SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY"])
+                if any(grid.get(key) is None for key in ("GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS")):
+                    missing_keys.extend(prefix + key for key in ["GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS"])
+                elif any(isinstance(grid[key], bool) or not isinstance(grid[key], (int, float)) or grid[key] <= 0
+                         for key in ("GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS")):
+                    raise ValueError(f"{prefix}GRID_SIZE, AMOUNT, GRID_COUNT and MAX_ORDERS must be positive numbers.")
             
             if missing_keys:
                 raise ValueError(f"Missing keys in the JSON file: {', '.join(missing_keys)}")
 
+            # Όλα τα grids μοιράζονται την ίδια σύνδεση, άρα και το ίδιο exchange
+            if len({grid.get("EXCHANGE_NAME") for grid in grid_configs}) > 1:
+                raise ValueError("All GRID_CONFIG entries must use the same EXCHANGE_NAME.")
+
             return (api_key, api_secret, sendgrid_api_key, pushover_token, pushover_user, email_sender, email_recipient,
-                    exchange_name, symbol, crypto_symbol, crypto_currency, grid_size, amount, grid_count, max_orders)
+                    exchange_name, grid_configs)
     except FileNotFoundError:
         raise FileNotFoundError(f"The specified JSON file '{JSON_PATH}' was not found.")
     except json.JSONDecodeError:
         raise ValueError(f"The JSON file '{JSON_PATH}' is not properly formatted.")
       
 
+def assign_orders_files(grid_configs, default_file_path):
+    """
+    Ορίζει σε κάθε grid το δικό του αρχείο παραγγελιών του worker (αν δεν έχει δοθεί WORKER_ORDERS_FILE).
+    Με ένα μόνο grid κρατάμε το αρχικό όνομα αρχείου.
+    """
+    base, extension = os.path.splitext(default_file_path)
+    for grid in grid_configs:
+        if len(grid_configs) == 1:
+            grid.setdefault("WORKER_ORDERS_FILE", default_file_path)
+        else:
+            grid.setdefault("WORKER_ORDERS_FILE", f"{base}_{grid['SYMBOL'].replace('/', '_')}{extension}")
+    return grid_configs
+
+
+def activate_grid(grid):
+    """
+    Φορτώνει τις ρυθμίσεις ενός grid στις global μεταβλητές (SYMBOL, GRID_SIZE, ...),
+    ώστε οι υπόλοιπες συναρτήσεις να δουλεύουν για το συγκεκριμένο ζεύγος.
+    """
+    global SYMBOL, CRYPTO_SYMBOL, CRYPTO_CURRENCY, GRID_SIZE, AMOUNT, GRID_COUNT, MAX_ORDERS, OPEN_ORDERS_FILE
+    SYMBOL = grid["SYMBOL"]
+    CRYPTO_SYMBOL = grid["CRYPTO_SYMBOL"]
+    CRYPTO_CURRENCY = grid["CRYPTO_CURRENCY"]
+    GRID_SIZE = grid["GRID_SIZE"]
+    AMOUNT = grid["AMOUNT"]
+    GRID_COUNT = grid["GRID_COUNT"]
+    MAX_ORDERS = grid["MAX_ORDERS"]
+    OPEN_ORDERS_FILE = grid["WORKER_ORDERS_FILE"]
+
+
 # Load configuration from the JSON file
 (API_KEY, API_SECRET, SENDGRID_API_KEY, PUSHOVER_TOKEN, PUSHOVER_USER, EMAIL_SENDER, EMAIL_RECIPIENT,
- EXCHANGE_NAME, SYMBOL, CRYPTO_SYMBOL, CRYPTO_CURRENCY, GRID_SIZE, AMOUNT, GRID_COUNT, MAX_ORDERS) = load_keys()
+ EXCHANGE_NAME, GRID_CONFIGS) = load_keys()
+GRID_CONFIGS = assign_orders_files(GRID_CONFIGS, OPEN_ORDERS_FILE)
+
+# Το πρώτο grid είναι ενεργό by default (συμβατότητα με single-symbol χρήση)
+activate_grid(GRID_CONFIGS[0])
+
+
+# Hot reload του config.json σε daemon mode: στην αρχή κάθε γύρου ελέγχεται αν άλλαξε το αρχείο και, αν είναι
+# έγκυρο, εφαρμόζονται οι CONFIG_RELOADABLE_KEYS κάθε ζεύγους. Αλλαγές σε κλειδιά API, exchange ή ζεύγη θέλουν επανεκκίνηση.
+CONFIG_RELOADABLE_KEYS = ("GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS")
+
+
+def config_file_signature():
+    """(mtime, μέγεθος) του config.json, για να εντοπίζονται οι αλλαγές χωρίς να διαβάζεται το αρχείο."""
+    try:
+        stat = os.stat(JSON_PATH)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+config_signature = config_file_signature()
+
+
+def reload_config_if_changed():
+    """
+    Εφαρμόζει στα GRID_CONFIGS τις νέες παραμέτρους από το config.json, αν άλλαξε από τον προηγούμενο γύρο.
+    Ένα άκυρο αρχείο αγνοείται (οι τρέχουσες ρυθμίσεις μένουν) μέχρι την επόμενη αλλαγή του.
+    Επιστρέφει τα σύμβολα των grids που άλλαξαν.
+    """
+    global config_signature
+    signature = config_file_signature()
+    if signature is None or signature == config_signature:
+        return []
+    config_signature = signature
+
+    try:
+        (api_key, api_secret, _, _, _, _, _, exchange_name, grid_configs) = load_keys()
+    except (OSError, ValueError) as e:
+        logging.error(f"Ignoring changed config.json, keeping the current settings: {e}")
+        METRICS.inc("config_reloads_total", outcome="invalid")
+        return []
+
+    identity_keys = ("SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY")
+    if ((api_key, api_secret, exchange_name) != (API_KEY, API_SECRET, EXCHANGE_NAME)
+            or sorted(tuple(grid.get(key) for key in identity_keys) for grid in grid_configs)
+            != sorted(tuple(grid.get(key) for key in identity_keys) for grid in GRID_CONFIGS)):
+        logging.warning("config.json changes to API keys, EXCHANGE_NAME or the traded pairs need a restart. "
+                        "Applying only the grid parameters of the existing pairs.")
+
+    new_grids = {grid["SYMBOL"]: grid for grid in grid_configs}
+    changed = []
+    for grid in GRID_CONFIGS:
+        new_grid = new_grids.get(grid["SYMBOL"], {})
+        changes = {key: (grid.get(key), new_grid.get(key)) for key in CONFIG_RELOADABLE_KEYS
+                   if new_grid and grid.get(key) != new_grid.get(key)}
+        if not changes:
+            continue
+        grid.update((key, new) for key, (_, new) in changes.items())
+        logging.info(f"Reloaded config for {grid['SYMBOL']}: " + ", ".join(f"{key} {old} -> {new}" for key, (old, new) in changes.items()))
+        changed.append(grid["SYMBOL"])
+
+    METRICS.inc("config_reloads_total", outcome="applied" if changed else "unchanged")
+    return changed
+
+
+
+
+# ---------------------- Metrics ----------------------
+# Ορισμοί metrics: όνομα -> (τύπος, περιγραφή)
+METRIC_DEFINITIONS = {
+    "api_calls_total": ("counter", "Exchange API calls per method."),
+    "api_request_weight_total": ("counter", "Exchange request weight consumed per method."),
+    "api_errors_total": ("counter", "Exchange API errors per method and error class."),
+    "api_call_duration_seconds": ("histogram", "Exchange API call latency per method."),
+    "api_short_circuited_total": ("counter", "Exchange API calls skipped while the circuit was open per method."),
+    "circuit_trips_total": ("counter", "Times the exchange circuit breaker opened."),
+    "circuit_open": ("gauge", "1 while the exchange circuit breaker is open."),
+    "config_reloads_total": ("counter", "config.json changes detected in daemon mode per outcome."),
+    "state_saves_total": ("counter", "Orders file saves per outcome (written, skipped when unchanged, failed)."),
+    "phase_duration_seconds": ("histogram", "Duration of each phase of adjust_grid_range."),
+    "iteration_duration_seconds": ("histogram", "Duration of a full grid range adjustment."),
+    "iterations_total": ("counter", "Grid range adjustments per outcome."),
+    "last_iteration_timestamp_seconds": ("gauge", "Unix time of the last completed adjustment."),
+    "orders_placed_total": ("counter", "Orders placed per side and reason."),
+    "orders_canceled_total": ("counter", "Orders canceled per reason."),
+    "orders_amended_total": ("counter", "Orders moved with a single edit request per side."),
+    "out_of_range_orders": ("gauge", "Orders found outside the grid range in the last adjustment."),
+    "excess_orders": ("gauge", "Orders above MAX_ORDERS in the last adjustment."),
+    "open_orders": ("gauge", "Open orders on the exchange per side."),
+}
+
+# Default όρια ιστογράμματος (σε δευτερόλεπτα) για φάσεις και iterations
+METRIC_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class MetricsRegistry:
+    """
+    Απλό registry για counters, gauges και histograms με labels,
+    που αποδίδεται σε Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix, definitions):
+        self.prefix = prefix
+        self.definitions = definitions
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.samples.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.samples.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, buckets=METRIC_DURATION_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.samples.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for name, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{name}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.samples.items()):
+                metric_type, help_text = self.definitions.get(name, ("untyped", name))
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in sorted(series.items()):
+                    if metric_type != "histogram":
+                        lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(value["buckets"], value["counts"]):
+                        lines.append(f"{full_name}_bucket{self._format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{full_name}_sum{self._format_labels(labels)} {value['sum']}")
+                    lines.append(f"{full_name}_count{self._format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(METRICS_PREFIX, METRIC_DEFINITIONS)
+
+# Τρέχουσα φάση του iteration και χρονική στιγμή έναρξής της
+current_phase = None
+current_phase_started = None
+
+
+def enter_phase(phase):
+    """
+    Κλείνει την τρέχουσα φάση του adjust_grid_range (καταγράφοντας τη διάρκειά της) και ξεκινά τη νέα.
+    Με phase=None απλώς κλείνει την τρέχουσα.
+    """
+    global current_phase, current_phase_started
+    now = time.perf_counter()
+    if current_phase is not None:
+        METRICS.observe("phase_duration_seconds", now - current_phase_started, phase=current_phase)
+    current_phase, current_phase_started = phase, now
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Χωρίς access log για κάθε scrape
+
+
+def start_metrics_server(port):
+    """Ξεκινά HTTP endpoint /metrics σε background thread (μόνο σε localhost)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics endpoint listening on http://127.0.0.1:{port}/metrics")
+    return server
+
+
+def write_metrics_textfile(file_path):
+    """Γράφει τα metrics σε αρχείο για τον textfile collector του node_exporter (cron mode)."""
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_file_path = file_path + ".tmp"
+        with open(temp_file_path, "w") as f:
+            f.write(METRICS.render())
+        os.replace(temp_file_path, file_path)
+    except Exception as e:
+        logging.error(f"Failed to write metrics to {file_path}: {e}")
 
 
 
@@ -111,6 +562,190 @@ def remove_pause_flag():
 
         
 
+# Request weight ανά μέθοδο API (τιμές Binance spot, με symbol). Όσες λείπουν μετράνε 1.
+API_CALL_WEIGHTS = {
+    "load_markets": 20,
+    "fetch_ticker": 2,
+    "fetch_balance": 20,
+    "fetch_open_orders": 6,
+    "fetch_order": 4,
+    "fetch_order_status": 4,
+    "fetch_my_trades": 20,
+}
+
+# Προθέματα μεθόδων του ccxt που κάνουν πραγματικά αιτήματα στο API
+API_METHOD_PREFIXES = ("fetch_", "create_", "cancel_", "edit_", "load_markets")
+
+# Όρια (σε δευτερόλεπτα) για το ιστόγραμμα latency των κλήσεων
+API_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Circuit breaker: ανοίγει όταν από τις τελευταίες CIRCUIT_WINDOW_SIZE κλήσεις (τουλάχιστον CIRCUIT_MIN_CALLS)
+# το ποσοστό αποτυχιών (σφάλμα δικτύου / διαθεσιμότητας ή κλήση πιο αργή από CIRCUIT_SLOW_CALL_SECONDS)
+# φτάσει το CIRCUIT_FAILURE_RATIO. Όσο είναι ανοιχτός, οι κλήσεις αποτυγχάνουν αμέσως (εκτός από τις ακυρώσεις)
+# και μετά από CIRCUIT_OPEN_SECONDS ένα fetch_time ελέγχει αν το exchange επανήλθε (διπλάσια αναμονή αν όχι).
+CIRCUIT_WINDOW_SIZE = 20
+CIRCUIT_MIN_CALLS = 5
+CIRCUIT_FAILURE_RATIO = 0.5
+CIRCUIT_SLOW_CALL_SECONDS = 5.0
+CIRCUIT_OPEN_SECONDS = 30
+CIRCUIT_MAX_OPEN_SECONDS = 300
+CIRCUIT_ESSENTIAL_PREFIXES = ("cancel_",)
+
+
+class ExchangeCircuitOpen(Exception):
+    """
+    Η κλήση δεν έγινε γιατί ο circuit breaker του exchange είναι ανοιχτός. Δεν είναι σφάλμα δικτύου της ίδιας
+    της κλήσης, οπότε δεν κληρονομεί από το ccxt.NetworkError (δεν την πιάνουν οι χειρισμοί επανάληψης).
+    """
+
+class InstrumentedExchange:
+    """
+    Proxy γύρω από το ccxt exchange που καταγράφει για κάθε μέθοδο API
+    πλήθος κλήσεων, request weight, ιστόγραμμα latency και κλάσεις σφαλμάτων,
+    και κόβει τις κλήσεις με circuit breaker όσο το exchange δεν αποκρίνεται.
+    Όλα τα υπόλοιπα attributes προωθούνται αυτούσια στο exchange.
+    """
+
+    def __init__(self, exchange):
+        self._exchange = exchange
+        self.call_stats = {}
+        self._lock = threading.Lock()  # Οι ακυρώσεις μπορεί να γίνονται παράλληλα από πολλά threads
+        self._outcomes = deque(maxlen=CIRCUIT_WINDOW_SIZE)  # True για κάθε αποτυχημένη ή αργή κλήση
+        self._open_until = None  # Ανοιχτό κύκλωμα: μέχρι πότε κόβονται οι κλήσεις
+        self._open_seconds = CIRCUIT_OPEN_SECONDS
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if callable(attr) and name.startswith(API_METHOD_PREFIXES):
+            return self._instrument(name, attr)
+        return attr
+
+    def _instrument(self, name, method):
+        def instrumented(*args, **kwargs):
+            if not name.startswith(CIRCUIT_ESSENTIAL_PREFIXES) and not self.is_available():
+                METRICS.inc("api_short_circuited_total", method=name)
+                raise ExchangeCircuitOpen(f"{name} skipped: {EXCHANGE_NAME} circuit is open")
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self._record(name, elapsed, error=type(e).__name__)
+                self._record_outcome(isinstance(e, ccxt.NetworkError) or elapsed > CIRCUIT_SLOW_CALL_SECONDS)
+                raise
+            elapsed = time.perf_counter() - start
+            self._record(name, elapsed)
+            self._record_outcome(elapsed > CIRCUIT_SLOW_CALL_SECONDS)
+            return result
+        return instrumented
+
+    def _record_outcome(self, failed):
+        """Καταγράφει την έκβαση μιας κλήσης στο παράθυρο του circuit breaker και τον ανοίγει αν χρειάζεται."""
+        with self._lock:
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if self._open_until is not None or len(self._outcomes) < CIRCUIT_MIN_CALLS:
+                return
+            if failures / len(self._outcomes) < CIRCUIT_FAILURE_RATIO:
+                return
+            self._open_until = time.time() + self._open_seconds
+        logging.warning(
+            f"[API] Circuit opened: {failures}/{len(self._outcomes)} recent calls to {EXCHANGE_NAME} failed or were slow. "
+            f"Pausing calls for {self._open_seconds}s."
+        )
+        METRICS.inc("circuit_trips_total")
+        METRICS.set("circuit_open", 1)
+
+    def is_available(self):
+        """
+        True αν το κύκλωμα είναι κλειστό. Αν είναι ανοιχτό και έληξε η αναμονή, κάνει ένα φθηνό fetch_time
+        (health probe): αν πετύχει το κύκλωμα κλείνει, αλλιώς μένει ανοιχτό με διπλάσια αναμονή.
+        """
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if time.time() < self._open_until:
+                return False
+            # Μόνο ένα thread κάνει το probe· τα υπόλοιπα βλέπουν το κύκλωμα ανοιχτό μέχρι να τελειώσει
+            self._open_until = time.time() + self._open_seconds
+
+        start = time.perf_counter()
+        try:
+            self._exchange.fetch_time()
+            healthy = time.perf_counter() - start <= CIRCUIT_SLOW_CALL_SECONDS
+            self._record("fetch_time", time.perf_counter() - start)
+        except Exception as e:
+            healthy = False
+            self._record("fetch_time", time.perf_counter() - start, error=type(e).__name__)
+
+        with self._lock:
+            if healthy:
+                self._open_until = None
+                self._open_seconds = CIRCUIT_OPEN_SECONDS
+                self._outcomes.clear()
+            else:
+                self._open_seconds = min(self._open_seconds * 2, CIRCUIT_MAX_OPEN_SECONDS)
+                self._open_until = time.time() + self._open_seconds
+        if healthy:
+            logging.info(f"[API] Circuit closed: {EXCHANGE_NAME} is responding again.")
+            METRICS.set("circuit_open", 0)
+        else:
+            logging.warning(f"[API] Health probe failed. {EXCHANGE_NAME} circuit stays open for {self._open_seconds}s.")
+        return healthy
+
+    def _record(self, name, elapsed, error=None):
+        bucket = next((i for i, bound in enumerate(API_LATENCY_BUCKETS) if elapsed <= bound), len(API_LATENCY_BUCKETS))
+        with self._lock:
+            stats = self.call_stats.get(name)
+            if stats is None:
+                stats = self.call_stats[name] = {
+                    "calls": 0,
+                    "weight": 0,
+                    "latency_sum": 0.0,
+                    "latency_max": 0.0,
+                    "buckets": [0] * (len(API_LATENCY_BUCKETS) + 1),
+                    "errors": {},
+                }
+            stats["calls"] += 1
+            stats["weight"] += API_CALL_WEIGHTS.get(name, 1)
+            stats["latency_sum"] += elapsed
+            stats["latency_max"] = max(stats["latency_max"], elapsed)
+            stats["buckets"][bucket] += 1
+            if error:
+                stats["errors"][error] = stats["errors"].get(error, 0) + 1
+
+        METRICS.inc("api_calls_total", method=name)
+        METRICS.inc("api_request_weight_total", API_CALL_WEIGHTS.get(name, 1), method=name)
+        METRICS.observe("api_call_duration_seconds", elapsed, buckets=API_LATENCY_BUCKETS, method=name)
+        if error:
+            METRICS.inc("api_errors_total", method=name, error=error)
+
+    def reset_call_stats(self):
+        self.call_stats = {}
+
+    def log_call_summary(self, label="iteration", reset=True):
+        """
+        Καταγράφει σύνοψη των κλήσεων API (ανά μέθοδο, ταξινομημένες κατά weight).
+        """
+        total_calls = sum(s["calls"] for s in self.call_stats.values())
+        total_weight = sum(s["weight"] for s in self.call_stats.values())
+        total_errors = sum(sum(s["errors"].values()) for s in self.call_stats.values())
+        logging.info(f"[API] {label} summary: {total_calls} calls, weight {total_weight}, errors {total_errors}")
+
+        bucket_labels = [f"<={bound}s" for bound in API_LATENCY_BUCKETS] + [f">{API_LATENCY_BUCKETS[-1]}s"]
+        for name, s in sorted(self.call_stats.items(), key=lambda item: item[1]["weight"], reverse=True):
+            histogram = ", ".join(f"{bucket_label}: {count}" for bucket_label, count in zip(bucket_labels, s["buckets"]) if count)
+            logging.info(
+                f"[API] {name}: calls={s['calls']} weight={s['weight']} "
+                f"avg={s['latency_sum'] / s['calls']:.3f}s max={s['latency_max']:.3f}s "
+                f"latency={{{histogram}}} errors={s['errors'] or '{}'}"
+            )
+
+        if reset:
+            self.reset_call_stats()
+
+
+
 # Initialize exchange
 def initialize_exchange():
     try:
@@ -121,6 +756,7 @@ def initialize_exchange():
         })
         # Testnet ή Production
         exchange.set_sandbox_mode(False)
+        exchange = InstrumentedExchange(exchange)
         exchange.load_markets()  # <--- load markets for safety
         logging.info(f"Connected to {EXCHANGE_NAME.upper()} - Markets loaded: {len(exchange.markets)}")
         return exchange
@@ -158,155 +794,223 @@ def send_push_notification(message, log_to_file=True):
             
 
 
+class OrderBook(MutableMapping):
+    """
+    Βιβλίο παραγγελιών τιμή -> παραγγελία (συμπεριφέρεται όπως το dict που χρησιμοποιούσαμε),
+    με δευτερεύον ευρετήριο ID -> τιμή που ενημερώνεται σε κάθε αλλαγή,
+    ώστε η αναζήτηση και η αφαίρεση με βάση το ID να γίνονται σε O(1).
+    """
+
+    def __init__(self, orders=None):
+        self._orders = {}
+        self._prices_by_id = {}
+        if orders:
+            self.update(orders)
+
+    def __getitem__(self, price):
+        return self._orders[price]
+
+    def __setitem__(self, price, order):
+        if price in self._orders:
+            self._unindex(price, self._orders[price])
+        self._orders[price] = order
+        order_id = order.get("id") if isinstance(order, dict) else None
+        if order_id is not None:
+            self._prices_by_id[str(order_id)] = price
+
+    def __delitem__(self, price):
+        self._unindex(price, self._orders.pop(price))
+
+    def __iter__(self):
+        return iter(self._orders)
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __repr__(self):
+        return f"OrderBook({self._orders!r})"
+
+    def _unindex(self, price, order):
+        order_id = order.get("id") if isinstance(order, dict) else None
+        if order_id is not None and self._prices_by_id.get(str(order_id)) == price:
+            del self._prices_by_id[str(order_id)]
+
+    def price_of(self, order_id):
+        """Η τιμή (κλειδί) της παραγγελίας με το δοσμένο ID, ή None."""
+        return self._prices_by_id.get(str(order_id))
+
+    def get_by_id(self, order_id):
+        price = self.price_of(order_id)
+        return None if price is None else self._orders[price]
+
+    def pop_by_id(self, order_id):
+        """Αφαιρεί και επιστρέφει την παραγγελία με το δοσμένο ID (None αν δεν υπάρχει)."""
+        price = self.price_of(order_id)
+        return None if price is None else self.pop(price)
+
+
+
+
 # Fetch open orders from exchange
 def fetch_open_orders(exchange):
     return exchange.fetch_open_orders(SYMBOL)
 
 
+def client_order_id_for(side, price):
+    """Το ντετερμινιστικό client order ID του επιπέδου (bot, ζεύγος, πλευρά, τιμή) στο ενεργό grid."""
+    market = "".join(c for c in SYMBOL if c.isalnum())
+    return f"{CLIENT_ORDER_ID_PREFIX}-{market}-{side[0]}-{int(round(price * 10000))}"
+
 
+def parse_client_order_id(client_order_id):
+    """
+    Αναλύει ένα client order ID των bots για το ενεργό ζεύγος. Επιστρέφει (bot, side, price),
+    ή None αν η παραγγελία δεν τοποθετήθηκε από τα bots (άλλο εργαλείο, χειροκίνητη, άλλο ζεύγος).
+    """
+    parts = (client_order_id or "").split("-")
+    market = "".join(c for c in SYMBOL if c.isalnum())
+    if len(parts) != 4 or parts[0] not in GRID_CLIENT_ORDER_ID_PREFIXES or parts[1] != market:
+        return None
+    if parts[2] not in ("b", "s") or not parts[3].isdigit():
+        return None
+    return parts[0], "buy" if parts[2] == "b" else "sell", int(parts[3]) / 10000
 
-# Calculate grid levels
-def calculate_grid_levels(current_price, grid_size, grid_count):
-    buy_prices = [round(current_price - grid_size * i, 4) for i in range(1, grid_count + 1)]
-    sell_prices = [round(current_price + grid_size * i, 4) for i in range(1, grid_count + 1)]
 
-    logging.info(f"Adjusting grid dynamically...")
-    logging.info(f"Adjusted buy orders: {buy_prices}")
-    logging.info(f"Adjusted sell orders: {sell_prices}")
+# Οι παραγγελίες όπως είναι σε κάθε αρχείο του worker (από την τελευταία φόρτωση ή αποθήκευση). Το βιβλίο
+# ξαναχτίζεται από το exchange σε κάθε εκτέλεση, οπότε η αποθήκευση συγκρίνει με αυτές για να παραλείψει την εγγραφή.
+SAVED_ORDERS = {}
 
-    return {"buy": buy_prices, "sell": sell_prices}
 
+def load_known_order_ids(file_path):
+    """Τα IDs των παραγγελιών που αποθήκευσε ο worker στην προηγούμενη εκτέλεση (κενό αν δεν υπάρχει αρχείο)."""
+    try:
+        orders, data = load_state(file_path)
+    except (FileNotFoundError, StateFileError):
+        SAVED_ORDERS.pop(file_path, None)
+        return set()
+    # Ένα αρχείο παλαιότερης έκδοσης ξαναγράφεται στην επόμενη αποθήκευση, ακόμη κι αν οι παραγγελίες δεν άλλαξαν
+    if data.get("version") == STATE_VERSION:
+        SAVED_ORDERS[file_path] = orders
+    else:
+        SAVED_ORDERS.pop(file_path, None)
+    return {order.get("id") for order in orders.values() if isinstance(order, dict)}
 
 
-# Cancel orders outside range
-def cancel_orders_outside_range(exchange, orders_to_cancel):
-    canceled_order_ids = []
-    for order in orders_to_cancel:
+
+
+def cancel_response_status(response):
+    """Η κατάσταση μιας ακύρωσης από την απάντηση του exchange: "canceled" ή "unknown"."""
+    status = response.get('status') if isinstance(response, dict) else None
+    return "canceled" if status in ("canceled", "cancelled") else "unknown"
+
+
+def submit_cancels(exchange, order_ids):
+    """
+    Υποβάλλει τις ακυρώσεις (ένα αίτημα cancel_orders όπου υποστηρίζεται, αλλιώς παράλληλα cancel_order)
+    και επιστρέφει ID -> κατάσταση σύμφωνα με την απάντηση: "canceled" όταν η απάντηση το επιβεβαιώνει,
+    "failed" όταν το exchange απέρριψε την ακύρωση και "unknown" όταν η απάντηση δεν είναι σαφής
+    (timeout, παραγγελία που δεν βρέθηκε, απάντηση χωρίς status).
+    """
+    if exchange.has.get("cancelOrders"):
         try:
-            exchange.cancel_order(order['id'], SYMBOL)
-            logging.info(f"Canceled order | ID: {order['id']} | Price: {order['price']} | Side: {order['side']}")
-            canceled_order_ids.append(order['id'])
+            responses = exchange.cancel_orders(order_ids, SYMBOL)
+            by_id = {str(r.get('id')): r for r in responses or [] if isinstance(r, dict)}
+            return {order_id: cancel_response_status(by_id.get(str(order_id))) for order_id in order_ids}
+        except ccxt.NetworkError as e:
+            logging.warning(f"Batch cancel of {len(order_ids)} orders got no clear response: {e}.")
+            return {order_id: "unknown" for order_id in order_ids}
         except Exception as e:
-            logging.error(f"Failed to cancel order ID {order['id']}: {e}")
-
-    # Μετά την ακύρωση, κάνε loop για να δεις αν πράγματι εξαφανίστηκαν
-    if canceled_order_ids:
-        for _ in range(MAX_RETRIES):
-            open_orders = exchange.fetch_open_orders(SYMBOL)
-            # Ελεγξε αν οι canceled_order_ids υπάρχουν ακόμα
-            still_visible = []
-            for order_id in canceled_order_ids:
-                if any(o for o in open_orders if o.get('id') == order_id):
-                    still_visible.append(order_id)
-
-            if not still_visible:
-                logging.info("All canceled orders have disappeared from open_orders.")
-                
-                #open_orders = exchange.fetch_open_orders(SYMBOL)
-                #logging.info(f"Refetched open orders after confirming cancellations. Found {len(open_orders)} orders.")
-                
-                
-                break
-
-            logging.info(f"Canceled orders {still_visible} still present. Retrying in {RETRY_DELAY_SECONDS}s...")
-            time.sleep(RETRY_DELAY_SECONDS)
-        else:
-            # Αν φτάσουμε εδώ, σημαίνει ότι μετά από MAX_RETRIES, κάποια canceled orders
-            # δεν έχουν εμφανιστεί ως ακυρωμένες στο fetch_open_orders().
-            logging.warning(f"Canceled orders still present after {MAX_RETRIES} retries: {still_visible}")
+            logging.warning(f"Batch cancel of {len(order_ids)} orders failed: {e}. Canceling one by one.")
 
-    return canceled_order_ids
+    def cancel_one(order_id):
+        try:
+            return cancel_response_status(exchange.cancel_order(order_id, SYMBOL))
+        except (ccxt.NetworkError, ccxt.OrderNotFound) as e:
+            logging.warning(f"Cancel of order ID {order_id} is ambiguous: {e}")
+            return "unknown"
+        except Exception as e:
+            logging.error(f"Failed to cancel order ID {order_id}: {e}")
+            return "failed"
 
+    with ThreadPoolExecutor(max_workers=min(CANCEL_MAX_WORKERS, len(order_ids))) as pool:
+        return dict(zip(order_ids, pool.map(cancel_one, order_ids)))
 
 
-def filter_orders_outside_grid(open_orders, grid_levels, tolerance=0.01):
+def confirm_cancels(exchange, order_ids):
     """
-    Επιστρέφει τις παραγγελίες που είναι εκτός των επιτρεπτών τιμών στο grid, με ανοχή.
+    Επιβεβαιώνει ακυρώσεις με ασαφή απάντηση με στοχευμένο fetch_order ανά ID και εκθετική καθυστέρηση
+    (χωρίς λήψη όλων των ανοιχτών παραγγελιών). Επιστρέφει τα IDs που βρέθηκαν ακυρωμένα.
     """
-    orders_to_cancel = []
-
-    for order in open_orders:
-        price = float(order["price"])
-        side = order["side"].lower()
+    confirmed = []
+    pending = list(order_ids)
+    delay = RETRY_DELAY_SECONDS
+    for attempt in range(MAX_RETRIES):
+        still_pending = []
+        for order_id in pending:
+            try:
+                status = exchange.fetch_order(order_id, SYMBOL).get('status')
+            except Exception as e:
+                logging.debug("Could not fetch order %s to confirm cancel: %s", order_id, e)
+                status = None
 
-        if side == "buy":
-            if not any(abs(price - grid_price) <= tolerance for grid_price in grid_levels["buy"]):
-                orders_to_cancel.append(order)
-        elif side == "sell":
-            if not any(abs(price - grid_price) <= tolerance for grid_price in grid_levels["sell"]):
-                orders_to_cancel.append(order)
+            if status in ("canceled", "cancelled"):
+                confirmed.append(order_id)
+            elif status == "closed":
+                logging.warning(f"Order ID {order_id} was filled before it could be canceled.")
+            else:
+                still_pending.append(order_id)
 
-    return orders_to_cancel
+        pending = still_pending
+        if not pending:
+            break
+        if attempt < MAX_RETRIES - 1:
+            logging.info("Cancel of orders %s not confirmed yet. Retrying in %ss...", pending, delay)
+            time.sleep(delay)
+            delay *= 2
+    else:
+        logging.warning(f"Cancel of orders {pending} not confirmed after {MAX_RETRIES} checks.")
 
+    return confirmed
 
 
-# Place new orders
-def place_new_orders(exchange, grid_levels, existing_prices, max_orders):
+def cancel_orders_batch(exchange, orders):
     """
-    Τοποθετεί νέες παραγγελίες με σεβασμό στο max_orders.
+    Ακυρώνει πολλές παραγγελίες μαζί. Η απάντηση κάθε ακύρωσης θεωρείται αξιόπιστη· μόνο οι ασαφείς
+    επιβεβαιώνονται με confirm_cancels(). Επιστρέφει τα IDs που ακυρώθηκαν.
     """
-    new_orders = {}
-    total_orders = len(existing_prices)
+    if not orders:
+        return []
+    order_ids = [order['id'] for order in orders]
 
-    for side, levels in {"buy": grid_levels["buy"], "sell": grid_levels["sell"]}.items():
-        for price in levels:
-            if total_orders >= max_orders:
-                logging.info("Reached maximum number of orders. Stopping further order placement.")
-                return new_orders
+    statuses = submit_cancels(exchange, order_ids)
+    canceled = {order_id for order_id, status in statuses.items() if status == "canceled"}
+    ambiguous = [order_id for order_id, status in statuses.items() if status == "unknown"]
+    if ambiguous:
+        canceled.update(confirm_cancels(exchange, ambiguous))
 
-            if round(price, 4) not in existing_prices:
-                try:
-                    if side == 'buy':
-                        order = exchange.create_limit_buy_order(SYMBOL, AMOUNT, price)
-                    else:
-                        order = exchange.create_limit_sell_order(SYMBOL, AMOUNT, price)
-
-                    new_orders[price] = {
-                        "id": order['id'],
-                        "symbol": SYMBOL,
-                        "price": price,
-                        "side": side,
-                        "status": "open",
-                        "amount": AMOUNT,
-                    }
-                    logging.info(f"Placed {side} order: {new_orders[price]}")
-                    total_orders += 1
-                    time.sleep(0.2)  # Avoid rate limits
-                except Exception as e:
-                    logging.error(f"Failed to place {side} order for {price}: {e}")
+    canceled_order_ids = []
+    for order in orders:
+        if order['id'] in canceled:
+            logging.info(f"Canceled order | ID: {order['id']} | Price: {order['price']} | Side: {order['side']}")
+            canceled_order_ids.append(order['id'])
+    return canceled_order_ids
 
-    return new_orders
 
 
 # Save orders to file
-def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=False):
+def save_open_orders_to_file(file_path, open_orders, silent=False):
+    """
+    Αποθηκεύει το βιβλίο παραγγελιών του worker. Τα statistics (κέρδη, εκτελέσεις) τα κρατά μόνο το main bot,
+    που βλέπει τις εκτελέσεις, στο δικό του αρχείο.
+    """
     try:
-        # Αρχικοποίηση στατιστικών αν είναι None
-        if statistics is None:
-            statistics = {
-                "total_buys": 0,
-                "total_sells": 0,
-                "net_profit": 0.0
-            }
-
-        # Υπολογισμός στατιστικών
-        for _, order in open_orders.items():
-            side = order.get('side')
-            price = float(order.get('price', 0))
-            amount = float(order.get('amount', 0))
-            if side == 'buy':
-                statistics["total_buys"] += 1
-                statistics["net_profit"] -= price * amount  # Αφαιρούμε το κόστος αγοράς
-            elif side == 'sell':
-                statistics["total_sells"] += 1
-                statistics["net_profit"] += price * amount  # Προσθέτουμε τα έσοδα από την πώληση
-
         # Επεξεργασία των εντολών για αποθήκευση
         orders_to_save = {}
         for _, order in open_orders.items():
             try:
-                orders_to_save[str(order.get('price'))] = {
+                orders_to_save[order.get('price')] = {
                     'id': order.get('id'),
+                    'clientOrderId': order.get('clientOrderId'),
                     'symbol': order.get('symbol'),
                     'price': order.get('price'),
                     'side': order.get('side'),
@@ -320,22 +1024,21 @@ def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=Fal
                 logging.error(f"Error serializing order with ID {order.get('id')}: {e}. Order: {order}")
                 continue
 
-        # Δεδομένα προς αποθήκευση
-        data_to_save = {
-            "orders": orders_to_save,
-            "statistics": statistics
-        }
+        if SAVED_ORDERS.get(file_path) == orders_to_save:
+            METRICS.inc("state_saves_total", outcome="skipped")
+            logging.debug("No order changes. Skipped saving %s.", file_path)
+            return
 
-        # Αποθήκευση στο αρχείο
-        temp_file_path = file_path + ".tmp"
-        with open(temp_file_path, 'w') as f:
-            json.dump(data_to_save, f, indent=4)
-        os.replace(temp_file_path, file_path)
+        # Αποθήκευση μέσω προσωρινού αρχείου, στη μορφή της κατάληξης (.json ή .msgpack, βλ. state_format.py)
+        save_state(file_path, orders_to_save, {})
+        SAVED_ORDERS[file_path] = orders_to_save
+        METRICS.inc("state_saves_total", outcome="written")
 
         if not silent:
-            logging.info(f"Saved open orders and statistics to {file_path}")
+            logging.info(f"Saved open orders to {file_path}")
     except Exception as e:
-        logging.error(f"Failed to save open orders and statistics to file: {e}")
+        METRICS.inc("state_saves_total", outcome="failed")
+        logging.error(f"Failed to save open orders to file: {e}")
 
 
 
@@ -344,14 +1047,15 @@ def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=Fal
 
 # -- Νέες βοηθητικές συναρτήσεις, προσαρμοσμένες ώστε να χρησιμοποιούν τα παραπάνω --
 
-def fetch_and_initialize_exchange():
+def fetch_and_initialize_exchange(exchange=None):
     """
-    1) Καλεί την initialize_exchange()
+    1) Καλεί την initialize_exchange() (αν δεν δόθηκε κοινή σύνδεση)
     2) Παίρνει το current_price
     3) Επιστρέφει (exchange, current_price)
     """
     # Χρησιμοποιούμε τη δική σου βασική συνάρτηση
-    exchange = initialize_exchange()
+    if exchange is None:
+        exchange = initialize_exchange()
     
     # Παίρνουμε το ticker για να βρούμε την τρέχουσα τιμή
     ticker = exchange.fetch_ticker(SYMBOL)
@@ -370,7 +1074,18 @@ def fetch_and_check_open_orders(exchange):
     # Χρησιμοποιούμε τη δική σου βασική συνάρτηση
     open_orders = fetch_open_orders(exchange)
     logging.info(f"Fetched {len(open_orders)} open orders from {EXCHANGE_NAME.upper()}.")
-    logging.debug(f"Open orders fetched from {EXCHANGE_NAME.upper()}: {open_orders}")
+
+    # Μόνο οι παραγγελίες των bots: βάσει client order ID, ή (για παλαιότερες παραγγελίες χωρίς αυτό)
+    # όσες είχε ήδη το αρχείο του worker. Παραγγελίες άλλων εργαλείων δεν μετακινούνται ούτε ακυρώνονται.
+    known_ids = load_known_order_ids(OPEN_ORDERS_FILE)
+    grid_orders = [
+        order for order in open_orders
+        if parse_client_order_id(order.get('clientOrderId')) is not None or order['id'] in known_ids
+    ]
+    if len(grid_orders) < len(open_orders):
+        logging.info(f"Ignoring {len(open_orders) - len(grid_orders)} open orders not placed by the grid bots.")
+    open_orders = grid_orders
+    logging.debug("Open orders fetched from %s: %s", EXCHANGE_NAME.upper(), summarize_orders(open_orders))
     
     # Έλεγχος αν δεν υπάρχουν open orders
     if not open_orders:
@@ -380,389 +1095,270 @@ def fetch_and_check_open_orders(exchange):
     return open_orders
 
 
-# -- Οι υπόλοιπες βοηθητικές συναρτήσεις σου (ίδιες όπως πριν) --
-
-def separate_buy_sell_orders(open_orders):
-    buy_orders = sorted(
-        [round(float(order['price']), 4) for order in open_orders if order['side'] == 'buy']
-    )
-    sell_orders = sorted(
-        [round(float(order['price']), 4) for order in open_orders if order['side'] == 'sell']
-    )
-    logging.info(f"Buy orders on exchange: {buy_orders}")
-    logging.info(f"Sell orders on exchange: {sell_orders}")
-    return buy_orders, sell_orders
-
-def find_farthest_orders(buy_orders, sell_orders):
-    farthest_buy_order = buy_orders[0] if buy_orders else None
-    farthest_sell_order = sell_orders[-1] if sell_orders else None
-    logging.info(f"Farthest buy order: {farthest_buy_order}")
-    logging.info(f"Farthest sell order: {farthest_sell_order}")
-    return farthest_buy_order, farthest_sell_order
-
-def find_orders_out_of_range(open_orders, current_price, buy_orders, sell_orders, tolerance=0.0):
-    orders_to_cancel = []
-    new_buy_orders = []
-    new_sell_orders = []
-    
-    # Υπολογισμός των ορίων του grid
-    lower_bound = current_price - (GRID_SIZE * GRID_COUNT)
-    upper_bound = current_price + (GRID_SIZE * GRID_COUNT)
+def select_farthest_orders(buy_orders, sell_orders, current_price, count):
+    """
+    Επιλέγει τις count πιο απομακρυσμένες από την τρέχουσα τιμή τιμές, σε ένα πέρασμα πάνω στις
+    ταξινομημένες λίστες (οι πιο μακρινές buy είναι στην αρχή, οι πιο μακρινές sell στο τέλος).
+    Επιστρέφει λίστα από (side, price).
+    """
+    selected = []
+    low, high = 0, len(sell_orders) - 1
+    while len(selected) < count and (low < len(buy_orders) or high >= 0):
+        if low < len(buy_orders) and (high < 0 or abs(buy_orders[low] - current_price) > abs(sell_orders[high] - current_price)):
+            selected.append(("buy", buy_orders[low]))
+            low += 1
+        else:
+            selected.append(("sell", sell_orders[high]))
+            high -= 1
+    return selected
 
-    farthest_buy_order = buy_orders[0] if buy_orders else None
-    farthest_sell_order = sell_orders[-1] if sell_orders else None
 
-    # Έλεγχος για ακύρωση της πιο απομακρυσμένης buy παραγγελίας
-    if farthest_buy_order and farthest_buy_order < (lower_bound - tolerance):
-        try:            
-            order = next((order for order in open_orders if abs(float(order['price']) - farthest_buy_order) < 0.0001), None)
-            
-            orders_to_cancel.append(order)
-            logging.info(f"Buy order at price {farthest_buy_order} is out of range. "
-                         f"Lower bound (with tolerance): {lower_bound - tolerance:.4f}. It will be canceled.")
-        except Exception as e:
-            logging.error(f"Error finding farthest buy order: {e}")
+def free_level(side, current_price, taken):
+    """
+    Το πλησιέστερο στην τρέχουσα τιμή επίπεδο της πλευράς (έως GRID_COUNT) που δεν καλύπτεται από
+    καμία τιμή της ταξινομημένης λίστας taken (σε απόσταση μικρότερη από GRID_SIZE / 2). None αν δεν υπάρχει.
+    """
+    for i in range(1, GRID_COUNT + 1):
+        price = round(current_price - GRID_SIZE * i if side == "buy" else current_price + GRID_SIZE * i, 4)
+        j = bisect.bisect_left(taken, price)
+        if price > 0 and not any(abs(price - existing) < GRID_SIZE / 2 for existing in taken[max(j - 1, 0):j + 1]):
+            return price
+    return None
 
-    # Έλεγχος για ακύρωση της πιο απομακρυσμένης sell παραγγελίας
-    if farthest_sell_order and farthest_sell_order > (upper_bound + tolerance):
-        try:
-            order = next((order for order in open_orders if abs(float(order['price']) - farthest_sell_order) < 0.0001), None)
 
-            orders_to_cancel.append(order)
-            logging.info(f"Sell order at price {farthest_sell_order} is out of range. "
-                         f"Upper bound (with tolerance): {upper_bound + tolerance:.4f}. It will be canceled.")
-        except Exception as e:
-            logging.error(f"Error finding farthest sell order: {e}")
-    
-    if orders_to_cancel:
-        logging.info(f"Orders to cancel: {len(orders_to_cancel)}")
-        logging.info(f"Order prices to cancel: {[order['price'] for order in orders_to_cancel]}")
-    else:
-        logging.info("No orders to cancel.")
-    
-    logging.debug(f"Orders to cancel (prices): {[order['price'] for order in orders_to_cancel if isinstance(order, dict)]}")
-
-    return orders_to_cancel, new_buy_orders, new_sell_orders
+def plan_grid_adjustment(open_orders, current_price, free_balance):
+    """
+    Υπολογίζει σε ένα πέρασμα, χωρίς κλήσεις στο exchange, τις ελάχιστες ενέργειες που φέρνουν
+    τις ανοιχτές παραγγελίες στο grid γύρω από την τρέχουσα τιμή:
+    1) η πιο απομακρυσμένη buy / sell εκτός εύρους (με ανοχή 1%) μετακινείται στο πλησιέστερο ελεύθερο επίπεδο (amend),
+    2) προστίθενται παραγγελίες στην πλευρά με τις λιγότερες, μέχρι να ισορροπήσουν, χωρίς να ξεπεραστεί το MAX_ORDERS,
+    3) αν οι παραγγελίες ξεπερνούν το MAX_ORDERS, ακυρώνονται οι πιο απομακρυσμένες και δεν προστίθεται καμία.
+    Οι νέες παραγγελίες περιορίζονται από το free_balance ({νόμισμα: διαθέσιμο}).
+
+    Επιστρέφει {"cancel": [(order, reason)], "amend": [(order, price)], "place": [(side, price)], "skipped": [μηνύματα],
+    "open": {"buy": [τιμές], "sell": [τιμές]}}, όπου "open" οι ταξινομημένες τιμές των ανοιχτών παραγγελιών πριν από το σχέδιο.
+    """
+    plan = {"cancel": [], "amend": [], "place": [], "skipped": []}
+    orders = {"buy": [], "sell": []}
+    for order in open_orders:
+        side = order['side'].lower()
+        if side in orders:
+            orders[side].append((round(float(order['price']), 4), order))
+    for side in orders:
+        orders[side].sort(key=lambda item: item[0])
+    plan["open"] = {side: [price for price, _ in items] for side, items in orders.items()}
+    balance = dict(free_balance)
+
+    tolerance = current_price * 0.01  # 1% του current_price
+    lower_bound = current_price - (GRID_SIZE * GRID_COUNT) - tolerance
+    upper_bound = current_price + (GRID_SIZE * GRID_COUNT) + tolerance
+
+    # 1) Η πιο απομακρυσμένη παραγγελία κάθε πλευράς, αν είναι εκτός εύρους
+    out_of_range = []
+    if orders["buy"] and orders["buy"][0][0] < lower_bound:
+        out_of_range.append(orders["buy"].pop(0)[1])
+    if orders["sell"] and orders["sell"][-1][0] > upper_bound:
+        out_of_range.append(orders["sell"].pop()[1])
+    taken = {side: [price for price, _ in items] for side, items in orders.items()}
+    count = len(taken["buy"]) + len(taken["sell"])
+
+    # 3) Υπερβάλλουσες παραγγελίες: μόνο ακυρώσεις
+    if count > MAX_ORDERS:
+        plan["cancel"] = [(order, "out_of_range") for order in out_of_range]
+        by_price = {side: dict(items) for side, items in orders.items()}
+        for side, price in select_farthest_orders(taken["buy"], taken["sell"], current_price, count - MAX_ORDERS):
+            plan["cancel"].append((by_price[side][price], "excess"))
+        return plan
+
+    def reserve(side, price):
+        currency, required = (CRYPTO_CURRENCY, price * AMOUNT) if side == "buy" else (CRYPTO_SYMBOL, AMOUNT)
+        if balance.get(currency, 0) < required:
+            plan["skipped"].append(
+                f"Insufficient balance ({balance.get(currency, 0):.4f} {currency}) "
+                f"to place {side} order at price {price:.4f} (requires {required:.4f} {currency})."
+            )
+            return False
+        balance[currency] -= required
+        return True
 
+    # 1) Μετακίνηση των παραγγελιών εκτός εύρους (τα κεφάλαιά τους αποδεσμεύονται με την ακύρωση)
+    for order in out_of_range:
+        side = order['side'].lower()
+        if side == "buy":
+            balance[CRYPTO_CURRENCY] = balance.get(CRYPTO_CURRENCY, 0) + float(order['price']) * float(order['amount'])
+        else:
+            balance[CRYPTO_SYMBOL] = balance.get(CRYPTO_SYMBOL, 0) + float(order['amount'])
 
+        price = free_level(side, current_price, taken[side])
+        if count < MAX_ORDERS and price is not None and reserve(side, price):
+            plan["amend"].append((order, price))
+            bisect.insort(taken[side], price)
+            count += 1
+        else:
+            plan["cancel"].append((order, "out_of_range"))
 
+    # 2) Ισορροπία buy / sell
+    while count < MAX_ORDERS and len(taken["buy"]) != len(taken["sell"]):
+        side = "buy" if len(taken["buy"]) < len(taken["sell"]) else "sell"
+        price = free_level(side, current_price, taken[side])
+        if price is None or not reserve(side, price):
+            break
+        plan["place"].append((side, price))
+        bisect.insort(taken[side], price)
+        count += 1
 
+    return plan
 
 
-def process_canceled_orders(exchange, canceled_orders, all_orders, current_price, new_buy_orders, new_sell_orders, statistics):
+def place_orders_batch(exchange, placements):
     """
-    Επεξεργάζεται τις ακυρωμένες παραγγελίες, αντικαθιστά τις θέσεις τους και ανανεώνει το αρχείο παραγγελιών.
+    Τοποθετεί πολλές limit παραγγελίες (λίστα από (side, price)) μαζί: με ένα αίτημα create_orders
+    όπου το υποστηρίζει το exchange, αλλιώς με παράλληλα αιτήματα. Επιστρέφει λίστα από (side, price, order ή None).
     """
-    try:
-        # Φόρτωμα όλων των παραγγελιών από το γνωστό αρχείο
-        with open(OPEN_ORDERS_FILE, 'r') as f:
-            data = json.load(f)
-            all_orders_from_file = data.get("orders", {})
-
-        # Ενημερωμένο dictionary για παραγγελίες
-        updated_orders = all_orders_from_file.copy()
-
-        for order_id in canceled_orders:
-            logging.info(f"Processing canceled order ID: {order_id}")
-
-            # Αναζήτηση της παραγγελίας με βάση το Order ID
-            order_details = None
-            for price, order in all_orders_from_file.items():
-                if str(order.get('id')) == str(order_id):
-                    order_details = order
-                    # Αφαιρούμε την παραγγελία από το ενημερωμένο dictionary
-                    updated_orders.pop(price, None)
-                    break
-
-            if not order_details:
-                logging.warning(f"Order details not found in file for ID: {order_id}")
-                continue
-
-            logging.info(f"Found order details for ID {order_id}: {order_details}")
-
-            # Προσθήκη νέας παραγγελίας
-            if order_details['side'] == 'buy':
-                price = round(current_price - GRID_SIZE * (len(new_buy_orders) + 1), 4)
-                logging.info(f"Preparing to place new buy order at price: {price}")
-                statistics["total_buys"] -= 1
-                statistics["net_profit"] += float(order_details['price']) * float(order_details['amount'])
-                try:
-                    new_order = exchange.create_limit_buy_order(SYMBOL, AMOUNT, price)
-                    if isinstance(new_order, dict) and 'id' in new_order and 'price' in new_order:
-                        logging.info(f"Placed new buy order successfully: {new_order}")
-                        new_buy_orders.append({
-                            "id": new_order['id'],
-                            "price": new_order['price'],
-                            "side": "buy",
-                        })
-                        updated_orders[str(new_order['price'])] = {
-                            "id": new_order['id'],
-                            "price": new_order['price'],
-                            "side": "buy",
-                            "status": "open",
-                            "amount": AMOUNT,
-                            "remaining": AMOUNT,
-                            "datetime": new_order.get('datetime'),
-                            "timestamp": new_order.get('timestamp'),
-                        }
-                except Exception as e:
-                    logging.error(f"Error placing new buy order at price {price}: {e}")
-
-            elif order_details['side'] == 'sell':
-                price = round(current_price + GRID_SIZE * (len(new_sell_orders) + 1), 4)
-                logging.info(f"Preparing to place new sell order at price: {price}")
-                statistics["total_sells"] -= 1
-                statistics["net_profit"] -= float(order_details['price']) * float(order_details['amount'])                
-                try:
-                    new_order = exchange.create_limit_sell_order(SYMBOL, AMOUNT, price)
-                    if isinstance(new_order, dict) and 'id' in new_order and 'price' in new_order:
-                        logging.info(f"Placed new sell order successfully: {new_order}")
-                        new_sell_orders.append({
-                            "id": new_order['id'],
-                            "price": new_order['price'],
-                            "side": "sell",
-                        })
-                        updated_orders[str(new_order['price'])] = {
-                            "id": new_order['id'],
-                            "price": new_order['price'],
-                            "side": "sell",
-                            "status": "open",
-                            "amount": AMOUNT,
-                            "remaining": AMOUNT,
-                            "datetime": new_order.get('datetime'),
-                            "timestamp": new_order.get('timestamp'),
-                        }
-                except Exception as e:
-                    logging.error(f"Error placing new sell order at price {price}: {e}")
-
-        # Αποθήκευση των ενημερωμένων παραγγελιών στο αρχείο
-        with open(OPEN_ORDERS_FILE, 'w') as f:
-            json.dump({"orders": updated_orders}, f, indent=4)
-
-        #logging.info(f"Updated open orders file after processing canceled orders.")
-
-    except Exception as e:
-        logging.error(f"Error processing canceled orders: {e}")
-
-
-
+    if not placements:
+        return []
 
+    if exchange.has.get("createOrders"):
+        try:
+            orders = exchange.create_orders([
+                {"symbol": SYMBOL, "type": "limit", "side": side, "amount": AMOUNT, "price": price,
+                 "params": {"clientOrderId": client_order_id_for(side, price)}}
+                for side, price in placements
+            ])
+            return [(side, price, order) for (side, price), order in zip(placements, orders)]
+        except Exception as e:
+            logging.warning(f"Batch placement of {len(placements)} orders failed: {e}. Placing one by one.")
 
+    def place_one(placement):
+        side, price = placement
+        try:
+            return exchange.create_limit_order(SYMBOL, side, AMOUNT, price, {"clientOrderId": client_order_id_for(side, price)})
+        except Exception as e:
+            logging.error(f"Failed to place {side} order for {price}: {e}")
+            return None
 
+    with ThreadPoolExecutor(max_workers=min(CANCEL_MAX_WORKERS, len(placements))) as pool:
+        results = list(pool.map(place_one, placements))
+    return [(side, price, order) for (side, price), order in zip(placements, results)]
 
 
-def maintain_order_balance(exchange, current_price, buy_orders, sell_orders, new_buy_orders, new_sell_orders):
+def amend_orders_batch(exchange, amends):
     """
-    Διατηρεί την ισορροπία μεταξύ buy και sell παραγγελιών, αποφεύγοντας να ξεπεράσει το MAX_ORDERS.
+    Μετακινεί παραγγελίες (λίστα από (order, price)) με ένα αίτημα edit_order η καθεμία, όπου το υποστηρίζει
+    το exchange (στο Binance είναι το cancelReplace endpoint). Επιστρέφει (amended, failed): τα (order, price, new_order)
+    που μετακινήθηκαν και τα (order, price) που πρέπει να γίνουν με cancel + create.
     """
-    # Φόρτωσε τα open orders και έλεγξε τη μορφή τους
-    open_orders = exchange.fetch_open_orders(SYMBOL)
-    if not isinstance(open_orders, list):
-        logging.error(f"Expected open_orders to be a list but got {type(open_orders)}.")
-        return
+    if not amends or not exchange.has.get("editOrder"):
+        return [], list(amends)
 
-    logging.debug(f"Refetched open orders after confirming cancellations. Found {len(open_orders)} orders.")
-    
-    total_orders = len(open_orders)
-    if total_orders >= MAX_ORDERS:
-        logging.debug(f"We have {total_orders} orders, which is at or above MAX_ORDERS={MAX_ORDERS}.")
-        logging.info(f"No new orders will be placed to maintain balance. ({total_orders})")
-        return
-
-    # Επαλήθευση ισορροπίας για buy παραγγελίες
-    logged_adjusting_message = False  # Flag για το logging
-    
-    
-    while (len(new_buy_orders) + len(buy_orders)) < (len(new_sell_orders) + len(sell_orders)):
-        total_orders = len(open_orders)
-        if total_orders >= MAX_ORDERS:
-            logging.info(f"Reached MAX_ORDERS={MAX_ORDERS} while trying to add buy orders. Stopping.")
-            break
+    def amend_one(amend):
+        order, price = amend
+        try:
+            return exchange.edit_order(order['id'], SYMBOL, "limit", order['side'], AMOUNT, price,
+                                       {"clientOrderId": client_order_id_for(order['side'], price)})
+        except Exception as e:
+            logging.warning(f"Could not amend order {order['id']} to {price}: {e}. Falling back to cancel and replace.")
+            return None
 
-        if not logged_adjusting_message:
-            logging.info("Adjusting buy orders to maintain balance...")
-            logged_adjusting_message = True  # Το μήνυμα έχει καταγραφεί μία φορά
-        
-        
-        price = round(current_price - GRID_SIZE * (len(buy_orders) + len(new_buy_orders) + 1), 4)
-
-        # Επαλήθευση τιμών
-        existing_prices = []
-        for order in buy_orders + new_buy_orders:
-            if isinstance(order, dict) and 'price' in order:
-                try:
-                    existing_prices.append(round(float(order['price']), 4))
-                except (ValueError, TypeError) as e:
-                    logging.error(f"Invalid price in order: {order}. Error: {e}")
-        
-        if price not in existing_prices:
-            try:
-                # Έλεγχος διαθέσιμου balance
-                balance = exchange.fetch_balance()
-                required_amount = price * AMOUNT  # Το ποσό που απαιτείται στο CRYPTO_CURRENCY
-                if balance['free'][CRYPTO_CURRENCY] < required_amount:
-                    logging.warning(
-                        f"Insufficient balance ({balance['free'][CRYPTO_CURRENCY]:.4f} {CRYPTO_CURRENCY}) "
-                        f"to place order at price {price:.4f} (requires {required_amount:.4f} {CRYPTO_CURRENCY})."
-                    )
-                    send_push_notification(
-                        f"Insufficient balance ({balance['free'][CRYPTO_CURRENCY]:.4f} {CRYPTO_CURRENCY}) "
-                        f"to place order at price {price:.4f} (requires {required_amount:.4f} {CRYPTO_CURRENCY})."
-                    )
-                    return  # Σταματάει τη διαδικασία ή επιστρέφει στο ανώτερο επίπεδο (αναλόγως την ανάγκη σας)
-                
-                order = exchange.create_limit_buy_order(SYMBOL, AMOUNT, price)
-                if isinstance(order, dict) and 'id' in order and 'price' in order:
-                    new_buy_orders.append({
-                        "id": str(order['id']),
-                        "price": float(order['price']) if order.get('price') is not None else price,
-                        "side": "buy",
-                    })
-                    logging.info(f"Placed new buy order at price: {price:.4f} to maintain order balance.")
-                    # Επιπλέον logging με βασικές πληροφορίες της παραγγελίας
-                    logging.info(f"Order Details - ID: {order['id']}, Price: {order['price']:.4f}, Amount: {AMOUNT}, Side: buy")                    
-            except Exception as e:
-                logging.error(f"Failed to place new buy order at price {price:.4f}: {e}")
-                
-
-    # Επαλήθευση ισορροπίας για sell παραγγελίες
-    while (len(new_sell_orders) + len(sell_orders)) < (len(new_buy_orders) + len(buy_orders)):
-        total_orders = len(open_orders)
-        if total_orders >= MAX_ORDERS:
-            logging.info(f"Reached MAX_ORDERS={MAX_ORDERS} while trying to add sell orders. Stopping.")
-            break
+    with ThreadPoolExecutor(max_workers=min(CANCEL_MAX_WORKERS, len(amends))) as pool:
+        results = list(pool.map(amend_one, amends))
 
-        price = round(current_price + GRID_SIZE * (len(sell_orders) + len(new_sell_orders) + 1), 4)
+    amended, failed = [], []
+    for (order, price), new_order in zip(amends, results):
+        if isinstance(new_order, dict) and 'id' in new_order:
+            amended.append((order, price, new_order))
+        else:
+            failed.append((order, price))
+    return amended, failed
 
-        # Επαλήθευση τιμών
-        existing_prices = []
-        for order in sell_orders + new_sell_orders:
-            if isinstance(order, dict) and 'price' in order:
-                try:
-                    existing_prices.append(round(float(order['price']), 4))
-                except (ValueError, TypeError) as e:
-                    logging.error(f"Invalid price in order: {order}. Error: {e}")
-        
-        if price not in existing_prices:
-            try:
-                # Έλεγχος διαθέσιμου balance
-                balance = exchange.fetch_balance()
-                if balance['free'][CRYPTO_SYMBOL] < AMOUNT:  # Ελέγχουμε το CRYPTO_SYMBOL
-                    logging.warning(
-                        f"Insufficient balance ({balance['free'][CRYPTO_SYMBOL]:.4f} {CRYPTO_SYMBOL}) "
-                        f"to place sell order for {AMOUNT:.4f} {CRYPTO_SYMBOL} at price {price:.4f}."
-                    )
-                    send_push_notification(
-                        f"Insufficient balance ({balance['free'][CRYPTO_SYMBOL]:.4f} {CRYPTO_SYMBOL}) "
-                        f"to place sell order for {AMOUNT:.4f} {CRYPTO_SYMBOL} at price {price:.4f}."
-                    )
-                    return  # Σταματάει τη διαδικασία ή επιστρέφει στο ανώτερο επίπεδο (αναλόγως την ανάγκη σας)
-                
-                order = exchange.create_limit_sell_order(SYMBOL, AMOUNT, price)
-                if isinstance(order, dict) and 'id' in order and 'price' in order:
-                    new_sell_orders.append({
-                        "id": str(order['id']),
-                        "price": float(order['price']) if order.get('price') is not None else price,
-                        "side": "sell",
-                    })
-                    logging.info(f"Placed new sell order at price: {price:.4f} to maintain order balance.")
-                    # Επιπλέον logging με βασικές πληροφορίες της παραγγελίας
-                    logging.info(f"Order Details - ID: {order['id']}, Price: {order['price']:.4f}, Amount: {AMOUNT}, Side: sell")                    
-            except Exception as e:
-                logging.error(f"Failed to place new sell order at price {price:.4f}: {e}")
-                
 
+def add_to_book(book, side, price, order):
+    """Προσθέτει στο book μια νέα παραγγελία, όπως την επέστρεψε το exchange, και την επιστρέφει."""
+    new_order = {
+        "id": order['id'],
+        "clientOrderId": client_order_id_for(side, price),
+        "symbol": SYMBOL,
+        "price": order.get('price') or price,
+        "side": side,
+        "status": "open",
+        "amount": AMOUNT,
+        "remaining": AMOUNT,
+        "datetime": order.get('datetime'),
+        "timestamp": order.get('timestamp'),
+    }
+    book[new_order['price']] = new_order
+    return new_order
 
 
+TRADE_ARCHIVE = TradeArchive(TRADE_ARCHIVE_DIR)
 
-def handle_excess_orders(exchange, buy_orders, sell_orders, current_price):
-    """
-    Διαχειρίζεται τις παραγγελίες όταν ο συνολικός αριθμός τους υπερβαίνει το μέγιστο επιτρεπτό όριο (MAX_ORDERS),
-    δίνοντας προτεραιότητα στην ακύρωση παραγγελιών που είναι λιγότερο πιθανό να εκτελεστούν.
-    """
-    total_orders = len(buy_orders) + len(sell_orders)
-    
-    logging.debug(f"Total buy orders: {len(buy_orders)}")
-    logging.debug(f"Total sell orders: {len(sell_orders)}")
-    logging.debug(f"Total orders (buy + sell): {total_orders}")
-    
-    if total_orders > MAX_ORDERS:
-        excess = total_orders - MAX_ORDERS
-        logging.warning(f"Excess orders detected: {excess}. Adjusting...")
-
-        # Fetch open orders once to avoid repetitive API calls
-        open_orders = fetch_open_orders(exchange)
-        orders_summary = ', '.join(
-            ["id={}, price={}, side={}, status={}".format(
-                order.get('id'),
-                order.get('price'),
-                order.get('side'),
-                order.get('status')
-            ) for order in open_orders]
-        )
-        logging.debug(f"Fetched open orders: [{orders_summary}]")
-
-        # Ακύρωση των λιγότερο πιθανών να εκτελεστούν
-        while excess > 0:
-            # Υπολογισμός απόστασης από την τρέχουσα τιμή
-            buy_orders_sorted = sorted(buy_orders, key=lambda price: abs(price - current_price), reverse=True)
-            sell_orders_sorted = sorted(sell_orders, key=lambda price: abs(price - current_price), reverse=True)
-
-            # Επιλέγουμε παραγγελίες με βάση την απόσταση από την τρέχουσα τιμή
-            if buy_orders_sorted and (not sell_orders_sorted or abs(buy_orders_sorted[0] - current_price) > abs(sell_orders_sorted[0] - current_price)):
-                price_to_cancel = buy_orders_sorted.pop(0)  # Πιο μακρινή buy
-                buy_orders.remove(price_to_cancel)
-                order_side = "buy"
-            elif sell_orders_sorted:
-                price_to_cancel = sell_orders_sorted.pop(0)  # Πιο μακρινή sell
-                sell_orders.remove(price_to_cancel)
-                order_side = "sell"
-            else:
-                break  # Δεν υπάρχουν άλλες παραγγελίες προς ακύρωση
 
-            # Βρίσκουμε την παραγγελία από τα open_orders
-            order_to_cancel = next(
-                (order for order in open_orders if abs(float(order['price']) - price_to_cancel) < 0.0001),
-                None
-            )
+def archive_event(event, order):
+    """Γράφει ένα γεγονός μιας παραγγελίας του ενεργού ζεύγους στο τοπικό αρχείο."""
+    if ENABLE_TRADE_ARCHIVE:
+        TRADE_ARCHIVE.append(SYMBOL, event, order.get('side'), order.get('price'), order.get('amount') or AMOUNT,
+                             order_id=order.get('id'))
 
-            if not order_to_cancel:
-                logging.warning(f"No matching {order_side} order found for price: {price_to_cancel}")
-            else:
-                try:
-                    logging.info(
-                        f"Price of {order_side} order to cancel: {order_to_cancel['price']}, Order ID: {order_to_cancel['id']}"
-                    )
-                    exchange.cancel_order(order_to_cancel['id'], SYMBOL)
-                    logging.info(f"Successfully canceled {order_side} order at price: {order_to_cancel['price']}")
-                except Exception as e:
-                    logging.error(f"Failed to cancel {order_side} order: {e}")
-            excess -= 1
-
-        send_push_notification("ALERT: Grid range adjusted successfully!")
-    else:
-        logging.info(f"No excess orders detected. ({total_orders})")
 
+def execute_plan(exchange, plan, book):
+    """
+    Εκτελεί το σχέδιο του plan_grid_adjustment σε δέσμες: πρώτα οι μετακινήσεις με edit_order (όπου υποστηρίζεται),
+    μετά όλες οι ακυρώσεις (μαζί με τις μετακινήσεις που απέτυχαν) και τέλος όλες οι νέες παραγγελίες.
+    Ενημερώνει το book (τιμή -> παραγγελία).
+    """
+    amended, fallback = amend_orders_batch(exchange, plan["amend"])
+    for order, price, new_order in amended:
+        book.pop_by_id(order['id'])
+        new_order = add_to_book(book, order['side'], price, new_order)
+        logging.info("Moved %s order %s from %s: %s", order['side'], order['id'], order['price'], summarize_order(new_order))
+        METRICS.inc("orders_amended_total", side=order['side'])
+        archive_event("amended", new_order)
+
+    reasons = {order['id']: reason for order, reason in plan["cancel"]}
+    reasons.update((order['id'], "out_of_range") for order, _ in fallback)
+    orders_to_cancel = [order for order, _ in plan["cancel"]] + [order for order, _ in fallback]
+
+    canceled = set(cancel_orders_batch(exchange, orders_to_cancel))
+    for order in orders_to_cancel:
+        if order['id'] not in canceled:
+            continue
+        METRICS.inc("orders_canceled_total", reason=reasons[order['id']])
+        archive_event("canceled", order)
+        book.pop_by_id(order['id'])
 
+    # Οι αντικαταστάσεις τοποθετούνται μόνο για όσες ακυρώσεις επιβεβαιώθηκαν
+    placements = [(order['side'], price, "replace_canceled") for order, price in fallback if order['id'] in canceled]
+    placements += [(side, price, "balance") for side, price in plan["place"]]
 
+    placed = 0
+    results = place_orders_batch(exchange, [(side, price) for side, price, _ in placements])
+    for (side, price, reason), (_, _, order) in zip(placements, results):
+        if not isinstance(order, dict) or 'id' not in order:
+            continue
+        new_order = add_to_book(book, side, price, order)
+        logging.info("Placed %s order (%s): %s", side, reason, summarize_order(new_order))
+        METRICS.inc("orders_placed_total", side=side, reason=reason)
+        archive_event("placed", new_order)
+        placed += 1
 
+    return len(canceled), len(amended), placed
 
-        
 
 
 # η κεντρική σου συνάρτηση
-def adjust_grid_range():
+def adjust_grid_range(exchange=None):
     try:
-        statistics = {"total_buys": 0, "total_sells": 0, "net_profit": 0.0}
         logging.info(f">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
         logging.info(f"Starting {SYMBOL} Grid Trading bot (grid range worker)...")
         
         iteration_start = time.time()
 
         # 1) Φόρτωμα κλειδιών & αρχικοποίηση (χρησιμοποιεί initialize_exchange())
-        exchange, current_price = fetch_and_initialize_exchange()
+        enter_phase("initialize")
+        exchange, current_price = fetch_and_initialize_exchange(exchange)
 
         # 2) Fetch open orders & check (χρησιμοποιεί fetch_open_orders())
+        enter_phase("fetch_orders")
         open_orders = fetch_and_check_open_orders(exchange)
         if not open_orders:
             return  # Σταματάμε, αφού δεν υπάρχουν open_orders
@@ -771,116 +1367,127 @@ def adjust_grid_range():
           
 
         
-        logging.debug(f"2) Type of open_orders: {type(open_orders)}")
-        logging.debug(f"Contents of open_orders: {open_orders}")
-
-        
-        # 3) Ξεχωρισμός buy / sell
-        buy_orders, sell_orders = separate_buy_sell_orders(open_orders)
-
-        # 4) Εντοπισμός παραγγελιών που είναι εκτός range
-        tolerance = current_price * 0.01  # 1% του current_price
-        orders_to_cancel, new_buy_orders, new_sell_orders = find_orders_out_of_range(
-            open_orders, current_price, buy_orders, sell_orders, tolerance
+        logging.debug("Contents of open_orders: %s", summarize_orders(open_orders))
+
+        # 3) Σχέδιο: όλες οι ακυρώσεις / μετακινήσεις / νέες παραγγελίες σε ένα πέρασμα, με ένα fetch_balance
+        enter_phase("plan")
+        balance = exchange.fetch_balance()
+        free_balance = {
+            CRYPTO_CURRENCY: float(balance['free'].get(CRYPTO_CURRENCY) or 0),
+            CRYPTO_SYMBOL: float(balance['free'].get(CRYPTO_SYMBOL) or 0),
+        }
+        plan = plan_grid_adjustment(open_orders, current_price, free_balance)
+        for side in ("buy", "sell"):
+            logging.info("%s orders on exchange: %s", side.capitalize(), summarize_prices(plan["open"][side]))
+            METRICS.set("open_orders", len(plan["open"][side]), side=side, symbol=SYMBOL)
+
+        reasons = [reason for _, reason in plan["cancel"]]
+        METRICS.set("out_of_range_orders", reasons.count("out_of_range") + len(plan["amend"]), symbol=SYMBOL)
+        METRICS.set("excess_orders", reasons.count("excess"), symbol=SYMBOL)
+        logging.info(
+            f"Grid plan: {len(plan['cancel'])} cancels, {len(plan['amend'])} moves, "
+            f"{len(plan['place'])} new orders, {len(plan['skipped'])} skipped."
         )
-
-        logging.debug(f"4) Type of open_orders: {type(open_orders)}")
-        
-        # 5) Αν υπάρχουν παραγγελίες προς ακύρωση, ακύρωσέ τις
-        if orders_to_cancel:
-            logging.info(f"Starting cancellation process for {len(orders_to_cancel)} orders.")
-            canceled_orders = cancel_orders_outside_range(exchange, orders_to_cancel)
-            logging.debug(f"Canceled {len(canceled_orders)} orders.")
-            logging.info(f"Canceled orders details: {canceled_orders}")
-            
-            # Ενημέρωση του αρχείου μετά την ακύρωση
-            logging.debug(f"5) Type of open_orders: {type(open_orders)}")
-            logging.debug(f"Contents of open_orders: {open_orders}")
-
-            if isinstance(open_orders, list):
-                # Μετατροπή λίστας σε dictionary χρησιμοποιώντας την τιμή ως κλειδί
-                open_orders = {order['price']: order for order in open_orders}
-            
-            
-            # Επεξεργασία canceled orders & δημιουργία νέων (buy/sell)
-            try:
-                process_canceled_orders(
-                    exchange, canceled_orders, open_orders, current_price,
-                    new_buy_orders, new_sell_orders,
-                    statistics
-                )
-
-
-
-
-                
-                # Ενημέρωση του αρχείου μετά την επεξεργασία των ακυρωμένων παραγγελιών
-                logging.debug(f"5) Type of open_orders: {type(open_orders)}")
-                logging.debug(f"Contents of open_orders: {open_orders}")  
-                
-
-                if isinstance(open_orders, list):
-                    # Μετατροπή λίστας σε dictionary χρησιμοποιώντας την τιμή ως κλειδί
-                    open_orders = {order['price']: order for order in open_orders}                
-
-
-                
-            except Exception as e:
-                logging.error(f"Error in new order placement logic: {e}")
-                send_push_notification(f"ALERT: Error in new order placement logic: {e}")
-
-            # Τελικό logging
-            logging.debug(f"Final new_buy_orders: {new_buy_orders}")
-            logging.debug(f"Final new_sell_orders: {new_sell_orders}")
+        for order, price in plan["amend"]:
+            logging.info(f"{order['side'].capitalize()} order at price {order['price']} is out of range. It will be moved to {price:.4f}.")
+        for message in plan["skipped"]:
+            logging.warning(message)
+        if plan["skipped"]:
+            send_push_notification(f"ALERT: {plan['skipped'][0]}")
+
+        # 4) Εκτέλεση του σχεδίου σε δέσμες
+        book = OrderBook((order['price'], order) for order in open_orders)
+        if plan["cancel"] or plan["amend"] or plan["place"]:
+            enter_phase("execute")
+            canceled, amended, placed = execute_plan(exchange, plan, book)
+            logging.info(f"Grid plan executed: {canceled} orders canceled, {amended} moved, {placed} placed.")
+            if "excess" in reasons:
+                send_push_notification("ALERT: Grid range adjusted successfully!")
         else:
             logging.info("No grid alteration was made. All orders are within the range.")
 
-        
-        
-        
-        
-        # 6) Διατήρηση ισορροπίας μεταξύ buy & sell
-        maintain_order_balance(exchange, current_price, buy_orders, sell_orders, new_buy_orders, new_sell_orders)
-
-        # 7) Έλεγχος & διόρθωση για υπερβάλλοντες παραγγελίες
-        handle_excess_orders(exchange, buy_orders, sell_orders, current_price)
-        
-        
-        # 8) Στο τέλος του adjust_grid_range
-        logging.debug(f"8) Type of open_orders: {type(open_orders)}")
-        logging.debug(f"Contents of open_orders: {open_orders}")  
-
-        if isinstance(open_orders, list):
-            # Μετατροπή λίστας σε dictionary χρησιμοποιώντας την τιμή ως κλειδί
-            open_orders = {order['price']: order for order in open_orders}
+        enter_phase("save")
+        save_open_orders_to_file(OPEN_ORDERS_FILE, book)
 
-        
-        save_open_orders_to_file(OPEN_ORDERS_FILE, open_orders, statistics=statistics)
-
-        
-        
         # Μετά την ολοκλήρωση του iteration
         iteration_end = time.time()
         logging.info(f"Bot execution completed in {iteration_end - iteration_start:.2f} seconds.")        
 
+    except ExchangeCircuitOpen:
+        raise  # Δεν είναι σφάλμα της προσαρμογής, βλ. run_instrumented_adjustment
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+        raise  # Η έκβαση (iterations_total) καταγράφεται από το run_instrumented_adjustment
+    finally:
+        if exchange is not None:
+            exchange.log_call_summary()
 
 
 
 
 
-# Κύριος κώδικας του Grid Adjustment Script
-if __name__ == "__main__":
+def run_instrumented_adjustment(exchange=None):
+    """
+    Εκτελεί μία προσαρμογή για κάθε grid του GRID_CONFIG (με pause flag), με κοινή σύνδεση στο exchange,
+    και καταγράφει διάρκεια και έκβαση στα metrics. Επιστρέφει το exchange για επαναχρησιμοποίηση.
+    """
     try:
         # Δημιουργία του pause flag
         create_pause_flag()
-        
-        # Λογική ρύθμισης grid
-        adjust_grid_range()
 
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
+        if exchange is None:
+            enter_phase("initialize")
+            exchange = initialize_exchange()
+            enter_phase(None)
+
+        # Degraded mode: με ανοιχτό circuit breaker δεν γίνεται καμία προσαρμογή, μόνο το health probe
+        if not exchange.is_available():
+            logging.warning(f"{EXCHANGE_NAME} circuit is open. Skipping this adjustment (degraded mode).")
+            return exchange
+
+        for grid in GRID_CONFIGS:
+            activate_grid(grid)
+            start = time.perf_counter()
+            outcome = "success"
+            try:
+                # Λογική ρύθμισης grid
+                adjust_grid_range(exchange)
+            except ExchangeCircuitOpen as e:
+                # Το κύκλωμα άνοιξε στη διάρκεια της προσαρμογής: το grid παραλείπεται χωρίς να μετρηθεί ως σφάλμα
+                outcome = "skipped"
+                logging.warning(f"Skipping {SYMBOL} adjustment: {e}.")
+            except Exception:
+                outcome = "error"
+            finally:
+                enter_phase(None)
+                METRICS.observe("iteration_duration_seconds", time.perf_counter() - start, symbol=SYMBOL)
+                METRICS.inc("iterations_total", outcome=outcome, symbol=SYMBOL)
+                METRICS.set("last_iteration_timestamp_seconds", time.time(), symbol=SYMBOL)
     finally:
         # Διαγραφή του pause flag στο τέλος
-        remove_pause_flag()
\ No newline at end of file
+        remove_pause_flag()
+
+    return exchange
+
+
+
+# Κύριος κώδικας του Grid Adjustment Script
+if __name__ == "__main__":
+    if RUN_AS_DAEMON:
+        start_metrics_server(METRICS_HTTP_PORT)
+        exchange = None
+        while True:
+            try:
+                reload_config_if_changed()  # Στο όριο μεταξύ γύρων, ώστε ένας γύρος να τρέχει με ίδιες ρυθμίσεις
+                exchange = run_instrumented_adjustment(exchange)
+            except Exception as e:
+                logging.error(f"An error occurred: {e}")
+            time.sleep(DAEMON_INTERVAL_SECONDS)
+    else:
+        try:
+            run_instrumented_adjustment()
+
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+        finally:
+            write_metrics_textfile(METRICS_TEXTFILE_PATH)
\ No newline at end of file
@@ -1,27 +1,46 @@
 from flask import Flask, jsonify
 import ccxt
 import json
+import logging
+import os
+import time
 from datetime import datetime
+from state_format import StateFileError, load_state
 
 app = Flask(__name__)
 
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
 
 # Configuration files
-CONFIG_FILE = "/opt/python/grid-trading-bot/config.json"
-ORDERS_FILE = "/opt/python/grid-trading-bot/worker_open_orders.json"
+BOT_HOME = os.environ.get("GRID_BOT_HOME", "/opt/python/grid-trading-bot")
+CONFIG_FILE = os.path.join(BOT_HOME, "config.json")
+ORDERS_FILE = os.path.join(BOT_HOME, "worker_open_orders.json")
+STATISTICS_FILE = os.path.join(BOT_HOME, "main_open_orders.json")  # Τα statistics (ledger εκτελέσεων) τα γράφει το main bot
 
 
 #################################################################################################################################################################################################
 
 # Φόρτωση μεταβλητών απο αρχείο ρυθμίσεων
 def load_pair_and_exchange():
-    """Load PAIR and EXCHANGE_NAME from the JSON configuration file."""
+    """Load PAIR, EXCHANGE_NAME, MAX_ORDERS and the main bot's orders file of the pair from the JSON configuration file."""
     try:
         with open(CONFIG_FILE, "r") as file:
             keys = json.load(file)
             
-            # Ανάγνωση της ενότητας GRID_CONFIG
+            # Ανάγνωση της ενότητας GRID_CONFIG (σε multi-grid ρύθμιση το dashboard δείχνει το πρώτο ζεύγος)
             grid_config = keys.get("GRID_CONFIG", {})
+            statistics_file = STATISTICS_FILE
+            if isinstance(grid_config, list):
+                if len(grid_config) > 1:
+                    base, extension = os.path.splitext(STATISTICS_FILE)
+                    statistics_file = f"{base}_{grid_config[0].get('SYMBOL', '').replace('/', '_')}{extension}"
+                grid_config = grid_config[0] if grid_config else {}
+            statistics_file = grid_config.get("OPEN_ORDERS_FILE", statistics_file)
             pair = grid_config.get("SYMBOL")
             exchange_name = grid_config.get("EXCHANGE_NAME")
             
@@ -34,7 +53,7 @@ def load_pair_and_exchange():
                     missing_keys.append("EXCHANGE_NAME")
                 raise ValueError(f"Missing keys in the JSON file: {', '.join(missing_keys)}")
 
-            return pair, exchange_name
+            return pair, exchange_name, grid_config.get("MAX_ORDERS"), statistics_file
     except FileNotFoundError:
         raise FileNotFoundError(f"The specified JSON file '{CONFIG_FILE}' was not found.")
     except json.JSONDecodeError:
@@ -43,12 +62,105 @@ def load_pair_and_exchange():
 
 
 # Φόρτωση PAIR και EXCHANGE_NAME
-PAIR, EXCHANGE_NAME = load_pair_and_exchange()        
+PAIR, EXCHANGE_NAME, MAX_ORDERS, STATISTICS_FILE = load_pair_and_exchange()        
         
         
 
 
 
+# Request weight ανά μέθοδο API (τιμές Binance spot, με symbol). Όσες λείπουν μετράνε 1.
+API_CALL_WEIGHTS = {
+    "load_markets": 20,
+    "fetch_ticker": 2,
+    "fetch_balance": 20,
+    "fetch_open_orders": 6,
+    "fetch_order": 4,
+    "fetch_order_status": 4,
+    "fetch_my_trades": 20,
+}
+
+# Προθέματα μεθόδων του ccxt που κάνουν πραγματικά αιτήματα στο API
+API_METHOD_PREFIXES = ("fetch_", "create_", "cancel_", "edit_", "load_markets")
+
+# Όρια (σε δευτερόλεπτα) για το ιστόγραμμα latency των κλήσεων
+API_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class InstrumentedExchange:
+    """
+    Proxy γύρω από το ccxt exchange που καταγράφει για κάθε μέθοδο API
+    πλήθος κλήσεων, request weight, ιστόγραμμα latency και κλάσεις σφαλμάτων.
+    Όλα τα υπόλοιπα attributes προωθούνται αυτούσια στο exchange.
+    """
+
+    def __init__(self, exchange):
+        self._exchange = exchange
+        self.call_stats = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if callable(attr) and name.startswith(API_METHOD_PREFIXES):
+            return self._instrument(name, attr)
+        return attr
+
+    def _instrument(self, name, method):
+        def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                self._record(name, time.perf_counter() - start, error=type(e).__name__)
+                raise
+            self._record(name, time.perf_counter() - start)
+            return result
+        return instrumented
+
+    def _record(self, name, elapsed, error=None):
+        stats = self.call_stats.get(name)
+        if stats is None:
+            stats = self.call_stats[name] = {
+                "calls": 0,
+                "weight": 0,
+                "latency_sum": 0.0,
+                "latency_max": 0.0,
+                "buckets": [0] * (len(API_LATENCY_BUCKETS) + 1),
+                "errors": {},
+            }
+        stats["calls"] += 1
+        stats["weight"] += API_CALL_WEIGHTS.get(name, 1)
+        stats["latency_sum"] += elapsed
+        stats["latency_max"] = max(stats["latency_max"], elapsed)
+        bucket = next((i for i, bound in enumerate(API_LATENCY_BUCKETS) if elapsed <= bound), len(API_LATENCY_BUCKETS))
+        stats["buckets"][bucket] += 1
+        if error:
+            stats["errors"][error] = stats["errors"].get(error, 0) + 1
+
+    def reset_call_stats(self):
+        self.call_stats = {}
+
+    def log_call_summary(self, label="iteration", reset=True):
+        """
+        Καταγράφει σύνοψη των κλήσεων API (ανά μέθοδο, ταξινομημένες κατά weight).
+        """
+        total_calls = sum(s["calls"] for s in self.call_stats.values())
+        total_weight = sum(s["weight"] for s in self.call_stats.values())
+        total_errors = sum(sum(s["errors"].values()) for s in self.call_stats.values())
+        logging.info(f"[API] {label} summary: {total_calls} calls, weight {total_weight}, errors {total_errors}")
+
+        bucket_labels = [f"<={bound}s" for bound in API_LATENCY_BUCKETS] + [f">{API_LATENCY_BUCKETS[-1]}s"]
+        for name, s in sorted(self.call_stats.items(), key=lambda item: item[1]["weight"], reverse=True):
+            histogram = ", ".join(f"{bucket_label}: {count}" for bucket_label, count in zip(bucket_labels, s["buckets"]) if count)
+            logging.info(
+                f"[API] {name}: calls={s['calls']} weight={s['weight']} "
+                f"avg={s['latency_sum'] / s['calls']:.3f}s max={s['latency_max']:.3f}s "
+                f"latency={{{histogram}}} errors={s['errors'] or '{}'}"
+            )
+
+        if reset:
+            self.reset_call_stats()
+
+
+
 # Σύνδεση με το exchange μέσω ccxt
 def initialize_exchange():
     try:
@@ -59,18 +171,18 @@ def initialize_exchange():
             "secret": keys["API_SECRET"],
             "enableRateLimit": True
         })
+        exchange = InstrumentedExchange(exchange)
         exchange.load_markets()
         return exchange
     except Exception as e:
         raise RuntimeError(f"Failed to initialize exchange: {e}")
 
-# Φόρτωση παραγγελιών και στατιστικών από το αρχείο JSON
+# Φόρτωση παραγγελιών και στατιστικών από το αρχείο του worker (.json ή .msgpack)
 def load_open_orders():
     try:
-        with open(ORDERS_FILE, "r") as f:
-            data = json.load(f)
-        return data
-    except (FileNotFoundError, json.JSONDecodeError):
+        orders, data = load_state(ORDERS_FILE)
+        return {"orders": orders, **data}
+    except (FileNotFoundError, StateFileError):
         return {
             "orders": {},
             "statistics": {
@@ -90,6 +202,8 @@ def get_current_price():
         return jsonify({"current_price": current_price})
     except Exception as e:
         return jsonify({"error": f"Failed to fetch current price: {e}"}), 500
+    finally:
+        exchange.log_call_summary(label="/GRID/current-price")
 
 # Endpoint 2: Ανοιχτές Παραγγελίες
 @app.route("/GRID/existing-orders", methods=["GET"])
@@ -139,6 +253,8 @@ def sell_threshold_evaluation():
         current_price = ticker["last"]
     except Exception as e:
         return jsonify({"error": f"Failed to fetch current price: {e}"}), 500
+    finally:
+        exchange.log_call_summary(label="/GRID/sell-threshold")
 
     evaluations = []
     for price, order in data["orders"].items():
@@ -154,15 +270,88 @@ def sell_threshold_evaluation():
 
     return jsonify({"evaluations": evaluations})
 
+# Το αρχείο του main bot διαβάζεται ξανά μόνο όταν αλλάξει (mtime / μέγεθος), όχι σε κάθε αίτημα
+_main_orders_cache = {"signature": None, "data": {}}
+
+
+def load_main_orders():
+    """Τα περιεχόμενα του αρχείου παραγγελιών του main bot (orders / statistics), από cache όσο δεν αλλάζει."""
+    try:
+        stat = os.stat(STATISTICS_FILE)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != _main_orders_cache["signature"]:
+            orders, data = load_state(STATISTICS_FILE)
+            _main_orders_cache["data"] = {"orders": orders, **data}
+            _main_orders_cache["signature"] = signature
+    except (FileNotFoundError, StateFileError):
+        return {}
+    return _main_orders_cache["data"]
+
+
+# Φόρτωση των statistics του main bot (ledger εκτελέσεων)
+def load_statistics():
+    return load_main_orders().get("statistics", {})
+
+
+def average_hold_hours(closed_qty, hold_seconds):
+    """Μέσος χρόνος διακράτησης (σε ώρες, σταθμισμένος με την ποσότητα) των lots που έκλεισαν."""
+    return round(hold_seconds / closed_qty / 3600, 2) if closed_qty else None
+
 # Endpoint 4: Συνολικές Συναλλαγές
 @app.route("/GRID/totals", methods=["GET"])
 def get_totals():
-    data = load_open_orders()
-    statistics = data.get("statistics", {})
+    statistics = load_statistics()
     return jsonify({
         "total_buys": statistics.get("total_buys", 0),
         "total_sells": statistics.get("total_sells", 0),
-        "net_profit": statistics.get("net_profit", 0.0)
+        "net_profit": statistics.get("net_profit", 0.0),
+        "realized_pnl": statistics.get("realized_pnl", 0.0),
+        "fees": statistics.get("fees", 0.0),
+        "inventory": statistics.get("inventory", 0.0),
+    })
+
+# Endpoint 5: Ωριαία / ημερήσια σύνολα εκτελέσεων. Τα ενημερώνει το ledger του main bot σε κάθε fill,
+# οπότε εδώ απλώς διαβάζονται (τελευταίες 48 ώρες / 90 ημέρες)
+@app.route("/GRID/rollups/<period>", methods=["GET"])
+def get_rollups(period):
+    if period not in ("hourly", "daily"):
+        return jsonify({"error": f"Unknown period '{period}'. Use 'hourly' or 'daily'."}), 404
+    rollups = load_statistics().get("rollups", {}).get(period, {})
+    buckets = []
+    for start, bucket in sorted(rollups.items()):
+        buckets.append({
+            "start": start,
+            "buys": bucket["buys"],
+            "sells": bucket["sells"],
+            "volume": round(bucket["volume"], 8),
+            "notional": round(bucket["notional"], 8),
+            "realized_pnl": round(bucket["realized_pnl"], 8),
+            "fees": round(bucket["fees"], 8),
+            "net_profit": round(bucket["realized_pnl"] - bucket["fees"], 8),
+            "avg_hold_hours": average_hold_hours(bucket["closed_qty"], bucket["hold_seconds"]),
+        })
+    return jsonify({"period": period, "buckets": buckets})
+
+# Endpoint 6: Μέσος χρόνος διακράτησης (από την πρώτη εκτέλεση του ledger)
+@app.route("/GRID/hold-time", methods=["GET"])
+def get_hold_time():
+    statistics = load_statistics()
+    return jsonify({
+        "closed_qty": statistics.get("closed_qty", 0.0),
+        "avg_hold_hours": average_hold_hours(statistics.get("closed_qty", 0.0), statistics.get("hold_seconds", 0.0)),
+    })
+
+# Endpoint 7: Χρήση του grid (ανοιχτές παραγγελίες του main bot ως ποσοστό του MAX_ORDERS)
+@app.route("/GRID/utilization", methods=["GET"])
+def get_utilization():
+    orders = load_main_orders().get("orders", {})
+    buys = sum(1 for order in orders.values() if order.get("side") == "buy")
+    return jsonify({
+        "open_orders": len(orders),
+        "buy_orders": buys,
+        "sell_orders": len(orders) - buys,
+        "max_orders": MAX_ORDERS,
+        "utilization": round(len(orders) / MAX_ORDERS, 4) if MAX_ORDERS else None,
     })
 
 if __name__ == "__main__":
@@ -1,34 +1,230 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sendgrid import SendGridAPIClient
-from collections import defaultdict 
+from collections import defaultdict, deque
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from sendgrid.helpers.mail import Mail
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import atexit
+import bisect
 import ccxt
+import gzip
+import heapq
 import time
 import logging
+import logging.handlers
 import json
 import os
+import queue
+import random
+import shutil
+import signal
+import sys
+import threading
 import pushover
+from state_format import ORDER_FIELDS, StateFileError, legacy_statistics, load_state, save_state
+from trade_archive import TradeArchive
 
 
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,  # Ρύθμιση για εμφάνιση μόνο INFO και πάνω
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("/opt/python/grid-trading-bot/grid_trading_bot.log"),  # Αρχείο log
+# Φάκελος δεδομένων του bot (config, αρχεία παραγγελιών, logs). Ο grid-supervisor.py δίνει
+# σε κάθε λογαριασμό δικό του φάκελο μέσω της μεταβλητής περιβάλλοντος GRID_BOT_HOME.
+BOT_HOME = os.environ.get("GRID_BOT_HOME", "/opt/python/grid-trading-bot")
+
+LOG_FILE_PATH = os.path.join(BOT_HOME, "grid_trading_bot.log")
+LOG_FORMAT = "text"  # "text" (κλασική μορφή) ή "json" (μία εγγραφή JSON ανά γραμμή)
+LOG_LEVEL = "INFO"  # Ρύθμιση για εμφάνιση μόνο INFO και πάνω
+
+# Περιστροφή του αρχείου log: "size" (στα LOG_MAX_BYTES) ή "time" (κάθε μεσάνυχτα), με LOG_BACKUP_COUNT
+# παλιά αρχεία, συμπιεσμένα με gzip όταν LOG_COMPRESS_ROTATED = True
+LOG_ROTATION = "size"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 7
+LOG_COMPRESS_ROTATED = True
+
+# Επίπεδο logging ανά φάση του iteration (βλ. enter_phase), π.χ. {"reconcile": "DEBUG", "replenish": "WARNING"}
+PHASE_LOG_LEVELS = {}
+
+# Όρια μεγέθους για τις συνόψεις παραγγελιών / τιμών που γράφονται στα logs
+LOG_PAYLOAD_MAX_ITEMS = 10
+LOG_PAYLOAD_MAX_CHARS = 1000
+
+# Τα πεδία που έχει κάθε LogRecord, ώστε στο JSON να προστίθενται μόνο όσα δόθηκαν με extra=...
+STANDARD_LOG_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "phase"}
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Μορφοποιεί κάθε εγγραφή ως μία γραμμή JSON, με τη φάση του iteration και τα extra πεδία."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "phase": getattr(record, "phase", None),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_LOG_RECORD_FIELDS:
+                entry[key] = value
+        # Οι εγγραφές από την ουρά (βλ. PreparedQueueHandler) έχουν ήδη μορφοποιημένο το traceback στο exc_text
+        exception = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class PhaseLevelFilter(logging.Filter):
+    """
+    Εφαρμόζει το επίπεδο της τρέχουσας φάσης (PHASE_LOG_LEVELS) πριν από τη μορφοποίηση,
+    ώστε τα μηνύματα που απορρίπτονται να μην κοστίζουν τίποτα.
+    """
+
+    def filter(self, record):
+        record.phase = current_phase
+        level = PHASE_LOG_LEVELS.get(current_phase, LOG_LEVEL)
+        return record.levelno >= logging.getLevelName(level)
+
+
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Βάζει τις εγγραφές σε ουρά για το thread του QueueListener, που κάνει τη μορφοποίηση και το I/O.
+    Στο thread του bot γίνεται μόνο η συγχώνευση του μηνύματος (τα ορίσματα μπορεί να αλλάξουν αργότερα)
+    και του traceback· η φάση και το φίλτρο επιπέδου εφαρμόζονται πριν μπει η εγγραφή στην ουρά.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def compress_rotated_log(source, dest):
+    """Rotator των handlers του log: συμπιέζει το αρχείο που περιστράφηκε σε gzip."""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class LazySummary:
+    """
+    Σύνοψη ενός payload που υπολογίζεται μόνο όταν το μήνυμα γραφτεί πραγματικά
+    (χρήση ως όρισμα %s στο logging, όχι μέσα σε f-string).
+    """
+
+    def __init__(self, func, payload):
+        self.func = func
+        self.payload = payload
+
+    def __str__(self):
+        text = self.func(self.payload)
+        if len(text) > LOG_PAYLOAD_MAX_CHARS:
+            text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}... ({len(text)} chars)"
+        return text
+
+
+def _describe_order(order):
+    if not isinstance(order, dict):
+        return str(order)
+    return f"{order.get('id')}@{order.get('price')} {order.get('side')}/{order.get('status')}"
+
+
+def _describe_orders(orders):
+    items = list(orders.values()) if isinstance(orders, Mapping) else list(orders or [])
+    buys = sum(1 for order in items if isinstance(order, dict) and order.get("side") == "buy")
+    shown = ", ".join(_describe_order(order) for order in items[:LOG_PAYLOAD_MAX_ITEMS])
+    if len(items) > LOG_PAYLOAD_MAX_ITEMS:
+        shown += f", ... (+{len(items) - LOG_PAYLOAD_MAX_ITEMS} more)"
+    return f"{len(items)} orders (buy={buys}, sell={len(items) - buys}) [{shown}]"
+
+
+def _describe_prices(prices):
+    prices = list(prices or [])
+    if not prices:
+        return "[]"
+    shown = ", ".join(f"{price:.4f}" for price in prices[:LOG_PAYLOAD_MAX_ITEMS])
+    if len(prices) > LOG_PAYLOAD_MAX_ITEMS:
+        shown += f", ... (+{len(prices) - LOG_PAYLOAD_MAX_ITEMS} more)"
+    return f"{len(prices)} levels {min(prices):.4f}..{max(prices):.4f} [{shown}]"
+
+
+def _describe_statistics(statistics):
+    # Τα lots και τα rollups είναι δομές που μεγαλώνουν με τα fills: στο log μπαίνουν μόνο τα σύνολα
+    return "{ " + ", ".join(
+        f"{key}: {round(value, 2) if isinstance(value, (int, float)) else value}"
+        for key, value in statistics.items() if key not in ("lots", "rollups")
+    ) + " }"
+
+
+def summarize_order(order):
+    return LazySummary(_describe_order, order)
+
+
+def summarize_orders(orders):
+    return LazySummary(_describe_orders, orders)
+
+
+def summarize_prices(prices):
+    return LazySummary(_describe_prices, prices)
+
+
+def summarize_statistics(statistics):
+    return LazySummary(_describe_statistics, statistics)
+
+
+def setup_logging():
+    """Ρυθμίζει αρχείο log και κονσόλα με τη μορφή LOG_FORMAT και το φίλτρο επιπέδου ανά φάση."""
+    levels = [logging.getLevelName(LOG_LEVEL)] + [logging.getLevelName(level) for level in PHASE_LOG_LEVELS.values()]
+    if LOG_FORMAT == "json":
+        formatter = JsonLogFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    if LOG_ROTATION == "time":
+        file_handler = logging.handlers.TimedRotatingFileHandler(LOG_FILE_PATH, when="midnight", backupCount=LOG_BACKUP_COUNT)
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    if LOG_COMPRESS_ROTATED:
+        file_handler.namer = lambda name: name + ".gz"
+        file_handler.rotator = compress_rotated_log
+
+    handlers = [
+        file_handler,  # Αρχείο log
         logging.StreamHandler()  # Κονσόλα
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Το αρχείο και η κονσόλα γράφονται από το thread του listener, ώστε η καθυστέρηση του δίσκου
+    # να μην επιβαρύνει το iteration. Το φίλτρο ανά φάση τρέχει πριν από την ουρά, με τη φάση της στιγμής του log.
+    log_queue = queue.SimpleQueue()
+    queue_handler = PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(PhaseLevelFilter())
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)  # Γράφει ό,τι έχει μείνει στην ουρά πριν από την έξοδο
+
+    # Με SIGTERM (π.χ. από τον grid-supervisor.py) η έξοδος γίνεται με SystemExit, ώστε να τρέξει το atexit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Το root logger δέχεται το χαμηλότερο επίπεδο, το φίλτρο αποφασίζει ανά φάση
+    logging.basicConfig(level=min(levels), handlers=[queue_handler])
+
+
+setup_logging()
 
 
 
 
 # 1. ---------------------- Static / Global configuration ----------------------
 # Διαδρομές αρχείων συστήματος
-JSON_PATH = "/opt/python/grid-trading-bot/config.json"
-PAUSE_FLAG_PATH = "/opt/python/grid-trading-bot/pause.flag"
-OPEN_ORDERS_FILE = '/opt/python/grid-trading-bot/main_open_orders.json'
+JSON_PATH = os.path.join(BOT_HOME, "config.json")
+PAUSE_FLAG_PATH = os.path.join(BOT_HOME, "pause.flag")
+OPEN_ORDERS_FILE = os.path.join(BOT_HOME, "main_open_orders.json")
 
 # Παράμετροι Αποστολής E-mail
 ENABLE_EMAIL_NOTIFICATIONS = True
@@ -41,6 +237,43 @@ mock_order_counter = 0
 # Balance Check and adjust
 CHECK_BALANCE = True
 
+# Μέγιστος αριθμός παράλληλων αιτημάτων ακύρωσης (όταν το exchange δεν έχει cancel_orders)
+CANCEL_MAX_WORKERS = 5
+
+# Client order IDs των παραγγελιών του grid: "<bot>-<ζεύγος>-<b|s>-<τιμή σε 1/10000>", π.χ. "gb-XRPUSDT-b-21500".
+# Το main bot και το grid-adjustment.py ("ga") αναγνωρίζουν ως δικές τους μόνο παραγγελίες με αυτά τα προθέματα.
+CLIENT_ORDER_ID_PREFIX = "gb"
+GRID_CLIENT_ORDER_ID_PREFIXES = ("gb", "ga")
+
+# Επανάληψη παραγγελιών που απέτυχαν από σφάλμα δικτύου: ουρά με exponential backoff και jitter (χωρίς sleep)
+ORDER_RETRY_MAX_ATTEMPTS = 5
+ORDER_RETRY_BASE_DELAY = 2  # δευτερόλεπτα, διπλασιάζεται σε κάθε αποτυχία
+ORDER_RETRY_MAX_DELAY = 60
+
+# Προσαρμογή του εύρους του grid ως φάση του iteration (αντί για ξεχωριστό grid-adjustment.py).
+# Όταν είναι ενεργή, το grid-adjustment.py δεν χρειάζεται να τρέχει για τα ίδια ζεύγη.
+ENABLE_RANGE_ADJUSTMENT = False
+RANGE_TOLERANCE_RATIO = 0.01  # Ανοχή εκτός εύρους, ως ποσοστό της τρέχουσας τιμής
+
+# Τοπικό αρχείο εκτελέσεων και γεγονότων παραγγελιών (βλ. trade_archive.py), ανά ζεύγος και ημέρα,
+# για το dashboard και τα backtests χωρίς fetch_my_trades στο exchange
+ENABLE_TRADE_ARCHIVE = True
+TRADE_ARCHIVE_DIR = os.path.join(BOT_HOME, "archive")
+
+# Σύνολα εκτελέσεων ανά ώρα / ημέρα (UTC) που ενημερώνει το ledger σε κάθε fill, για το dashboard.
+# Κρατιούνται μόνο τα τελευταία ROLLUP_HOURLY_RETENTION ωριαία και ROLLUP_DAILY_RETENTION ημερήσια διαστήματα.
+ROLLUP_HOURLY_RETENTION = 48
+ROLLUP_DAILY_RETENTION = 90
+
+# Daemon mode: το bot τρέχει συνεχώς αντί για ένα iteration ανά εκτέλεση (cron)
+RUN_AS_DAEMON = os.environ.get("GRID_BOT_DAEMON") == "1"
+DAEMON_INTERVAL_SECONDS = 60
+
+# Metrics σε μορφή Prometheus: HTTP endpoint σε daemon mode, textfile collector σε cron mode
+METRICS_PREFIX = "grid_bot"
+METRICS_HTTP_PORT = int(os.environ.get("GRID_BOT_METRICS_PORT", 9101))
+METRICS_TEXTFILE_PATH = os.path.join(BOT_HOME, "metrics", "grid_bot.prom")
+
 
 
 # 2. ---------------------- Load Keys from external file ----------------------
@@ -61,18 +294,11 @@ def load_keys():
             email_sender = keys.get("EMAIL_SENDER")
             email_recipient = keys.get("EMAIL_RECIPIENT")
 
-            # Ρυθμίσεις Grid Configuration
+            # Ρυθμίσεις Grid Configuration: ένα dictionary (ένα ζεύγος) ή λίστα από dictionaries (πολλά ζεύγη)
             grid_config = keys.get("GRID_CONFIG", {})
-            exchange_name = grid_config.get("EXCHANGE_NAME")
-            symbol = grid_config.get("SYMBOL")
-            crypto_symbol = grid_config.get("CRYPTO_SYMBOL")
-            crypto_currency = grid_config.get("CRYPTO_CURRENCY")
-            grid_size = grid_config.get("GRID_SIZE")
-            amount = grid_config.get("AMOUNT")
-            grid_count = grid_config.get("GRID_COUNT")
-            max_orders = grid_config.get("MAX_ORDERS")
-            target_balance = grid_config.get("TARGET_BALANCE")
-            
+            grid_configs = grid_config if isinstance(grid_config, list) else [grid_config]
+            exchange_name = grid_configs[0].get("EXCHANGE_NAME") if grid_configs else None
+
             # Έλεγχος για κενές τιμές
             missing_keys = []
             if not api_key or not api_secret:
@@ -87,16 +313,27 @@ def load_keys():
                 missing_keys.append("EMAIL_SENDER")
             if not email_recipient:
                 missing_keys.append("EMAIL_RECIPIENT")
-            if not exchange_name or not symbol or not crypto_symbol or not crypto_currency:
-                missing_keys.extend(["EXCHANGE_NAME", "SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY"])
-            if grid_size is None or amount is None or grid_count is None or max_orders is None:
-                missing_keys.extend(["GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS"])
+            if not grid_configs:
+                missing_keys.append("GRID_CONFIG")
+            for index, grid in enumerate(grid_configs):
+                prefix = f"GRID_CONFIG[{index}]." if isinstance(grid_config, list) else ""
+                if not all(grid.get(key) for key in ("EXCHANGE_NAME", "SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY")):
+                    missing_keys.extend(prefix + key for key in ["EXCHANGE_NAME", "SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY"])
+                if any(grid.get(key) is None for key in ("GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS")):
+                    missing_keys.extend(prefix + key for key in ["GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS"])
+                elif any(isinstance(grid[key], bool) or not isinstance(grid[key], (int, float)) or grid[key] <= 0
+                         for key in ("GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS")):
+                    raise ValueError(f"{prefix}GRID_SIZE, AMOUNT, GRID_COUNT and MAX_ORDERS must be positive numbers.")
             
             if missing_keys:
                 raise ValueError(f"Missing keys in the JSON file: {', '.join(missing_keys)}")
 
+            # Όλα τα grids μοιράζονται την ίδια σύνδεση, άρα και το ίδιο exchange
+            if len({grid.get("EXCHANGE_NAME") for grid in grid_configs}) > 1:
+                raise ValueError("All GRID_CONFIG entries must use the same EXCHANGE_NAME.")
+
             return (api_key, api_secret, sendgrid_api_key, pushover_token, pushover_user, email_sender, email_recipient,
-                    exchange_name, symbol, crypto_symbol, crypto_currency, grid_size, amount, grid_count, max_orders, target_balance)
+                    exchange_name, grid_configs)
     except FileNotFoundError:
         raise FileNotFoundError(f"The specified JSON file '{JSON_PATH}' was not found.")
     except json.JSONDecodeError:
@@ -106,9 +343,105 @@ def load_keys():
 
 
 
+def assign_orders_files(grid_configs, default_file_path):
+    """
+    Ορίζει σε κάθε grid το δικό του αρχείο παραγγελιών (αν δεν έχει δοθεί OPEN_ORDERS_FILE).
+    Με ένα μόνο grid κρατάμε το αρχικό όνομα αρχείου, ώστε το υπάρχον state να συνεχίζει να φορτώνεται.
+    """
+    base, extension = os.path.splitext(default_file_path)
+    for grid in grid_configs:
+        if len(grid_configs) == 1:
+            grid.setdefault("OPEN_ORDERS_FILE", default_file_path)
+        else:
+            grid.setdefault("OPEN_ORDERS_FILE", f"{base}_{grid['SYMBOL'].replace('/', '_')}{extension}")
+    return grid_configs
+
+
+def activate_grid(grid):
+    """
+    Φορτώνει τις ρυθμίσεις ενός grid στις global μεταβλητές (SYMBOL, GRID_SIZE, ...),
+    ώστε οι υπόλοιπες συναρτήσεις να δουλεύουν για το συγκεκριμένο ζεύγος.
+    """
+    global SYMBOL, CRYPTO_SYMBOL, CRYPTO_CURRENCY, GRID_SIZE, AMOUNT, GRID_COUNT, MAX_ORDERS, TARGET_BALANCE, OPEN_ORDERS_FILE
+    SYMBOL = grid["SYMBOL"]
+    CRYPTO_SYMBOL = grid["CRYPTO_SYMBOL"]
+    CRYPTO_CURRENCY = grid["CRYPTO_CURRENCY"]
+    GRID_SIZE = grid["GRID_SIZE"]
+    AMOUNT = grid["AMOUNT"]
+    GRID_COUNT = grid["GRID_COUNT"]
+    MAX_ORDERS = grid["MAX_ORDERS"]
+    TARGET_BALANCE = grid.get("TARGET_BALANCE")
+    OPEN_ORDERS_FILE = grid["OPEN_ORDERS_FILE"]
+
+
+
+
 # Load configuration from the JSON file
 (API_KEY, API_SECRET, SENDGRID_API_KEY, PUSHOVER_TOKEN, PUSHOVER_USER, EMAIL_SENDER, EMAIL_RECIPIENT,
- EXCHANGE_NAME, SYMBOL, CRYPTO_SYMBOL, CRYPTO_CURRENCY, GRID_SIZE, AMOUNT, GRID_COUNT, MAX_ORDERS, TARGET_BALANCE) = load_keys()
+ EXCHANGE_NAME, GRID_CONFIGS) = load_keys()
+GRID_CONFIGS = assign_orders_files(GRID_CONFIGS, OPEN_ORDERS_FILE)
+
+# Το πρώτο grid είναι ενεργό by default (συμβατότητα με single-symbol χρήση)
+activate_grid(GRID_CONFIGS[0])
+
+
+# Hot reload του config.json σε daemon mode: στην αρχή κάθε γύρου ελέγχεται αν άλλαξε το αρχείο και, αν είναι
+# έγκυρο, εφαρμόζονται οι CONFIG_RELOADABLE_KEYS κάθε ζεύγους. Αλλαγές σε κλειδιά API, exchange ή ζεύγη θέλουν επανεκκίνηση.
+CONFIG_RELOADABLE_KEYS = ("GRID_SIZE", "AMOUNT", "GRID_COUNT", "MAX_ORDERS", "TARGET_BALANCE")
+
+
+def config_file_signature():
+    """(mtime, μέγεθος) του config.json, για να εντοπίζονται οι αλλαγές χωρίς να διαβάζεται το αρχείο."""
+    try:
+        stat = os.stat(JSON_PATH)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+config_signature = config_file_signature()
+
+
+def reload_config_if_changed():
+    """
+    Εφαρμόζει στα GRID_CONFIGS τις νέες παραμέτρους από το config.json, αν άλλαξε από τον προηγούμενο γύρο.
+    Ένα άκυρο αρχείο αγνοείται (οι τρέχουσες ρυθμίσεις μένουν) μέχρι την επόμενη αλλαγή του.
+    Επιστρέφει τα σύμβολα των grids που άλλαξαν.
+    """
+    global config_signature
+    signature = config_file_signature()
+    if signature is None or signature == config_signature:
+        return []
+    config_signature = signature
+
+    try:
+        (api_key, api_secret, _, _, _, _, _, exchange_name, grid_configs) = load_keys()
+    except (OSError, ValueError) as e:
+        logging.error(f"Ignoring changed config.json, keeping the current settings: {e}")
+        METRICS.inc("config_reloads_total", outcome="invalid")
+        return []
+
+    identity_keys = ("SYMBOL", "CRYPTO_SYMBOL", "CRYPTO_CURRENCY")
+    if ((api_key, api_secret, exchange_name) != (API_KEY, API_SECRET, EXCHANGE_NAME)
+            or sorted(tuple(grid.get(key) for key in identity_keys) for grid in grid_configs)
+            != sorted(tuple(grid.get(key) for key in identity_keys) for grid in GRID_CONFIGS)):
+        logging.warning("config.json changes to API keys, EXCHANGE_NAME or the traded pairs need a restart. "
+                        "Applying only the grid parameters of the existing pairs.")
+
+    new_grids = {grid["SYMBOL"]: grid for grid in grid_configs}
+    changed = []
+    for grid in GRID_CONFIGS:
+        new_grid = new_grids.get(grid["SYMBOL"], {})
+        changes = {key: (grid.get(key), new_grid.get(key)) for key in CONFIG_RELOADABLE_KEYS
+                   if new_grid and grid.get(key) != new_grid.get(key)}
+        if not changes:
+            continue
+        grid.update((key, new) for key, (_, new) in changes.items())
+        logging.info(f"Reloaded config for {grid['SYMBOL']}: " + ", ".join(f"{key} {old} -> {new}" for key, (old, new) in changes.items()))
+        changed.append(grid["SYMBOL"])
+
+    METRICS.inc("config_reloads_total", outcome="applied" if changed else "unchanged")
+    return changed
 
              
 
@@ -120,6 +453,183 @@ def is_paused():
 
 
 
+# ---------------------- Metrics ----------------------
+# Ορισμοί metrics: όνομα -> (τύπος, περιγραφή)
+METRIC_DEFINITIONS = {
+    "api_calls_total": ("counter", "Exchange API calls per method."),
+    "api_request_weight_total": ("counter", "Exchange request weight consumed per method."),
+    "api_errors_total": ("counter", "Exchange API errors per method and error class."),
+    "api_call_duration_seconds": ("histogram", "Exchange API call latency per method."),
+    "api_short_circuited_total": ("counter", "Exchange API calls skipped while the circuit was open per method."),
+    "api_deferred_total": ("counter", "Exchange API calls deferred for lack of request weight (low: queued, normal: skipped for the iteration) per method and priority."),
+    "api_used_weight": ("gauge", "Request weight used in the current minute as reported by the exchange."),
+    "circuit_trips_total": ("counter", "Times the exchange circuit breaker opened."),
+    "circuit_open": ("gauge", "1 while the exchange circuit breaker is open."),
+    "config_reloads_total": ("counter", "config.json changes detected in daemon mode per outcome."),
+    "state_saves_total": ("counter", "Orders file saves per outcome (written, skipped when unchanged, failed)."),
+    "phase_duration_seconds": ("histogram", "Duration of each phase of run_grid_trading_bot."),
+    "iteration_duration_seconds": ("histogram", "Duration of a full bot iteration."),
+    "iterations_total": ("counter", "Bot iterations per outcome."),
+    "last_iteration_timestamp_seconds": ("gauge", "Unix time of the last completed iteration."),
+    "fills_total": ("counter", "Filled grid orders per side."),
+    "orders_placed_total": ("counter", "Orders placed per side."),
+    "orders_canceled_total": ("counter", "Orders canceled by the bot."),
+    "order_placement_failures_total": ("counter", "Order placements that failed after all retries."),
+    "order_placement_retries_total": ("counter", "Order placements retried from the retry queue per outcome."),
+    "pending_order_retries": ("gauge", "Order placements waiting in the retry queue."),
+    "reconcile_drift_total": ("counter", "Local orders out of sync with the exchange per kind."),
+    "reconcile_drift": ("gauge", "Local orders out of sync with the exchange in the last reconciliation."),
+    "range_adjustments_total": ("counter", "Orders canceled or placed by the range adjustment phase per kind."),
+    "open_orders": ("gauge", "Open grid orders per side."),
+    "canceled_orders": ("gauge", "Orders canceled by the range worker and retained locally."),
+    "total_buys": ("gauge", "Filled buy orders recorded in the profit ledger."),
+    "total_sells": ("gauge", "Filled sell orders recorded in the profit ledger."),
+    "net_profit": ("gauge", "Realized profit minus fees from the profit ledger."),
+    "realized_pnl": ("gauge", "Realized profit before fees from the profit ledger."),
+    "fees": ("gauge", "Trading fees paid in the quote currency."),
+    "inventory": ("gauge", "Net base currency bought and not yet sold by the grid."),
+}
+
+# Default όρια ιστογράμματος (σε δευτερόλεπτα) για φάσεις και iterations
+METRIC_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class MetricsRegistry:
+    """
+    Απλό registry για counters, gauges και histograms με labels,
+    που αποδίδεται σε Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix, definitions):
+        self.prefix = prefix
+        self.definitions = definitions
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.samples.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.samples.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, buckets=METRIC_DURATION_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.samples.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for name, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{name}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.samples.items()):
+                metric_type, help_text = self.definitions.get(name, ("untyped", name))
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in sorted(series.items()):
+                    if metric_type != "histogram":
+                        lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(value["buckets"], value["counts"]):
+                        lines.append(f"{full_name}_bucket{self._format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{full_name}_sum{self._format_labels(labels)} {value['sum']}")
+                    lines.append(f"{full_name}_count{self._format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(METRICS_PREFIX, METRIC_DEFINITIONS)
+
+# Τρέχουσα φάση του iteration και χρονική στιγμή έναρξής της
+current_phase = None
+current_phase_started = None
+
+
+def enter_phase(phase):
+    """
+    Κλείνει την τρέχουσα φάση του iteration (καταγράφοντας τη διάρκειά της) και ξεκινά τη νέα.
+    Με phase=None απλώς κλείνει την τρέχουσα.
+    """
+    global current_phase, current_phase_started
+    now = time.perf_counter()
+    if current_phase is not None:
+        METRICS.observe("phase_duration_seconds", now - current_phase_started, phase=current_phase)
+    current_phase, current_phase_started = phase, now
+
+
+def update_order_metrics(open_orders, statistics, canceled_orders=None):
+    """Ενημερώνει τα gauges για τις ανοιχτές παραγγελίες και τα στατιστικά."""
+    sides = {"buy": 0, "sell": 0}
+    for order in open_orders.values():
+        if order.get("side") in sides:
+            sides[order["side"]] += 1
+    for side, count in sides.items():
+        METRICS.set("open_orders", count, side=side, symbol=SYMBOL)
+    METRICS.set("canceled_orders", len(canceled_orders or {}), symbol=SYMBOL)
+    for key in ("total_buys", "total_sells", "net_profit", "realized_pnl", "fees", "inventory"):
+        METRICS.set(key, statistics.get(key, 0), symbol=SYMBOL)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Χωρίς access log για κάθε scrape
+
+
+def start_metrics_server(port):
+    """Ξεκινά HTTP endpoint /metrics σε background thread (μόνο σε localhost)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics endpoint listening on http://127.0.0.1:{port}/metrics")
+    return server
+
+
+def write_metrics_textfile(file_path):
+    """Γράφει τα metrics σε αρχείο για τον textfile collector του node_exporter (cron mode)."""
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_file_path = file_path + ".tmp"
+        with open(temp_file_path, "w") as f:
+            f.write(METRICS.render())
+        os.replace(temp_file_path, file_path)
+    except Exception as e:
+        logging.error(f"Failed to write metrics to {file_path}: {e}")
+
+
+
+
 # 3. ---------------------- Notifications ----------------------
 def send_push_notification(message, log_to_file=True):
     """
@@ -206,6 +716,326 @@ def sendgrid_email(transaction_type, price, quantity, net_profit=None, final_sco
 
 
 # 4. ---------------------- Initialize Exchange ----------------------
+# Request weight ανά μέθοδο API (τιμές Binance spot, με symbol). Όσες λείπουν μετράνε 1.
+API_CALL_WEIGHTS = {
+    "load_markets": 20,
+    "fetch_ticker": 2,
+    "fetch_balance": 20,
+    "fetch_open_orders": 6,
+    "fetch_order": 4,
+    "fetch_order_status": 4,
+    "fetch_my_trades": 20,
+}
+
+# Προθέματα μεθόδων του ccxt που κάνουν πραγματικά αιτήματα στο API
+API_METHOD_PREFIXES = ("fetch_", "create_", "cancel_", "edit_", "load_markets")
+
+# Όρια (σε δευτερόλεπτα) για το ιστόγραμμα latency των κλήσεων
+API_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Circuit breaker: ανοίγει όταν από τις τελευταίες CIRCUIT_WINDOW_SIZE κλήσεις (τουλάχιστον CIRCUIT_MIN_CALLS)
+# το ποσοστό αποτυχιών (σφάλμα δικτύου / διαθεσιμότητας ή κλήση πιο αργή από CIRCUIT_SLOW_CALL_SECONDS)
+# φτάσει το CIRCUIT_FAILURE_RATIO. Όσο είναι ανοιχτός, οι κλήσεις αποτυγχάνουν αμέσως (εκτός από τις ακυρώσεις)
+# και μετά από CIRCUIT_OPEN_SECONDS ένα fetch_time ελέγχει αν το exchange επανήλθε (διπλάσια αναμονή αν όχι).
+CIRCUIT_WINDOW_SIZE = 20
+CIRCUIT_MIN_CALLS = 5
+CIRCUIT_FAILURE_RATIO = 0.5
+CIRCUIT_SLOW_CALL_SECONDS = 5.0
+CIRCUIT_OPEN_SECONDS = 30
+CIRCUIT_MAX_OPEN_SECONDS = 300
+CIRCUIT_ESSENTIAL_PREFIXES = ("cancel_",)
+
+# Προτεραιότητες κλήσεων API: "critical" (εκτελέσεις και παραγγελίες), "normal", "low" (επανέλεγχοι και ό,τι μπορεί
+# να περιμένει το επόμενο iteration). Η προτεραιότητα προκύπτει από τη φάση του iteration (βλ. enter_phase)· όσες
+# φάσεις λείπουν είναι "normal". Οι τοποθετήσεις, μετακινήσεις και ακυρώσεις είναι πάντα "critical", και οι κλήσεις
+# "low" γίνονται μέσω του InstrumentedExchange.call_deferrable (π.χ. η ανανέωση του snapshot υπολοίπων).
+API_PHASE_PRIORITIES = {
+    "load_state": "critical",
+    "reconcile": "critical",
+    "ticker": "critical",
+    "initial_grid": "critical",
+    "check_orders": "critical",
+    "process_fills": "critical",
+    "order_retries": "critical",
+    "range_adjust": "critical",
+    "replenish": "critical",
+}
+API_CRITICAL_PREFIXES = ("create_", "cancel_", "edit_")
+
+# Request weight ανά iteration: οι κλήσεις "low" αναβάλλονται όταν θα ξεπερνούσαν το API_LOW_PRIORITY_SHARE του.
+# Επιπλέον, όταν το weight του λεπτού που αναφέρει το exchange (header API_USED_WEIGHT_HEADER, κοινό για όλα τα
+# processes του λογαριασμού) φτάσει το μερίδιο μιας προτεραιότητας στο API_WEIGHT_LIMIT_PER_MINUTE, οι κλήσεις της
+# αναβάλλονται, ώστε το υπόλοιπο να μένει για τις "critical": οι "low" μπαίνουν στην ουρά αναβολής (εκτελούνται στην
+# αρχή του επόμενου iteration) και οι "normal" παραλείπονται σε αυτό το iteration.
+API_ITERATION_WEIGHT_BUDGET = 600
+API_LOW_PRIORITY_SHARE = 0.5
+API_WEIGHT_LIMIT_PER_MINUTE = 6000
+API_PRIORITY_WEIGHT_SHARES = {"normal": 0.9, "low": API_LOW_PRIORITY_SHARE}
+API_USED_WEIGHT_HEADER = "x-mbx-used-weight-1m"
+
+
+class ExchangeCircuitOpen(Exception):
+    """
+    Η κλήση δεν έγινε γιατί ο circuit breaker του exchange είναι ανοιχτός. Δεν είναι σφάλμα δικτύου της ίδιας
+    της κλήσης, οπότε δεν κληρονομεί από το ccxt.NetworkError (δεν την πιάνουν οι χειρισμοί επανάληψης).
+    """
+
+
+class ApiCallDeferred(Exception):
+    """
+    Η κλήση δεν έγινε τώρα γιατί η προτεραιότητά της δεν έχει διαθέσιμο request weight: μια "low" μπήκε στην ουρά
+    αναβολής, μια "normal" παραλείπεται σε αυτό το iteration. Δεν είναι σφάλμα του exchange, οπότε δεν κληρονομεί
+    από το ccxt.NetworkError.
+    """
+
+
+class InstrumentedExchange:
+    """
+    Proxy γύρω από το ccxt exchange που καταγράφει για κάθε μέθοδο API
+    πλήθος κλήσεων, request weight, ιστόγραμμα latency και κλάσεις σφαλμάτων,
+    και κόβει τις κλήσεις με circuit breaker όσο το exchange δεν αποκρίνεται.
+    Κάθε κλήση περνά από τον έλεγχο προτεραιότητας (βλ. API_PHASE_PRIORITIES) πριν σταλεί, και οι κλήσεις
+    "low" που δεν χωρούν κρατιούνται σε ουρά αναβολής (βλ. call_deferrable / run_deferred_calls).
+    Όλα τα υπόλοιπα attributes προωθούνται αυτούσια στο exchange.
+    """
+
+    def __init__(self, exchange):
+        self._exchange = exchange
+        self.call_stats = {}
+        self._lock = threading.Lock()  # Οι ακυρώσεις μπορεί να γίνονται παράλληλα από πολλά threads
+        self._outcomes = deque(maxlen=CIRCUIT_WINDOW_SIZE)  # True για κάθε αποτυχημένη ή αργή κλήση
+        self._open_until = None  # Ανοιχτό κύκλωμα: μέχρι πότε κόβονται οι κλήσεις
+        self._open_seconds = CIRCUIT_OPEN_SECONDS
+        self.iteration_weight = 0  # Request weight του τρέχοντος iteration
+        self.deferred_calls = {}  # Κλήσεις που αναβλήθηκαν στο τρέχον iteration ανά μέθοδο
+        self._deferred_queue = {}  # Ουρά αναβολής (FIFO): (μέθοδος, ορίσματα) -> (args, kwargs, on_result)
+        self._used_weight = None  # (weight του λεπτού κατά το exchange, πότε διαβάστηκε)
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if callable(attr) and name.startswith(API_METHOD_PREFIXES):
+            return self._instrument(name, attr)
+        return attr
+
+    def _instrument(self, name, method, priority=None):
+        def instrumented(*args, **kwargs):
+            if not name.startswith(CIRCUIT_ESSENTIAL_PREFIXES) and not self.is_available():
+                METRICS.inc("api_short_circuited_total", method=name)
+                raise ExchangeCircuitOpen(f"{name} skipped: {EXCHANGE_NAME} circuit is open")
+            self._admit(name, priority or self._priority(name))
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self._record(name, elapsed, error=type(e).__name__)
+                self._record_outcome(isinstance(e, ccxt.NetworkError) or elapsed > CIRCUIT_SLOW_CALL_SECONDS)
+                raise
+            elapsed = time.perf_counter() - start
+            self._record(name, elapsed)
+            self._record_outcome(elapsed > CIRCUIT_SLOW_CALL_SECONDS)
+            return result
+        return instrumented
+
+    def _priority(self, name):
+        return "critical" if name.startswith(API_CRITICAL_PREFIXES) else API_PHASE_PRIORITIES.get(current_phase, "normal")
+
+    def _deferral_reason(self, name, priority):
+        """Γιατί μια κλήση της προτεραιότητας priority πρέπει να περιμένει (None αν μπορεί να γίνει τώρα)."""
+        if priority == "critical":
+            return None
+        weight = API_CALL_WEIGHTS.get(name, 1)
+        if priority == "low" and self.iteration_weight + weight > API_ITERATION_WEIGHT_BUDGET * API_LOW_PRIORITY_SHARE:
+            return f"iteration weight {self.iteration_weight}/{API_ITERATION_WEIGHT_BUDGET}"
+        used_weight = self.used_weight()
+        if used_weight is not None and used_weight + weight > API_WEIGHT_LIMIT_PER_MINUTE * API_PRIORITY_WEIGHT_SHARES[priority]:
+            return f"exchange weight {used_weight}/{API_WEIGHT_LIMIT_PER_MINUTE} in the current minute"
+        return None
+
+    def _count_deferred(self, name, priority):
+        with self._lock:
+            self.deferred_calls[name] = self.deferred_calls.get(name, 0) + 1
+        METRICS.inc("api_deferred_total", method=name, priority=priority)
+
+    def _admit(self, name, priority):
+        """
+        Έλεγχος προτεραιότητας πριν από την κλήση: μια κλήση "normal" ή "low" χωρίς διαθέσιμο weight πετάει
+        ApiCallDeferred, χωρίς αναμονή. Όσες έγιναν μέσω call_deferrable μπαίνουν στην ουρά αναβολής· τις υπόλοιπες
+        τις παραλείπει ο καλών σε αυτό το iteration.
+        """
+        reason = self._deferral_reason(name, priority)
+        if reason is None:
+            return
+        self._count_deferred(name, priority)
+        raise ApiCallDeferred(f"{name} ({priority} priority) deferred: {reason}")
+
+    def call_deferrable(self, name, *args, on_result=None, **kwargs):
+        """
+        Κλήση "low" (επανέλεγχος ή ό,τι άλλο μπορεί να περιμένει): γίνεται τώρα αν η προτεραιότητα έχει διαθέσιμο
+        weight, αλλιώς μπαίνει (μία φορά ανά μέθοδο και ορίσματα) στην ουρά αναβολής και πετάει ApiCallDeferred.
+        Το on_result καλείται με το αποτέλεσμα όποτε γίνει η κλήση, τώρα ή από το run_deferred_calls.
+        """
+        try:
+            result = self._instrument(name, getattr(self._exchange, name), priority="low")(*args, **kwargs)
+        except ApiCallDeferred:
+            key = (name, repr(args), repr(sorted(kwargs.items())))
+            with self._lock:
+                self._deferred_queue.pop(key, None)  # Στο τέλος της ουράς, με το πιο πρόσφατο on_result
+                self._deferred_queue[key] = (args, kwargs, on_result)
+            raise
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    def run_deferred_calls(self):
+        """
+        Εκτελεί με τη σειρά τις κλήσεις της ουράς αναβολής όσο η προτεραιότητα "low" έχει διαθέσιμο weight.
+        Όσες δεν χωρούν μένουν για το επόμενο iteration. Μια κλήση που αποτυγχάνει δεν ξαναμπαίνει στην ουρά.
+        """
+        while self._deferred_queue:
+            with self._lock:
+                (name, _, _), (args, kwargs, on_result) = next(iter(self._deferred_queue.items()))
+            if self._deferral_reason(name, "low") is not None:
+                logging.debug("%d deferred API calls wait for the next iteration.", len(self._deferred_queue))
+                return
+            with self._lock:
+                self._deferred_queue.pop(next(iter(self._deferred_queue)))
+            try:
+                result = self._instrument(name, getattr(self._exchange, name), priority="low")(*args, **kwargs)
+            except Exception as e:
+                logging.warning(f"[API] Deferred {name} call failed: {e}")
+                continue
+            if on_result is not None:
+                on_result(result)
+
+    def used_weight(self):
+        """Το request weight του τρέχοντος λεπτού όπως το ανέφερε το exchange στην τελευταία απάντηση (None αν άγνωστο)."""
+        # Το exchange μηδενίζει το weight σε κάθε λεπτό: μια τιμή από προηγούμενο λεπτό δεν ισχύει πια
+        if self._used_weight is None or int(time.time() // 60) != int(self._used_weight[1] // 60):
+            return None
+        return self._used_weight[0]
+
+    def _read_used_weight(self):
+        headers = getattr(self._exchange, "last_response_headers", None) or {}
+        value = headers.get(API_USED_WEIGHT_HEADER) or headers.get(API_USED_WEIGHT_HEADER.upper())
+        if value is not None and str(value).isdigit():
+            self._used_weight = (int(value), time.time())
+            METRICS.set("api_used_weight", int(value))
+
+    def _record_outcome(self, failed):
+        """Καταγράφει την έκβαση μιας κλήσης στο παράθυρο του circuit breaker και τον ανοίγει αν χρειάζεται."""
+        with self._lock:
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if self._open_until is not None or len(self._outcomes) < CIRCUIT_MIN_CALLS:
+                return
+            if failures / len(self._outcomes) < CIRCUIT_FAILURE_RATIO:
+                return
+            self._open_until = time.time() + self._open_seconds
+        logging.warning(
+            f"[API] Circuit opened: {failures}/{len(self._outcomes)} recent calls to {EXCHANGE_NAME} failed or were slow. "
+            f"Pausing calls for {self._open_seconds}s."
+        )
+        METRICS.inc("circuit_trips_total")
+        METRICS.set("circuit_open", 1)
+
+    def is_available(self):
+        """
+        True αν το κύκλωμα είναι κλειστό. Αν είναι ανοιχτό και έληξε η αναμονή, κάνει ένα φθηνό fetch_time
+        (health probe): αν πετύχει το κύκλωμα κλείνει, αλλιώς μένει ανοιχτό με διπλάσια αναμονή.
+        """
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if time.time() < self._open_until:
+                return False
+            # Μόνο ένα thread κάνει το probe· τα υπόλοιπα βλέπουν το κύκλωμα ανοιχτό μέχρι να τελειώσει
+            self._open_until = time.time() + self._open_seconds
+
+        start = time.perf_counter()
+        try:
+            self._exchange.fetch_time()
+            healthy = time.perf_counter() - start <= CIRCUIT_SLOW_CALL_SECONDS
+            self._record("fetch_time", time.perf_counter() - start)
+        except Exception as e:
+            healthy = False
+            self._record("fetch_time", time.perf_counter() - start, error=type(e).__name__)
+
+        with self._lock:
+            if healthy:
+                self._open_until = None
+                self._open_seconds = CIRCUIT_OPEN_SECONDS
+                self._outcomes.clear()
+            else:
+                self._open_seconds = min(self._open_seconds * 2, CIRCUIT_MAX_OPEN_SECONDS)
+                self._open_until = time.time() + self._open_seconds
+        if healthy:
+            logging.info(f"[API] Circuit closed: {EXCHANGE_NAME} is responding again.")
+            METRICS.set("circuit_open", 0)
+        else:
+            logging.warning(f"[API] Health probe failed. {EXCHANGE_NAME} circuit stays open for {self._open_seconds}s.")
+        return healthy
+
+    def _record(self, name, elapsed, error=None):
+        bucket = next((i for i, bound in enumerate(API_LATENCY_BUCKETS) if elapsed <= bound), len(API_LATENCY_BUCKETS))
+        with self._lock:
+            stats = self.call_stats.get(name)
+            if stats is None:
+                stats = self.call_stats[name] = {
+                    "calls": 0,
+                    "weight": 0,
+                    "latency_sum": 0.0,
+                    "latency_max": 0.0,
+                    "buckets": [0] * (len(API_LATENCY_BUCKETS) + 1),
+                    "errors": {},
+                }
+            stats["calls"] += 1
+            stats["weight"] += API_CALL_WEIGHTS.get(name, 1)
+            self.iteration_weight += API_CALL_WEIGHTS.get(name, 1)
+            stats["latency_sum"] += elapsed
+            stats["latency_max"] = max(stats["latency_max"], elapsed)
+            stats["buckets"][bucket] += 1
+            if error:
+                stats["errors"][error] = stats["errors"].get(error, 0) + 1
+
+        self._read_used_weight()
+        METRICS.inc("api_calls_total", method=name)
+        METRICS.inc("api_request_weight_total", API_CALL_WEIGHTS.get(name, 1), method=name)
+        METRICS.observe("api_call_duration_seconds", elapsed, buckets=API_LATENCY_BUCKETS, method=name)
+        if error:
+            METRICS.inc("api_errors_total", method=name, error=error)
+
+    def reset_call_stats(self):
+        self.call_stats = {}
+        self.iteration_weight = 0
+        self.deferred_calls = {}
+
+    def log_call_summary(self, label="iteration", reset=True):
+        """
+        Καταγράφει σύνοψη των κλήσεων API (ανά μέθοδο, ταξινομημένες κατά weight).
+        """
+        total_calls = sum(s["calls"] for s in self.call_stats.values())
+        total_weight = sum(s["weight"] for s in self.call_stats.values())
+        total_errors = sum(sum(s["errors"].values()) for s in self.call_stats.values())
+        logging.info(f"[API] {label} summary: {total_calls} calls, weight {total_weight}, errors {total_errors}")
+        if self.deferred_calls:
+            logging.info(f"[API] Deferred calls (no request weight left for their priority): {self.deferred_calls}")
+        if self._deferred_queue:
+            logging.info(f"[API] Calls queued for the next iteration: {len(self._deferred_queue)}")
+
+        bucket_labels = [f"<={bound}s" for bound in API_LATENCY_BUCKETS] + [f">{API_LATENCY_BUCKETS[-1]}s"]
+        for name, s in sorted(self.call_stats.items(), key=lambda item: item[1]["weight"], reverse=True):
+            histogram = ", ".join(f"{bucket_label}: {count}" for bucket_label, count in zip(bucket_labels, s["buckets"]) if count)
+            logging.info(
+                f"[API] {name}: calls={s['calls']} weight={s['weight']} "
+                f"avg={s['latency_sum'] / s['calls']:.3f}s max={s['latency_max']:.3f}s "
+                f"latency={{{histogram}}} errors={s['errors'] or '{}'}"
+            )
+
+        if reset:
+            self.reset_call_stats()
+
+
 def initialize_exchange():
     try:
         exchange = getattr(ccxt, EXCHANGE_NAME)({
@@ -215,8 +1045,9 @@ def initialize_exchange():
         })
         # Testnet ή Production
         exchange.set_sandbox_mode(False)
+        exchange = InstrumentedExchange(exchange)
         exchange.load_markets()  # <--- load markets for safety
-        
+
         return exchange
     except Exception as e:
         logging.error(f"Failed to connect to {EXCHANGE_NAME}: {e}")
@@ -235,13 +1066,358 @@ def get_current_price(exchange):
 
 
 # 5. ---------------------- Order Placement / Cancel ----------------------
-def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=False):
+class OrderBook(MutableMapping):
+    """
+    Βιβλίο παραγγελιών τιμή -> παραγγελία (συμπεριφέρεται όπως το dict που χρησιμοποιούσαμε),
+    με δευτερεύοντα ευρετήρια ID -> τιμή και clientOrderId -> τιμή που ενημερώνονται σε κάθε αλλαγή,
+    ώστε η αναζήτηση και η αφαίρεση με βάση το ID να γίνονται σε O(1).
+    Κρατά επίσης τις τιμές κάθε πλευράς ταξινομημένες (bisect), ώστε το πλήθος και τα άκρα μίας πλευράς
+    να διαβάζονται χωρίς σάρωση, και ειδοποιεί τους observers (π.χ. τη GridLadder) σε κάθε προσθήκη / αφαίρεση.
+    Το version αυξάνεται σε κάθε αλλαγή, ώστε το αρχείο να ξαναγράφεται μόνο όταν κάτι άλλαξε.
+    """
+
+    def __init__(self, orders=None):
+        self._orders = {}
+        self._prices_by_id = {}
+        self._prices_by_client_id = {}
+        self._prices_by_side = {"buy": [], "sell": []}
+        self._observers = []
+        self.version = 0
+        if orders:
+            self.update(orders)
+
+    def __getitem__(self, price):
+        return self._orders[price]
+
+    def __setitem__(self, price, order):
+        if price in self._orders:
+            self._unindex(price, self._orders[price])
+        self._orders[price] = order
+        self._index(price, order)
+        self.version += 1
+
+    def __delitem__(self, price):
+        self._unindex(price, self._orders.pop(price))
+        self.version += 1
+
+    def __iter__(self):
+        return iter(self._orders)
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __repr__(self):
+        return f"OrderBook({self._orders!r})"
+
+    def _index(self, price, order):
+        if not isinstance(order, dict):
+            return
+        order_id = order.get("id")
+        if order_id is not None:
+            self._prices_by_id[str(order_id)] = price
+        client_order_id = order.get("clientOrderId")
+        if client_order_id:
+            self._prices_by_client_id[client_order_id] = price
+        side = order.get("side")
+        if side in self._prices_by_side:
+            bisect.insort(self._prices_by_side[side], price)
+            for observer in self._observers:
+                observer.order_added(side, price)
+
+    def _unindex(self, price, order):
+        if not isinstance(order, dict):
+            return
+        order_id = order.get("id")
+        if order_id is not None and self._prices_by_id.get(str(order_id)) == price:
+            del self._prices_by_id[str(order_id)]
+        client_order_id = order.get("clientOrderId")
+        if client_order_id and self._prices_by_client_id.get(client_order_id) == price:
+            del self._prices_by_client_id[client_order_id]
+        side = order.get("side")
+        if side in self._prices_by_side:
+            prices = self._prices_by_side[side]
+            del prices[bisect.bisect_left(prices, price)]
+            for observer in self._observers:
+                observer.order_removed(side, price)
+
+    def observe(self, observer):
+        """Καταχωρεί observer (order_added / order_removed) και του αναφέρει τις παραγγελίες που υπάρχουν ήδη."""
+        self._observers.append(observer)
+        for side, prices in self._prices_by_side.items():
+            for price in prices:
+                observer.order_added(side, price)
+
+    def side_prices(self, side):
+        """Οι τιμές των παραγγελιών μίας πλευράς σε αύξουσα σειρά (η εσωτερική λίστα: μόνο για ανάγνωση)."""
+        return self._prices_by_side[side]
+
+    def price_of(self, order_id):
+        """Η τιμή (κλειδί) της παραγγελίας με το δοσμένο ID, ή None."""
+        return self._prices_by_id.get(str(order_id))
+
+    def price_of_client_id(self, client_order_id):
+        """Η τιμή (κλειδί) της παραγγελίας με το δοσμένο clientOrderId, ή None."""
+        return self._prices_by_client_id.get(client_order_id)
+
+    def get_by_id(self, order_id):
+        price = self.price_of(order_id)
+        return None if price is None else self._orders[price]
+
+    def pop_by_id(self, order_id):
+        """Αφαιρεί και επιστρέφει την παραγγελία με το δοσμένο ID (None αν δεν υπάρχει)."""
+        price = self.price_of(order_id)
+        return None if price is None else self.pop(price)
+
+    def update_order(self, price, changes):
+        """
+        Ενημερώνει επιτόπου τα πεδία της παραγγελίας στην τιμή price. Το version αυξάνεται μόνο αν άλλαξε
+        κάποιο από τα πεδία που αποθηκεύονται (ORDER_FIELDS), π.χ. όχι για το "info" του exchange.
+        """
+        order = self._orders[price]
+        if any(order.get(field) != changes[field] for field in ORDER_FIELDS if field in changes):
+            self.version += 1
+        reindex = any(order.get(field) != changes[field] for field in ("id", "clientOrderId", "side") if field in changes)
+        if reindex:
+            self._unindex(price, order)
+        order.update(changes)
+        if reindex:
+            self._index(price, order)
+
+
+
+
+class ProfitLedger:
+    """
+    Ledger κερδών από τις εκτελέσεις (fills). Κάθε buy ανοίγει ένα lot στο επίπεδό της, και κάθε sell κλείνει
+    πρώτα τα lots του επιπέδου ένα GRID_SIZE πιο κάτω (FIFO), μετά τα παλαιότερα lots γενικά. Μια sell χωρίς
+    αγορασμένο απόθεμα ανοίγει short lot, που το κλείνει με τον ίδιο τρόπο μια buy ένα GRID_SIZE πιο κάτω.
+    Το επίπεδο ενός fill είναι η limit τιμή της παραγγελίας (η μέση τιμή εκτέλεσης χρησιμοποιείται μόνο για το κέρδος).
+    Κάθε fill κοστίζει O(1) (αποσβεσμένο): τα lots που εξαντλούνται αφαιρούνται όταν φτάσουν στην αρχή της ουράς,
+    και η ουρά συμπιέζεται όταν τα μισά της lots έχουν εξαντληθεί. Η θέση και το κόστος της τηρούνται σωρευτικά.
+    Με κάθε fill ενημερώνονται και τα ωριαία / ημερήσια σύνολα (rollups), ώστε το dashboard να μην τα υπολογίζει.
+    """
+
+    def __init__(self, grid_size, statistics=None):
+        self.grid_size = grid_size
+        self.total_buys = 0
+        self.total_sells = 0
+        self.realized_pnl = 0.0
+        self.fees = 0.0
+        # Ποσότητα που έκλεισε και άθροισμα (ποσότητα x χρόνος διακράτησης) των lots της, για τον μέσο χρόνο διακράτησης
+        self.closed_qty = 0.0
+        self.hold_seconds = 0.0
+        # Ανοιχτά lots ανά κατεύθυνση: ουρά FIFO όλων και ουρές FIFO ανά επίπεδο
+        # (κοινά αντικείμενα [level, qty, price, opened_at], opened_at σε ms ή None για lots χωρίς χρόνο)
+        self._lots = {"long": deque(), "short": deque()}
+        self._lots_by_level = {"long": {}, "short": {}}
+        # Εξαντλημένα lots που έμειναν μέσα στην ουρά, και ανοιχτή ποσότητα / κόστος ανά κατεύθυνση
+        self._closed_lots = {"long": 0, "short": 0}
+        self._open_qty = {"long": 0.0, "short": 0.0}
+        self._open_cost = {"long": 0.0, "short": 0.0}
+        self.rollups = {"hourly": {}, "daily": {}}
+        # Τα σύνολα της έκδοσης χωρίς ledger (legacy_*), μόνο για αναφορά: δεν συμμετέχουν στους υπολογισμούς
+        self.legacy = {}
+        # Αυξάνεται σε κάθε fill, ώστε τα statistics να αποθηκεύονται μόνο όταν άλλαξαν
+        self.version = 0
+
+        statistics = statistics or {}
+        if "lots" not in statistics:
+            # Όπως και στη μετατροπή του αρχείου (state_format.migrate_statistics): τα παλιά σύνολα γίνονται legacy_*
+            statistics = legacy_statistics(statistics)
+            if statistics.get("legacy_total_buys") or statistics.get("legacy_total_sells"):
+                logging.info("Statistics without a fill ledger found. Starting the profit ledger from zero.")
+        self.legacy = {key: value for key, value in statistics.items() if key.startswith("legacy_")}
+        if "lots" not in statistics:
+            return
+        self.total_buys = statistics.get("total_buys", 0)
+        self.total_sells = statistics.get("total_sells", 0)
+        self.realized_pnl = statistics.get("realized_pnl", 0.0)
+        self.fees = statistics.get("fees", 0.0)
+        self.closed_qty = statistics.get("closed_qty", 0.0)
+        self.hold_seconds = statistics.get("hold_seconds", 0.0)
+        for direction in ("long", "short"):
+            for lot in statistics["lots"].get(direction, []):
+                self._open_lot(direction, *lot)
+        rollups = statistics.get("rollups", {})
+        for period in self.rollups:
+            self.rollups[period] = dict(rollups.get(period, {}))
+
+    def _open_lot(self, direction, level, qty, price, opened_at=None):
+        lot = [level, qty, price, opened_at]
+        self._lots[direction].append(lot)
+        self._lots_by_level[direction].setdefault(level, deque()).append(lot)
+        self._open_qty[direction] += qty
+        self._open_cost[direction] += qty * price
+
+    def _compact(self, direction):
+        """Αφαιρεί τα εξαντλημένα lots από τις ουρές και ξαναϋπολογίζει ακριβώς τη θέση (χωρίς σωρευμένα σφάλματα)."""
+        lots = [lot for lot in self._lots[direction] if lot[1] > 1e-12]
+        self._lots[direction] = deque()
+        self._lots_by_level[direction] = {}
+        self._closed_lots[direction] = 0
+        self._open_qty[direction] = 0.0
+        self._open_cost[direction] = 0.0
+        for lot in lots:
+            self._open_lot(direction, *lot)
+
+    def _close(self, direction, level, qty, price, timestamp):
+        """
+        Κλείνει έως qty από τα lots της κατεύθυνσης (πρώτα του επιπέδου level).
+        Επιστρέφει (κέρδος, υπόλοιπο qty, ποσότητα με γνωστό χρόνο ανοίγματος, άθροισμα ποσότητας x διακράτησης).
+        """
+        pnl = 0.0
+        timed_qty = 0.0
+        hold_seconds = 0.0
+        all_lots = self._lots[direction]
+        queues = [self._lots_by_level[direction].get(level), all_lots]
+        for queue in queues:
+            while queue and qty > 1e-12:
+                lot = queue[0]
+                if lot[1] <= 1e-12:
+                    queue.popleft()
+                    if queue is all_lots:
+                        self._closed_lots[direction] -= 1
+                    continue
+                matched = min(qty, lot[1])
+                pnl += (price - lot[2]) * matched if direction == "long" else (lot[2] - price) * matched
+                if lot[3] is not None:
+                    timed_qty += matched
+                    hold_seconds += matched * max(timestamp - lot[3], 0) / 1000
+                lot[1] -= matched
+                qty -= matched
+                self._open_qty[direction] -= matched
+                self._open_cost[direction] -= matched * lot[2]
+                if lot[1] <= 1e-12:
+                    self._closed_lots[direction] += 1
+        level_lots = self._lots_by_level[direction].get(level)
+        if level_lots is not None and not any(lot[1] > 1e-12 for lot in level_lots):
+            del self._lots_by_level[direction][level]
+        if self._closed_lots[direction] * 2 > len(all_lots):
+            self._compact(direction)
+        return pnl, qty, timed_qty, hold_seconds
+
+    def record_fill(self, side, price, qty, fee=0.0, timestamp=None, level=None):
+        """
+        Καταγράφει ένα fill (fee σε CRYPTO_CURRENCY, timestamp σε ms, None = τώρα) στο επίπεδο level
+        (η limit τιμή της παραγγελίας, None = price) και επιστρέφει το πραγματοποιημένο κέρδος του.
+        """
+        price, qty = float(price), float(qty)
+        level = price if level is None else float(level)
+        timestamp = int(timestamp or time.time() * 1000)
+        if side == "buy":
+            self.total_buys += 1
+            pnl, remaining, timed_qty, hold_seconds = self._close("short", round(level + self.grid_size, 4), qty, price, timestamp)
+            if remaining > 1e-12:
+                self._open_lot("long", round(level, 4), remaining, price, timestamp)
+        else:
+            self.total_sells += 1
+            pnl, remaining, timed_qty, hold_seconds = self._close("long", round(level - self.grid_size, 4), qty, price, timestamp)
+            if remaining > 1e-12:
+                self._open_lot("short", round(level, 4), remaining, price, timestamp)
+        self.realized_pnl += pnl
+        self.fees += fee
+        self.closed_qty += timed_qty
+        self.hold_seconds += hold_seconds
+        self._update_rollups(side, price, qty, fee, pnl, timed_qty, hold_seconds, timestamp)
+        self.version += 1
+        return pnl - fee
+
+    def _update_rollups(self, side, price, qty, fee, pnl, closed_qty, hold_seconds, timestamp):
+        """Προσθέτει το fill στο ωριαίο και στο ημερήσιο διάστημα (UTC) του και κόβει τα παλαιότερα."""
+        moment = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+        for period, key, retention in (
+            ("hourly", moment.strftime("%Y-%m-%dT%H:00Z"), ROLLUP_HOURLY_RETENTION),
+            ("daily", moment.strftime("%Y-%m-%d"), ROLLUP_DAILY_RETENTION),
+        ):
+            buckets = self.rollups[period]
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {"buys": 0, "sells": 0, "volume": 0.0, "notional": 0.0, "realized_pnl": 0.0,
+                                         "fees": 0.0, "closed_qty": 0.0, "hold_seconds": 0.0}
+                while len(buckets) > retention:
+                    del buckets[min(buckets)]
+            bucket["buys" if side == "buy" else "sells"] += 1
+            bucket["volume"] += qty
+            bucket["notional"] += qty * price
+            bucket["realized_pnl"] += pnl
+            bucket["fees"] += fee
+            bucket["closed_qty"] += closed_qty
+            bucket["hold_seconds"] += hold_seconds
+
+    def inventory(self):
+        """Καθαρή θέση (αγορασμένο μείον πουλημένο απόθεμα) και κόστος της."""
+        return (self._open_qty["long"] - self._open_qty["short"],
+                self._open_cost["long"] - self._open_cost["short"])
+
+    def to_statistics(self):
+        """Τα statistics όπως αποθηκεύονται στο αρχείο παραγγελιών (συμβατά με total_buys / total_sells / net_profit)."""
+        inventory, inventory_cost = self.inventory()
+        return {
+            "total_buys": self.total_buys,
+            "total_sells": self.total_sells,
+            "net_profit": round(self.realized_pnl - self.fees, 8),
+            "realized_pnl": round(self.realized_pnl, 8),
+            "fees": round(self.fees, 8),
+            "inventory": round(inventory, 8),
+            "inventory_cost": round(inventory_cost, 8),
+            "closed_qty": round(self.closed_qty, 8),
+            "hold_seconds": round(self.hold_seconds, 3),
+            "lots": {
+                direction: [[level, round(qty, 8), price, opened_at] for level, qty, price, opened_at in lots if qty > 1e-12]
+                for direction, lots in self._lots.items()
+            },
+            "rollups": self.rollups,
+            **self.legacy,
+        }
+
+
+def fee_in_quote(fee, price):
+    """Το κόστος ενός fee του ccxt σε CRYPTO_CURRENCY (fees σε άλλο νόμισμα, π.χ. BNB, δεν μετατρέπονται)."""
+    if not isinstance(fee, dict) or not fee.get("cost"):
+        return 0.0
+    if fee.get("currency") == CRYPTO_CURRENCY:
+        return float(fee["cost"])
+    if fee.get("currency") == CRYPTO_SYMBOL:
+        return float(fee["cost"]) * float(price)
+    return 0.0
+
+
+TRADE_ARCHIVE = TradeArchive(TRADE_ARCHIVE_DIR)
+
+
+def archive_event(event, side, price, amount, fee=0.0, pnl=0.0, order_id=None, timestamp=None):
+    """Γράφει ένα γεγονός του ενεργού ζεύγους στο τοπικό αρχείο (όχι σε demo mode)."""
+    if ENABLE_TRADE_ARCHIVE and not ENABLE_DEMO_MODE:
+        TRADE_ARCHIVE.append(SYMBOL, event, side, price, amount, fee, pnl, order_id, timestamp)
+
+
+def record_fill(ledger, order_info, fill=None):
+    """
+    Καταγράφει στο ledger και στο τοπικό αρχείο την εκτέλεση μιας τοπικής παραγγελίας. Το fill είναι η παραγγελία
+    όπως την επέστρεψε το exchange (filled / average / fee) ή None, οπότε χρησιμοποιούνται η τιμή και η ποσότητα της τοπικής.
+    """
+    fill = fill or {}
+    side = order_info.get("side")
+    price = fill.get("average") or fill.get("price") or order_info.get("price")
+    # Το επίπεδο του grid είναι η limit τιμή της παραγγελίας· η μέση τιμή εκτέλεσης μετράει μόνο στο κέρδος
+    level = order_info.get("price") or fill.get("price") or price
+    qty = fill.get("filled") or fill.get("amount") or order_info.get("amount") or AMOUNT
+    fee = fee_in_quote(fill.get("fee"), price)
+    # Στις παραγγελίες του ccxt το timestamp είναι η δημιουργία τους· η εκτέλεση είναι το lastTradeTimestamp
+    timestamp = fill.get("lastTradeTimestamp") if "lastTradeTimestamp" in fill else fill.get("timestamp")
+    pnl = ledger.record_fill(side, price, qty, fee, timestamp, level)
+    archive_event("fill", side, price, qty, fee, pnl + fee, order_info.get("id"), timestamp)
+    logging.info(f"Recorded {side} fill of {qty} at {float(price):.4f}. Realized: {pnl:.4f}, Net profit: {ledger.realized_pnl - ledger.fees:.4f}")
+
+
+def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=False, ladder=None, retries=None):
     try:
         orders_to_save = {}
         for price, order in open_orders.items():
             try:
-                orders_to_save[str(price)] = {
+                orders_to_save[price] = {
                     'id': order.get('id'),
+                    'clientOrderId': order.get('clientOrderId'),
                     'symbol': order.get('symbol'),
                     'price': order.get('price'),
                     'side': order.get('side'),
@@ -255,28 +1431,52 @@ def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=Fal
                 logging.error(f"Error serializing order at price {price}: {e}. Order: {order}")
                 continue
 
-        logging.debug(f"Orders to be saved: {orders_to_save}")
+        logging.debug("Orders to be saved: %s", summarize_orders(orders_to_save))
 
-        # Δημιουργία δομής δεδομένων για αποθήκευση
-        data_to_save = {
-            "orders": orders_to_save,
+        sections = {
             "statistics": statistics if statistics else {
                 "total_buys": 0,
                 "total_sells": 0,
                 "net_profit": 0.0
             }
         }
+        if ladder is not None:
+            sections["ladder"] = ladder.to_state()
+        if retries:
+            sections["order_retries"] = retries
 
-        # Αποθήκευση σε προσωρινό αρχείο
-        temp_file_path = file_path + ".tmp"
-        with open(temp_file_path, 'w') as f:
-            json.dump(data_to_save, f, indent=4)
-        os.replace(temp_file_path, file_path)  # Αντικατάσταση του παλιού αρχείου
+        # Αποθήκευση μέσω προσωρινού αρχείου, στη μορφή της κατάληξης (.json ή .msgpack, βλ. state_format.py)
+        save_state(file_path, orders_to_save, sections)
 
+        METRICS.inc("state_saves_total", outcome="written")
         if not silent:
             logging.info(f"Saved open orders and statistics to {file_path}.")
+        return True
     except Exception as e:
+        METRICS.inc("state_saves_total", outcome="failed")
         logging.error(f"Failed to save open orders and statistics to file: {e}")
+        return False
+
+
+def state_version(open_orders, ledger, ladder_state=None, retries_state=None):
+    """Η έκδοση της κατάστασης που αποθηκεύεται στο αρχείο παραγγελιών (παραγγελίες, ledger, σκάλα και ουρά επαναλήψεων)."""
+    return (open_orders.version, ledger.version, ladder_state, retries_state or {})
+
+
+def save_state_if_changed(file_path, open_orders, ledger, saved_version, ladder=None):
+    """
+    Αποθηκεύει τις παραγγελίες και τα statistics μόνο αν η κατάσταση άλλαξε από την τελευταία αποθήκευση
+    (saved_version). Επιστρέφει την έκδοση που βρίσκεται πλέον στο αρχείο.
+    """
+    version = state_version(open_orders, ledger, ladder.to_state() if ladder is not None else saved_version[2], order_retries_state())
+    if version == saved_version:
+        METRICS.inc("state_saves_total", outcome="skipped")
+        logging.debug("No order or statistics changes. Skipped saving %s.", file_path)
+        return saved_version
+    if save_open_orders_to_file(file_path, open_orders, ledger.to_statistics(), silent=True, ladder=ladder, retries=version[3]):
+        logging.info(f"Saved open orders (including canceled) and statistics to orders file {file_path}.")
+        return version
+    return saved_version
 
 
 
@@ -285,15 +1485,14 @@ def save_open_orders_to_file(file_path, open_orders, statistics=None, silent=Fal
 
 def load_or_fetch_open_orders(exchange, symbol, file_path):
     """
-    Φορτώνει τις ανοιχτές παραγγελίες και τις στατιστικές από το τοπικό αρχείο
-    ή, αν δεν υπάρχει αρχείο, κάνει fetch από την Binance.
+    Φορτώνει τις ανοιχτές παραγγελίες, τις στατιστικές και τα υπόλοιπα sections του αρχείου (σκάλα του grid,
+    ουρά επαναλήψεων) από το τοπικό αρχείο ή, αν δεν υπάρχει αρχείο, κάνει fetch από την Binance.
     """
     try:
-        # Προσπάθεια φόρτωσης από το αρχείο
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        open_orders = {float(price): order for price, order in data.get("orders", {}).items()}
+        # Προσπάθεια φόρτωσης από το αρχείο (οι τιμές επιστρέφονται ήδη ως float)
+        orders, data = load_state(file_path)
+
+        open_orders = OrderBook(orders.items())
         statistics = data.get("statistics", {
             "total_buys": 0,
             "total_sells": 0,
@@ -301,21 +1500,29 @@ def load_or_fetch_open_orders(exchange, symbol, file_path):
         })
         
         logging.info(f"Loaded open orders and statistics from {file_path}")
-        return open_orders, statistics
-    except (FileNotFoundError, json.JSONDecodeError):
+        return open_orders, statistics, data
+    except (FileNotFoundError, StateFileError):
         # Αν το αρχείο δεν υπάρχει ή είναι κενό/μη έγκυρο, κάνουμε fetch από την Binance
         logging.warning(f"{file_path} not found or invalid. Fetching open orders from Binance...")
         binance_orders = exchange.fetch_open_orders(symbol)
-        open_orders = {}
+        open_orders = OrderBook()
+        # Μόνο οι παραγγελίες των bots (βάσει client order ID), όπως στο reconcile_open_orders
+        foreign_orders = 0
         for order in binance_orders:
+            if parse_client_order_id(order.get('clientOrderId')) is None:
+                foreign_orders += 1
+                continue
             price = float(order['price'])
             open_orders[price] = {
                 'id': order['id'],
+                'clientOrderId': order['clientOrderId'],
                 'symbol': order['symbol'],
                 'price': price,
                 'side': order['side'],
                 'status': order['status']
             }
+        if foreign_orders:
+            logging.debug("Ignored %d open orders not placed by the grid bots.", foreign_orders)
 
         # Δημιουργία αρχικών στατιστικών
         statistics = {
@@ -327,25 +1534,70 @@ def load_or_fetch_open_orders(exchange, symbol, file_path):
         # Αποθήκευση των παραγγελιών και των στατιστικών σε τοπικό αρχείο
         save_open_orders_to_file(file_path, open_orders, statistics)
         logging.info(f"Fetched and saved open orders and statistics to {file_path}.")
-        return open_orders, statistics
+        return open_orders, statistics, {}
     except Exception as e:
         logging.error(f"Failed to load or fetch open orders and statistics: {e}")
-        return {}, {
+        return OrderBook(), {
             "total_buys": 0,
             "total_sells": 0,
             "net_profit": 0.0
-        }
+        }, {}
+
 
 
 
 
+# Κοινό snapshot υπολοίπων για όλα τα grids ενός γύρου (βλ. get_balance)
+balance_snapshot = None
+
+
+def get_balance(exchange, refresh=False):
+    """
+    Επιστρέφει το κοινό snapshot υπολοίπων του γύρου. Κάνει fetch_balance μόνο αν δεν υπάρχει
+    snapshot ή αν ζητηθεί refresh, αντί για ένα fetch ανά παραγγελία και ανά ζεύγος.
+    Το refresh ενός υπάρχοντος snapshot είναι επανέλεγχος χαμηλής προτεραιότητας: αν δεν υπάρχει
+    request weight για αυτόν, μπαίνει στην ουρά αναβολής και χρησιμοποιείται το τρέχον snapshot.
+    """
+    global balance_snapshot
+    if balance_snapshot is None:
+        balance_snapshot = exchange.fetch_balance()
+    elif refresh:
+        try:
+            exchange.call_deferrable("fetch_balance", on_result=store_balance)
+        except (ApiCallDeferred, ExchangeCircuitOpen) as e:
+            logging.info(f"Balance refresh deferred, using the current snapshot: {e}")
+    return balance_snapshot
+
+
+def store_balance(balance):
+    """Αντικαθιστά το snapshot με υπόλοιπα που μόλις ήρθαν από το exchange (π.χ. από μια αναβληθείσα κλήση)."""
+    global balance_snapshot
+    balance_snapshot = balance
+
+
+def invalidate_balance():
+    """Ακυρώνει το snapshot (π.χ. μετά από market order), ώστε το επόμενο get_balance να κάνει fetch."""
+    global balance_snapshot
+    balance_snapshot = None
+
+
+def reserve_balance(currency, amount):
+    """Αφαιρεί από το snapshot το ποσό που δεσμεύει μια νέα limit παραγγελία."""
+    if balance_snapshot is None:
+        return
+    free = balance_snapshot.setdefault('free', {})
+    free[currency] = free.get(currency, 0) - amount
+    if isinstance(balance_snapshot.get(currency), dict):
+        balance_snapshot[currency]['free'] = balance_snapshot[currency].get('free', 0) - amount
+
 
 def check_balance(exchange, currency, required_amount):
     """
-    Ελέγχει αν υπάρχει επαρκές υπόλοιπο για την εκτέλεση μιας παραγγελίας.
+    Ελέγχει αν υπάρχει επαρκές υπόλοιπο για την εκτέλεση μιας παραγγελίας (επανέλεγχος χαμηλής προτεραιότητας,
+    βλ. get_balance).
     """
     try:
-        balance = exchange.fetch_balance()
+        balance = get_balance(exchange, refresh=True)
         available_balance = balance['free'].get(currency, 0)
         if available_balance >= required_amount:
             return True
@@ -360,11 +1612,34 @@ def check_balance(exchange, currency, required_amount):
         
 
 
-def place_order(exchange, side, price, AMOUNT):
+def client_order_id_for(side, price):
+    """Το ντετερμινιστικό client order ID του επιπέδου (bot, ζεύγος, πλευρά, τιμή) στο ενεργό grid."""
+    market = "".join(c for c in SYMBOL if c.isalnum())
+    return f"{CLIENT_ORDER_ID_PREFIX}-{market}-{side[0]}-{int(round(price * 10000))}"
+
+
+def parse_client_order_id(client_order_id):
+    """
+    Αναλύει ένα client order ID των bots για το ενεργό ζεύγος. Επιστρέφει (bot, side, price),
+    ή None αν η παραγγελία δεν τοποθετήθηκε από τα bots (άλλο εργαλείο, χειροκίνητη, άλλο ζεύγος).
+    """
+    parts = (client_order_id or "").split("-")
+    market = "".join(c for c in SYMBOL if c.isalnum())
+    if len(parts) != 4 or parts[0] not in GRID_CLIENT_ORDER_ID_PREFIXES or parts[1] != market:
+        return None
+    if parts[2] not in ("b", "s") or not parts[3].isdigit():
+        return None
+    return parts[0], "buy" if parts[2] == "b" else "sell", int(parts[3]) / 10000
+
+
+def place_order(exchange, side, price, AMOUNT, client_order_id=None, attempt=0):
+    """
+    Τοποθετεί μια limit παραγγελία με μία προσπάθεια. Αν αποτύχει από σφάλμα δικτύου, η παραγγελία μπαίνει
+    στην ουρά επανάληψης (βλ. process_order_retries) με το ίδιο clientOrderId και επιστρέφεται False,
+    ώστε το iteration να συνεχίζει χωρίς αναμονή.
+    """
     global mock_order_counter
     rounded_price = round(price, 4)  # Στρογγυλοποίηση τιμής
-    MAX_RETRIES = 3  # Μέγιστος αριθμός προσπαθειών
-    RETRY_DELAY = 30  # Χρόνος καθυστέρησης σε δευτερόλεπτα
 
     if ENABLE_DEMO_MODE:
         # Mock mode: Δημιουργία mock παραγγελίας
@@ -379,70 +1654,206 @@ def place_order(exchange, side, price, AMOUNT):
             "amount": AMOUNT,
             "status": "open"
         }
-        logging.info(f"[DEMO MODE] Mock order placed: {mock_order}")
+        logging.info("[DEMO MODE] Mock order placed: %s", summarize_order(mock_order))
         return mock_order
 
-    retries = 0
-    while retries < MAX_RETRIES:  # Προσθήκη retry μηχανισμού
-        # Έλεγχος υπολοίπου πριν από την τοποθέτηση παραγγελίας
-        try:
-            balance = exchange.fetch_balance()
-            required_currency = CRYPTO_CURRENCY if side == "buy" else CRYPTO_SYMBOL
-            available_balance = balance['free'].get(required_currency, 0)
-
-            if available_balance < AMOUNT:
-                logging.warning(f"Insufficient balance for {side.capitalize()} order at {rounded_price:.4f}. "
-                                f"Available: {available_balance}, Required: {AMOUNT}. Skipping order.")
-                sendgrid_email(
-                    transaction_type=side,
-                    price=rounded_price,
-                    quantity=AMOUNT,
-                    reasoning=f"Insufficient balance for {side.capitalize()} order at {rounded_price:.4f}"
-                )
-                send_push_notification(f"Insufficient balance for {side.capitalize()} order at {rounded_price:.4f}")
-                return False
-                
-        except Exception as e:
-            logging.error(f"Error checking balance: {e}")
+    # Έλεγχος υπολοίπου πριν από την τοποθέτηση παραγγελίας (ανανέωση του snapshot μόνο σε retry)
+    try:
+        balance = get_balance(exchange, refresh=attempt > 0)
+        required_currency = CRYPTO_CURRENCY if side == "buy" else CRYPTO_SYMBOL
+        available_balance = balance['free'].get(required_currency, 0)
+
+        if available_balance < AMOUNT:
+            logging.warning(f"Insufficient balance for {side.capitalize()} order at {rounded_price:.4f}. "
+                            f"Available: {available_balance}, Required: {AMOUNT}. Skipping order.")
+            sendgrid_email(
+                transaction_type=side,
+                price=rounded_price,
+                quantity=AMOUNT,
+                reasoning=f"Insufficient balance for {side.capitalize()} order at {rounded_price:.4f}"
+            )
+            send_push_notification(f"Insufficient balance for {side.capitalize()} order at {rounded_price:.4f}")
             return False
 
-        # Τοποθέτηση παραγγελίας
-        try:
-            logging.info(f"Attempting to place {side} order at {rounded_price:.4f} {CRYPTO_CURRENCY} for {AMOUNT} {CRYPTO_SYMBOL}")
-            order = exchange.create_limit_order(SYMBOL, side, AMOUNT, rounded_price)
-            logging.info(f"Order placed successfully: {order}")
-            return {
-                "id": order.get("id"),  # Διασφάλιση ότι το 'id' υπάρχει
-                "symbol": order.get("symbol", SYMBOL),
-                "price": rounded_price,
-                "side": side,
-                "status": "open"
-            }
-        except ccxt.NetworkError as e:
-            logging.error(f"Network error while placing order at {rounded_price:.4f} ({side}): {e}")            
-        except ccxt.BaseError as e:
-            logging.error(f"Exchange error while placing order at {rounded_price:.4f} ({side}): {e}")            
-        except Exception as e:
-            logging.error(f"Unexpected error while placing order at {rounded_price:.4f} ({side}): {e}")            
+    except Exception as e:
+        logging.error(f"Error checking balance: {e}")
+        return False
 
-        retries += 1
-        logging.warning(f"Retrying to place order ({retries}/{MAX_RETRIES}) in {RETRY_DELAY} seconds...")
-        time.sleep(RETRY_DELAY)
+    # Ίδιο clientOrderId για το ίδιο επίπεδο σε κάθε προσπάθεια: το exchange απορρίπτει δεύτερη ανοιχτή παραγγελία
+    # με το ίδιο ID, και μια παραγγελία που έγινε δεκτή παρά το timeout αναγνωρίζεται στο reconcile
+    client_order_id = client_order_id or client_order_id_for(side, rounded_price)
+
+    # Τοποθέτηση παραγγελίας
+    try:
+        logging.info(f"Attempting to place {side} order at {rounded_price:.4f} {CRYPTO_CURRENCY} for {AMOUNT} {CRYPTO_SYMBOL}")
+        order = exchange.create_limit_order(SYMBOL, side, AMOUNT, rounded_price, {"clientOrderId": client_order_id})
+        logging.info("Order placed successfully: %s", summarize_order(order))
+        METRICS.inc("orders_placed_total", side=side, symbol=SYMBOL)
+        archive_event("placed", side, rounded_price, AMOUNT, order_id=order.get("id"))
+        if side == "buy":
+            reserve_balance(CRYPTO_CURRENCY, rounded_price * AMOUNT)
+        else:
+            reserve_balance(CRYPTO_SYMBOL, AMOUNT)
+        return {
+            "id": order.get("id"),  # Διασφάλιση ότι το 'id' υπάρχει
+            "clientOrderId": client_order_id,
+            "symbol": order.get("symbol", SYMBOL),
+            "price": rounded_price,
+            "side": side,
+            "status": "open"
+        }
+    except ExchangeCircuitOpen as e:
+        # Η κλήση δεν στάλθηκε: η παραγγελία μένει στην ουρά χωρίς να χάσει προσπάθεια, μέχρι να κλείσει το κύκλωμα
+        logging.warning(f"{side.capitalize()} order at {rounded_price:.4f} not sent: {e}.")
+        schedule_order_retry(side, rounded_price, AMOUNT, client_order_id, attempt)
+        return False
+    except ccxt.DuplicateOrderId:
+        logging.info(f"{side.capitalize()} order at {rounded_price:.4f} ({client_order_id}) already active on exchange. Skipping.")
+        return False
+    except ccxt.NetworkError as e:
+        logging.error(f"Network error while placing order at {rounded_price:.4f} ({side}): {e}")
+        # Μετά από timeout το αίτημα μπορεί να έφτασε στο exchange: η επανάληψη ελέγχει πρώτα αν η παραγγελία υπάρχει
+        schedule_order_retry(side, rounded_price, AMOUNT, client_order_id, attempt + 1, ambiguous=isinstance(e, ccxt.RequestTimeout))
+        return False
+    except ccxt.BaseError as e:
+        logging.error(f"Exchange error while placing order at {rounded_price:.4f} ({side}): {e}")
+    except Exception as e:
+        logging.error(f"Unexpected error while placing order at {rounded_price:.4f} ({side}): {e}")
 
-    logging.error("Failed to place order after maximum retries.")
+    METRICS.inc("order_placement_failures_total", side=side, symbol=SYMBOL)
     return False
 
 
 
+# Παραγγελίες προς επανάληψη: clientOrderId -> {symbol, side, price, amount, attempt, due, ambiguous}
+pending_order_retries = {}
 
 
+def schedule_order_retry(side, price, amount, client_order_id, attempt, ambiguous=False):
+    """
+    Βάζει (ή ξαναβάζει) μια παραγγελία στην ουρά επανάληψης, με καθυστέρηση που διπλασιάζεται σε κάθε
+    αποτυχία (έως ORDER_RETRY_MAX_DELAY) και τυχαίο jitter, ώστε οι επαναλήψεις να μη συγχρονίζονται.
+    ambiguous: το σφάλμα (timeout) δεν αποκλείει ότι η παραγγελία έγινε δεκτή από το exchange.
+    """
+    if attempt > ORDER_RETRY_MAX_ATTEMPTS:
+        logging.error(f"Failed to place {side} order at {price:.4f} after {ORDER_RETRY_MAX_ATTEMPTS} retries.")
+        METRICS.inc("order_placement_failures_total", side=side, symbol=SYMBOL)
+        METRICS.inc("order_placement_retries_total", outcome="gave_up", symbol=SYMBOL)
+        return
+
+    delay = min(ORDER_RETRY_MAX_DELAY, ORDER_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    pending_order_retries[client_order_id] = {
+        "symbol": SYMBOL,
+        "side": side,
+        "price": price,
+        "amount": amount,
+        "attempt": attempt,
+        "due": time.time() + delay,
+        "ambiguous": ambiguous,
+    }
+    logging.warning(f"Queued {side} order at {price:.4f} for retry {attempt}/{ORDER_RETRY_MAX_ATTEMPTS} in {delay:.1f} seconds.")
+
+
+def order_retries_state():
+    """Οι επαναλήψεις του ενεργού ζεύγους, όπως αποθηκεύονται στο section "order_retries" του αρχείου παραγγελιών."""
+    return {
+        client_order_id: dict(entry) for client_order_id, entry in pending_order_retries.items()
+        if entry["symbol"] == SYMBOL
+    }
+
+
+def restore_order_retries(saved_retries):
+    """
+    Επαναφέρει στην ουρά τις επαναλήψεις που αποθηκεύτηκαν στο αρχείο παραγγελιών (π.χ. από την προηγούμενη
+    εκτέλεση σε cron mode). Όσες υπάρχουν ήδη στη μνήμη (daemon mode) δεν αντικαθίστανται.
+    """
+    restored = 0
+    for client_order_id, entry in (saved_retries or {}).items():
+        if client_order_id not in pending_order_retries:
+            pending_order_retries[client_order_id] = dict(entry)
+            restored += 1
+    if restored:
+        logging.info(f"Restored {restored} queued order retries from the orders file.")
+
+
+def process_order_retries(exchange, open_orders):
+    """
+    Εξυπηρετεί τις επαναλήψεις του ενεργού ζεύγους που έχουν λήξει, χωρίς αναμονή για όσες δεν έχουν λήξει.
+    Πριν από κάθε νέα προσπάθεια ελέγχει στο ευρετήριο clientOrderId του open_orders αν η παραγγελία είναι ήδη
+    γνωστή (π.χ. την πρόσθεσε το reconcile). Μόνο αν κάποια προσπάθεια έληξε με timeout, όπου η παραγγελία μπορεί
+    να έγινε δεκτή, γίνεται ένα fetch_open_orders, ώστε να μη διπλασιαστεί.
+    Οι παραγγελίες που τοποθετούνται (ή βρίσκονται) προστίθενται στο open_orders.
+    """
+    now = time.time()
+    due = {
+        client_order_id: entry for client_order_id, entry in pending_order_retries.items()
+        if entry["symbol"] == SYMBOL and entry["due"] <= now
+    }
+    if not due:
+        METRICS.set("pending_order_retries", sum(1 for entry in pending_order_retries.values() if entry["symbol"] == SYMBOL), symbol=SYMBOL)
+        return
+
+    by_client_id = {}
+    ambiguous = {
+        client_order_id: entry for client_order_id, entry in due.items()
+        if entry.get("ambiguous") and open_orders.price_of_client_id(client_order_id) is None
+    }
+    if ambiguous:
+        try:
+            exchange_orders = fetch_open_orders_from_exchange(exchange, SYMBOL)
+            by_client_id = {order.get("clientOrderId"): order for order in exchange_orders if order.get("clientOrderId")}
+        except Exception as e:
+            # Ο έλεγχος που απέτυχε μετράει ως προσπάθεια, ώστε η ουρά να αδειάζει και όταν το exchange δεν απαντά
+            # (όχι όμως όταν ο circuit breaker δεν τον έστειλε καν)
+            logging.warning(f"Could not check {len(ambiguous)} queued orders on the exchange: {e}. Will retry later.")
+            spent = 0 if isinstance(e, ExchangeCircuitOpen) else 1
+            for client_order_id, entry in ambiguous.items():
+                del pending_order_retries[client_order_id]
+                del due[client_order_id]
+                schedule_order_retry(entry["side"], entry["price"], entry["amount"], client_order_id, entry["attempt"] + spent, ambiguous=True)
+
+    for client_order_id, entry in due.items():
+        del pending_order_retries[client_order_id]
+        side, price = entry["side"], entry["price"]
+
+        known_price = open_orders.price_of_client_id(client_order_id)
+        if known_price is not None:
+            logging.info(f"Queued {side} order at {price:.4f} is already known locally (ID {open_orders[known_price].get('id')}). Not placing it again.")
+            METRICS.inc("order_placement_retries_total", outcome="already_placed", symbol=SYMBOL)
+            continue
+        existing = by_client_id.get(client_order_id)
+        if existing:
+            logging.info(f"Queued {side} order at {price:.4f} is already on the exchange (ID {existing['id']}). Not placing it again.")
+            open_orders[price] = {
+                "id": existing["id"],
+                "clientOrderId": client_order_id,
+                "symbol": SYMBOL,
+                "price": price,
+                "side": side,
+                "status": "open",
+            }
+            METRICS.inc("order_placement_retries_total", outcome="already_placed", symbol=SYMBOL)
+            continue
+        if price in open_orders:
+            logging.info(f"Queued {side} order at {price:.4f} is no longer needed. Dropping it.")
+            METRICS.inc("order_placement_retries_total", outcome="dropped", symbol=SYMBOL)
+            continue
+
+        order = place_order(exchange, side, price, entry["amount"], client_order_id, entry["attempt"])
+        if order:
+            open_orders[price] = order
+            METRICS.inc("order_placement_retries_total", outcome="placed", symbol=SYMBOL)
+
+    METRICS.set("pending_order_retries", sum(1 for entry in pending_order_retries.values() if entry["symbol"] == SYMBOL), symbol=SYMBOL)
+
 
 def verify_order_exists(exchange, order_id):
     try:
         order = exchange.fetch_order(order_id, SYMBOL)
         return order is not None and order['status'] == 'open'
     except Exception as e:
-        logging.debug(f"Order {order_id} verification failed: {e}")
+        logging.debug("Order %s verification failed: %s", order_id, e)
         return False
 
 
@@ -463,49 +1874,82 @@ def cancel_order(exchange, open_orders, order_id, price, reason):
 
         if ENABLE_DEMO_MODE:
             logging.info(f"[DEMO MODE] Mock order {order_id} at price {rounded_price:.4f} cancelled. Reason: {reason}")
-            open_orders = {
-                k: v for k, v in open_orders.items() if v['id'] != order_id
-            }  # Ασφαλής αφαίρεση με βάση το ID
+            open_orders.pop_by_id(order_id)  # Αφαίρεση με βάση το ID, μέσω του ευρετηρίου
         else:
             logging.info(f"Attempting to cancel order {order_id} at price {rounded_price:.4f}")
             exchange.cancel_order(order_id, SYMBOL)
             logging.info(f"Order {order_id} at price {rounded_price:.4f} successfully cancelled. Reason: {reason}")
+            METRICS.inc("orders_canceled_total", symbol=SYMBOL)
+            order_info = open_orders.get(rounded_price) or {}
+            archive_event("canceled", order_info.get("side"), rounded_price, order_info.get("amount") or AMOUNT, order_id=order_id)
 
         # Αφαίρεση της εντολής από τα ανοιχτά
         if rounded_price in open_orders:
-            logging.debug(f"Removing order at price {rounded_price:.4f} from open_orders.")
+            logging.debug("Removing order at price %.4f from open_orders.", rounded_price)
             del open_orders[rounded_price]
 
     except Exception as e:
         logging.error(f"Failed to cancel order {order_id} at price {rounded_price:.4f}: {e}")
-        logging.debug(f"Open orders: {open_orders}")
+        logging.debug("Open orders: %s", summarize_orders(open_orders))
 
 
 
 
-def get_order_status(exchange, order_id):
+def cancel_orders_batch(exchange, open_orders, prices, reason):
     """
-    Get the status of a specific order.
-    :param exchange: The exchange object
-    :param order_id: The ID of the order to check
-    :return: The status of the order ('open', 'closed', 'canceled', etc.)
+    Ακυρώνει τις παραγγελίες των δοσμένων τιμών μαζί: με ένα αίτημα cancel_orders όπου το υποστηρίζει
+    το exchange, αλλιώς με παράλληλα αιτήματα cancel_order. Όσες ακυρώθηκαν (ή δεν υπάρχουν πια στο
+    exchange) αφαιρούνται από το open_orders. Επιστρέφει τις τιμές που αφαιρέθηκαν.
     """
-    try:
-        order = exchange.fetch_order(order_id, SYMBOL)
-        if order is None:  # Έλεγχος για None απάντηση
-            logging.error(f"Fetch order returned None for order {order_id}")
-            return None
-        return order['status']
-    except Exception as e:
-        logging.error(f"Failed to fetch status for order {order_id}: {e}")
-        return None
+    orders = {price: open_orders[price] for price in prices if price in open_orders}
+    if not orders:
+        return []
+
+    if ENABLE_DEMO_MODE:
+        logging.info(f"[DEMO MODE] Mock orders at {sorted(orders)} cancelled. Reason: {reason}")
+        removed = list(orders)
+    else:
+        removed = None
+        if exchange.has.get("cancelOrders"):
+            try:
+                exchange.cancel_orders([order["id"] for order in orders.values()], SYMBOL)
+                removed = list(orders)
+            except Exception as e:
+                logging.warning(f"Batch cancel of {len(orders)} orders failed: {e}. Canceling one by one.")
+
+        if removed is None:
+            def cancel_one(order):
+                try:
+                    exchange.cancel_order(order["id"], SYMBOL)
+                    return True
+                except ccxt.OrderNotFound:
+                    logging.warning(f"Order {order['id']} at price {order['price']} does not exist. Removing from open_orders.")
+                    return True
+                except Exception as e:
+                    logging.error(f"Failed to cancel order {order['id']} at price {order['price']}: {e}")
+                    return False
+
+            with ThreadPoolExecutor(max_workers=min(CANCEL_MAX_WORKERS, len(orders))) as pool:
+                results = list(pool.map(cancel_one, orders.values()))
+            removed = [price for price, ok in zip(orders, results) if ok]
+
+    for price in removed:
+        logging.info(f"Order {orders[price]['id']} at price {price:.4f} successfully cancelled. Reason: {reason}")
+        METRICS.inc("orders_canceled_total", symbol=SYMBOL)
+        archive_event("canceled", orders[price].get("side"), price, orders[price].get("amount") or AMOUNT, order_id=orders[price]["id"])
+        del open_orders[price]
+    return removed
+
+
+
 
 
 
 # 6. ---------------------- Check Orders Status ----------------------
-def check_orders_status(exchange, open_orders, current_price):
+def check_orders_status(exchange, open_orders, current_price, ledger):
     """
     Ελέγχει την κατάσταση των τοπικών παραγγελιών και ενημερώνει τα open_orders αν μια παραγγελία έχει γεμίσει.
+    Οι εκτελέσεις καταγράφονται στο ledger.
     """
     filled_orders = []
     orders_to_remove = []
@@ -526,27 +1970,34 @@ def check_orders_status(exchange, open_orders, current_price):
                 side = order_info["side"]
                 order_price = round(order_info["price"], 4)
 
-                logging.debug(f"[DEMO MODE] Checking {side} order at {order_price} with current price {current_price}")
+                logging.debug("[DEMO MODE] Checking %s order at %s with current price %s", side, order_price, current_price)
                 if side == "buy" and current_price <= order_price:
                     logging.info(f"[DEMO MODE] Buy order at {order_price} filled (current: {current_price})")
                     filled_orders.append(rounded_price)
+                    record_fill(ledger, order_info)
+                    METRICS.inc("fills_total", side=side, symbol=SYMBOL)
                 elif side == "sell" and current_price >= order_price:
                     logging.info(f"[DEMO MODE] Sell order at {order_price} filled (current: {current_price})")
                     filled_orders.append(rounded_price)
+                    record_fill(ledger, order_info)
+                    METRICS.inc("fills_total", side=side, symbol=SYMBOL)
             else:
                 # LIVE MODE: Ελέγχει την κατάσταση παραγγελίας μέσω API
-                status = get_order_status(exchange, order_id)
-                logging.debug(f"Order {order_id} at {rounded_price}: status {status}")
+                exchange_order = exchange.fetch_order(order_id, SYMBOL)
+                status = exchange_order['status'] if exchange_order else None
+                logging.debug("Order %s at %s: status %s", order_id, rounded_price, status)
 
                 if status in ["closed", "filled"]:
                     logging.info(f"Order at {rounded_price:.4f} filled.")
                     filled_orders.append(rounded_price)
+                    record_fill(ledger, order_info, exchange_order)
+                    METRICS.inc("fills_total", side=order_info.get("side"), symbol=SYMBOL)
                     send_push_notification(f"Order Filled at {rounded_price:.4f}")
                     
                 elif status == "open":
-                    logging.debug(f"Order {order_id} at {rounded_price:.4f} is still active.")
+                    logging.debug("Order %s at %.4f is still active.", order_id, rounded_price)
                 elif status in ["canceled"]:
-                    logging.debug(f"Order {order_id} at {rounded_price:.4f} was canceled by grid range bot. Retaining locally.")
+                    logging.debug("Order %s at %.4f was canceled by grid range bot. Retaining locally.", order_id, rounded_price)
                     cancelled_orders.append(rounded_price)
                     #orders_to_remove.append(rounded_price)                    
                 elif status in ["rejected", "expired"]:
@@ -559,18 +2010,16 @@ def check_orders_status(exchange, open_orders, current_price):
             continue  # Συνεχίζει με την επόμενη παραγγελία
 
     # Καταγραφή κατάστασης
-    active_orders = {price: order for price, order in open_orders.items() if order.get("status") == "open"}
+    active_count = sum(1 for order in open_orders.values() if order.get("status") == "open")
+    canceled_count = sum(1 for order in open_orders.values() if order.get("status") == "canceled")
 
-    canceled_orders = {price: order for price, order in open_orders.items() if order.get("status") == "canceled"}
-
-    logging.info(f"Active orders: {len(active_orders)}, Canceled orders: {len(canceled_orders)}.")
+    logging.info("Active orders: %d, Canceled orders: %d.", active_count, canceled_count)
 
 
     logging.info(
-        f"Filled orders in this iteration: {filled_orders}. "
-        f"Removed orders in this iteration: {orders_to_remove}. "
-        f"Cancelled orders by bot: {cancelled_orders}."
-    )    
+        "Filled orders in this iteration: %s. Removed orders in this iteration: %s. Cancelled orders by bot: %s.",
+        summarize_prices(filled_orders), summarize_prices(orders_to_remove), summarize_prices(cancelled_orders)
+    )
     
 
     # Ασφαλής διαγραφή παραγγελιών που έχουν γεμίσει ή ακυρωθεί
@@ -625,7 +2074,8 @@ def fetch_filled_orders_from_exchange(exchange, symbol, since=None,days_ago=1, l
         filtered_trades = [trade for trade in trades if trade['timestamp'] >= since_timestamp]
 
         # Ομαδοποίηση των trades με βάση το `order_id`
-        grouped_orders = defaultdict(lambda: {'id': None, 'status': 'closed', 'amount': 0, 'price': 0, 'timestamp': None})
+        grouped_orders = defaultdict(lambda: {'id': None, 'status': 'closed', 'amount': 0, 'price': 0, 'timestamp': None,
+                                              'fee': {'cost': 0.0, 'currency': CRYPTO_CURRENCY}})
 
         for trade in filtered_trades:
             order_id = trade.get('order')
@@ -637,6 +2087,7 @@ def fetch_filled_orders_from_exchange(exchange, symbol, since=None,days_ago=1, l
                 grouped_orders[order_id]['id'] = order_id
                 grouped_orders[order_id]['amount'] += amount
                 grouped_orders[order_id]['timestamp'] = timestamp  # Κρατάμε το timestamp της τελευταίας εκτέλεσης
+                grouped_orders[order_id]['fee']['cost'] += fee_in_quote(trade.get('fee'), price)
 
                 # Υπολογισμός μέσης τιμής (σταθμισμένος μέσος όρος)
                 previous_total = grouped_orders[order_id]['amount'] - amount
@@ -658,9 +2109,10 @@ def fetch_filled_orders_from_exchange(exchange, symbol, since=None,days_ago=1, l
 
 
 
-def reconcile_open_orders(exchange, symbol, local_orders):
+def reconcile_open_orders(exchange, symbol, local_orders, ledger):
     """
     Συμφιλίωση τοπικών παραγγελιών με τις ενεργές παραγγελίες στο Exchange, με προτεραιότητα στα δεδομένα του Exchange.
+    Οι εκτελέσεις που εντοπίζονται καταγράφονται στο ledger.
     Επιστρέφει:
     - Τα ενεργά open orders (local_orders)
     - Ένα dictionary με τις ακυρωμένες παραγγελίες.
@@ -673,25 +2125,28 @@ def reconcile_open_orders(exchange, symbol, local_orders):
         exchange_order_ids = {order['id']: order for order in exchange_orders}
         filled_order_ids = {order['id']: order for order in filled_orders}
 
-        exchange_prices = {round(float(order['price']), 4): order for order in exchange_orders}
-
-        logging.debug(f"Fetched {len(exchange_orders)} open orders from Exchange")
+        logging.debug("Fetched %d open orders from Exchange", len(exchange_orders))
 
-        canceled_orders = {}  # Dictionary για τις ακυρωμένες παραγγελίες
+        canceled_orders = OrderBook()  # Οι ακυρωμένες παραγγελίες, με ευρετήριο ID
+        drift = defaultdict(int)  # Αποκλίσεις τοπικών παραγγελιών από το Exchange ανά είδος
 
         # Ενημέρωση τοπικών παραγγελιών βάσει Exchange
         for price, local_order in list(local_orders.items()):
             order_id = local_order.get("id")
             
             # Debug για να δεις τι συγκρίνεται
-            logging.debug(f"Comparing local order ID {order_id} with Exchange IDs {exchange_order_ids.keys()}")            
+            logging.debug("Comparing local order ID %s with %d Exchange IDs", order_id, len(exchange_order_ids))
             
 
 
-            # Αν η παραγγελία είναι στα filled orders, ενημέρωσε και διέγραψέ την
-            if order_id in filled_order_ids:
+            # Αν η παραγγελία είναι στα filled orders και δεν είναι πια ανοιχτή, κατέγραψε την εκτέλεση και διέγραψέ την.
+            # Μια ανοιχτή παραγγελία με trades έχει εκτελεστεί μερικώς: μένει στο βιβλίο (ενημερώνεται παρακάτω) και η
+            # εκτέλεσή της καταγράφεται μία φορά, ολόκληρη, όταν κλείσει, αφού τότε βγαίνει από το βιβλίο.
+            if order_id in filled_order_ids and order_id not in exchange_order_ids:
                 logging.info(f"Local order ID {order_id} at price {price} was filled on Exchange. Removing from local orders.")
+                record_fill(ledger, local_order, filled_order_ids[order_id])
                 del local_orders[price]
+                drift["filled"] += 1
                 continue
 
                 
@@ -699,31 +2154,59 @@ def reconcile_open_orders(exchange, symbol, local_orders):
             # Αν η παραγγελία δεν υπάρχει στο Exchange, ελέγξτε την κατάσταση
             if order_id not in exchange_order_ids:
                 try:
-                    order_status = exchange.fetch_order_status(order_id, symbol)
-                    if order_status == "canceled":
+                    exchange_order = exchange.fetch_order(order_id, symbol)
+                    order_status = exchange_order['status']
+                    if order_status in ("closed", "filled"):
+                        # Εκτελέστηκε, αλλά δεν είναι στα πρόσφατα trades
+                        logging.info(f"Local order ID {order_id} at price {price} was filled on Exchange. Removing from local orders.")
+                        record_fill(ledger, local_order, exchange_order)
+                        del local_orders[price]
+                        drift["filled"] += 1
+                    elif order_status == "canceled":
                         #logging.info(f"Local order ID {order_id} at price {price} {CRYPTO_CURRENCY} was canceled on Exchange. Removing from local orders.")
-                        local_orders[price]["status"] = "canceled"  # Ενημέρωση status στο αρχειο json
+                        local_orders.update_order(price, {"status": "canceled"})  # Ενημέρωση status στο αρχειο json
                         canceled_orders[price] = local_order  # Προσθήκη στην λίστα ακυρωμένων
+                        drift["canceled"] += 1
                     else:
                         logging.warning(f"Local order ID {order_id} at price {price} {CRYPTO_CURRENCY} not found on Exchange for an unknown reason. Removing from local orders.")
                         # Διαγράψτε την παραγγελία από το τοπικό αρχείο
-                        del local_orders[price]                        
+                        del local_orders[price]
+                        drift["missing_on_exchange"] += 1
                 except Exception as e:
                     logging.error(f"Failed to fetch status for order ID {order_id} at price {price}: {e}. Assuming it no longer exists and removing it.")
 
                 continue
 
             # Ενημέρωση παραγγελίας που υπάρχει και τοπικά και στο Exchange
-            local_orders[price].update(exchange_order_ids[order_id])
+            local_orders.update_order(price, exchange_order_ids[order_id])
 
-        # Προσθήκη νέων παραγγελιών που υπάρχουν στο Exchange αλλά λείπουν τοπικά
-        for price, exchange_order in exchange_prices.items():
-            if price not in local_orders:
-                logging.info(f"Adding missing order from Exchange at price {price}")
-                local_orders[price] = exchange_order
+        # Προσθήκη παραγγελιών των bots (βάσει client order ID) που υπάρχουν στο Exchange αλλά λείπουν τοπικά.
+        # Παραγγελίες άλλων εργαλείων ή χειροκίνητες δεν προστίθενται.
+        foreign_orders = 0
+        for exchange_order in exchange_orders:
+            if local_orders.price_of(exchange_order['id']) is not None:
+                continue
+            parsed = parse_client_order_id(exchange_order.get('clientOrderId'))
+            if parsed is None:
+                foreign_orders += 1
+                continue
+            price = round(float(exchange_order['price']), 4)
+            if price in local_orders:
+                logging.warning(f"Exchange order {exchange_order['id']} at price {price} duplicates local order {local_orders[price].get('id')}. Keeping the local one.")
+                drift["duplicate"] += 1
+                continue
+            logging.info(f"Adding missing order from Exchange at price {price} ({exchange_order['clientOrderId']})")
+            local_orders[price] = exchange_order
+            drift["missing_locally"] += 1
+        if foreign_orders:
+            logging.debug("Ignored %d open orders not placed by the grid bots.", foreign_orders)
+
+        for kind, count in drift.items():
+            METRICS.inc("reconcile_drift_total", count, kind=kind, symbol=symbol)
+        METRICS.set("reconcile_drift", sum(drift.values()), symbol=symbol)
 
         logging.info(f"Reconciliation completed.")
-        logging.debug(f"Reconciliation completed. Active orders: {len(local_orders)}")
+        logging.debug("Reconciliation completed. Active orders: %d", len(local_orders))
         
         
         return local_orders, canceled_orders  # Επιστροφή ενεργών και ακυρωμένων παραγγελιών
@@ -739,10 +2222,7 @@ def find_order_by_id(canceled_orders, search_id):
     """
     Βρίσκει παραγγελία στο dictionary canceled_orders με βάση το ID.
     """
-    return next(
-        (order for order in canceled_orders.values() if order["id"] == search_id),
-        None
-    )
+    return canceled_orders.get_by_id(search_id)
 
 
 
@@ -761,7 +2241,7 @@ def balance_currencies(exchange, EXCHANGE_NAME, symbol, target_balance, min_prec
     """
 
     # Ανάκτηση διαθέσιμου υπολοίπου
-    balance = exchange.fetch_balance()
+    balance = get_balance(exchange)
     free_base = balance[symbol.split('/')[0]]['free']  # XRP
     free_quote = balance[symbol.split('/')[1]]['free']  # USDT
 
@@ -814,6 +2294,7 @@ def balance_currencies(exchange, EXCHANGE_NAME, symbol, target_balance, min_prec
         else:
             params = {'createMarketBuyOrderRequiresPrice': False}
             order = exchange.create_market_buy_order(symbol, cost, params=params)
+        invalidate_balance()
 
         # Ενημέρωση των balances
         free_base += amount_to_buy
@@ -824,6 +2305,7 @@ def balance_currencies(exchange, EXCHANGE_NAME, symbol, target_balance, min_prec
 
         logging.info(f"[TRADE] Selling {amount_to_sell:.2f} {CRYPTO_SYMBOL} for {required_usdt:.2f} {CRYPTO_CURRENCY}.")
         order = exchange.create_market_sell_order(symbol, amount_to_sell)
+        invalidate_balance()
 
         # Ενημέρωση των balances
         free_base -= amount_to_sell
@@ -838,9 +2320,292 @@ def balance_currencies(exchange, EXCHANGE_NAME, symbol, target_balance, min_prec
 
 
 
-# 7. ---------------------- Main Bot Logic ----------------------
-def run_grid_trading_bot(AMOUNT):
+# 7. ---------------------- Grid Ladder & Range Adjustment ----------------------
+class GridLadder:
+    """
+    Τα επίπεδα του grid (GRID_COUNT buy κάτω και GRID_COUNT sell πάνω από μια τιμή αναφοράς),
+    πάνω σε σταθερό πλέγμα origin + n * grid_size. Κάθε επίπεδο είναι ένα βήμα n του πλέγματος.
+    Η σκάλα παρακολουθεί το βιβλίο παραγγελιών (OrderBook.observe) και κρατά ανά πλευρά τα ελεύθερα επίπεδα
+    του παραθύρου (missing), ώστε το πλησιέστερο ελεύθερο επίπεδο να βρίσκεται σε O(1). Όταν η τιμή κινηθεί
+    κατά k βήματα, ενημερώνονται μόνο τα k επίπεδα που μπαίνουν / βγαίνουν ανά πλευρά (O(k)).
+    """
+
+    def __init__(self, origin, grid_size, grid_count, offset=0):
+        self.origin = origin
+        self.grid_size = grid_size
+        self.grid_count = grid_count
+        self.offset = offset
+        # Πλήθος παραγγελιών ανά βήμα του πλέγματος και ταξινομημένα βήματα των ελεύθερων επιπέδων του παραθύρου
+        self._coverage = {"buy": defaultdict(int), "sell": defaultdict(int)}
+        self.missing = {"buy": [], "sell": []}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["origin"], state["grid_size"], state["grid_count"], state["offset"])
+
+    def to_state(self):
+        """Η σκάλα όπως αποθηκεύεται στο αρχείο παραγγελιών (ενότητα "ladder"), ώστε σε cron mode να μετακινείται."""
+        return {"origin": self.origin, "offset": self.offset, "grid_size": self.grid_size, "grid_count": self.grid_count}
+
+    def _level(self, step):
+        return round(self.origin + self.grid_size * step, 4)
+
+    def _step(self, price):
+        # Μια παραγγελία καλύπτει το επίπεδο σε απόσταση μικρότερη από grid_size / 2
+        return round((price - self.origin) / self.grid_size)
+
+    def _window(self, side, offset=None, grid_count=None):
+        offset = self.offset if offset is None else offset
+        grid_count = self.grid_count if grid_count is None else grid_count
+        return range(offset - grid_count, offset) if side == "buy" else range(offset + 1, offset + grid_count + 1)
+
+    def _is_free(self, side, step):
+        return not self._coverage[side][step] and self._level(step) > 0
+
+    @property
+    def anchor(self):
+        return self._level(self.offset)
+
+    @property
+    def lowest_buy(self):
+        return self._level(self.offset - self.grid_count)
+
+    @property
+    def highest_sell(self):
+        return self._level(self.offset + self.grid_count)
+
+    def levels(self, side):
+        """Τα επίπεδα μίας πλευράς (με τιμή > 0), από το κοντινότερο στην τιμή προς το πιο μακρινό."""
+        window = self._window(side)
+        return [self._level(step) for step in (reversed(window) if side == "buy" else window) if self._level(step) > 0]
+
+    def next_free_level(self, side):
+        """Το πλησιέστερο στην τιμή επίπεδο που δεν καλύπτεται από παραγγελία της ίδιας πλευράς, ή None."""
+        missing = self.missing[side]
+        if not missing:
+            return None
+        return self._level(missing[-1] if side == "buy" else missing[0])
+
+    def attach(self, open_orders):
+        """Συνδέει τη σκάλα με το βιβλίο του iteration: η κάλυψη και τα ελεύθερα επίπεδα χτίζονται μία φορά."""
+        self._coverage = {"buy": defaultdict(int), "sell": defaultdict(int)}
+        open_orders.observe(self)
+        self.missing = {side: [step for step in self._window(side) if self._is_free(side, step)] for side in self.missing}
+
+    def order_added(self, side, price):
+        step = self._step(price)
+        self._coverage[side][step] += 1
+        if self._coverage[side][step] == 1 and step in self._window(side):
+            missing = self.missing[side]
+            i = bisect.bisect_left(missing, step)
+            if i < len(missing) and missing[i] == step:
+                del missing[i]
+
+    def order_removed(self, side, price):
+        step = self._step(price)
+        self._coverage[side][step] -= 1
+        if not self._coverage[side][step]:
+            del self._coverage[side][step]
+            if step in self._window(side) and self._level(step) > 0:
+                bisect.insort(self.missing[side], step)
+
+    def _move(self, offset, grid_count):
+        """
+        Μετακινεί / αλλάζει μέγεθος στο παράθυρο, ενημερώνοντας τα ελεύθερα επίπεδα μόνο για τα βήματα που
+        μπήκαν ή βγήκαν. Επιστρέφει (entering, leaving): τα επίπεδα ανά πλευρά που μπήκαν / βγήκαν από το παράθυρο.
+        """
+        entering = {"buy": [], "sell": []}
+        leaving = {"buy": [], "sell": []}
+        for side in ("buy", "sell"):
+            old = self._window(side)
+            new = self._window(side, offset, grid_count)
+            missing = self.missing[side]
+            for step in range_difference(old, new):
+                leaving[side].append(self._level(step))
+                i = bisect.bisect_left(missing, step)
+                if i < len(missing) and missing[i] == step:
+                    del missing[i]
+            for step in range_difference(new, old):
+                entering[side].append(self._level(step))
+                if self._is_free(side, step):
+                    bisect.insort(missing, step)
+        self.offset, self.grid_count = offset, grid_count
+        return entering, leaving
+
+    def resize(self, grid_count):
+        """Αλλάζει το πλήθος επιπέδων ανά πλευρά, προσθέτοντας ή αφαιρώντας μόνο τα πιο μακρινά επίπεδα."""
+        return self._move(self.offset, grid_count)
+
+    def shift_to(self, price):
+        """Μετακινεί τη σκάλα στο πλησιέστερο στην τιμή σημείο του πλέγματος. Επιστρέφει (entering, leaving)."""
+        return self._move(self._step(price), self.grid_count)
+
+
+def range_difference(a, b):
+    """Τα βήματα του range a (με βήμα 1) που δεν ανήκουν στο range b, χωρίς να διατρέχεται το b."""
+    yield from range(a.start, min(a.stop, max(b.start, a.start)))
+    yield from range(max(a.start, b.stop, min(b.start, a.stop)), a.stop)
+
+
+# Η σκάλα κάθε ζεύγους, ώστε σε daemon mode να μετακινείται αντί να ξαναχτίζεται σε κάθε iteration
+# (σε cron mode η σκάλα διαβάζεται από την ενότητα "ladder" του αρχείου παραγγελιών)
+grid_ladders = {}
+
+
+def get_grid_ladder(current_price, open_orders, saved_state=None):
+    """
+    Επιστρέφει τη σκάλα του ενεργού grid, συνδεδεμένη με το βιβλίο του iteration και μετακινημένη στην
+    τρέχουσα τιμή. Μια νέα σκάλα ευθυγραμμίζεται με το πλέγμα των υπαρχουσών παραγγελιών (αν υπάρχουν),
+    ώστε τα επίπεδά της να συμπίπτουν με αυτές.
+    """
+    ladder = grid_ladders.get(SYMBOL)
+    if ladder is None and saved_state:
+        try:
+            ladder = GridLadder.from_state(saved_state)
+        except (KeyError, TypeError) as e:
+            logging.warning(f"Ignoring invalid saved grid ladder: {e}")
+    if ladder is None or ladder.grid_size != GRID_SIZE:
+        origin = current_price
+        if open_orders:
+            reference = min(open_orders, key=lambda price: abs(price - current_price))
+            origin = round(reference + round((current_price - reference) / GRID_SIZE) * GRID_SIZE, 8)
+        ladder = grid_ladders[SYMBOL] = GridLadder(origin, GRID_SIZE, GRID_COUNT)
+        ladder.attach(open_orders)
+        logging.info(f"Grid ladder anchored at {ladder.anchor:.4f}.")
+        return ladder
+
+    grid_ladders[SYMBOL] = ladder
+    ladder.attach(open_orders)
+    if ladder.grid_count != GRID_COUNT:
+        # Νέο GRID_COUNT (hot reload): προστίθενται / αφαιρούνται μόνο τα ακριανά επίπεδα
+        ladder.resize(GRID_COUNT)
+        logging.info(f"Grid ladder resized to {GRID_COUNT} levels per side.")
+
+    entering, leaving = ladder.shift_to(current_price)
+    if entering["buy"] or entering["sell"]:
+        logging.info("Grid ladder shifted to %.4f. Entering buy: %s, sell: %s. Leaving buy: %s, sell: %s.",
+                     ladder.anchor, summarize_prices(entering["buy"]), summarize_prices(entering["sell"]),
+                     summarize_prices(leaving["buy"]), summarize_prices(leaving["sell"]))
+    return ladder
+
+
+# Η λογική του grid-adjustment.py, πάνω στο ίδιο in-memory βιβλίο παραγγελιών (τιμή -> παραγγελία)
+# και την ίδια τρέχουσα τιμή του iteration, χωρίς δεύτερη σύνδεση, pause flag ή ξεχωριστό αρχείο.
+
+def find_orders_out_of_range(open_orders, ladder, tolerance=0.0):
+    """
+    Επιστρέφει τις τιμές της πιο απομακρυσμένης buy / sell παραγγελίας, αν βρίσκονται εκτός του παραθύρου
+    της σκάλας (με ανοχή). Τα επίπεδα που βγήκαν από τη σκάλα (leaving) βρίσκονται ακριβώς έξω από τα όριά της,
+    και τα άκρα κάθε πλευράς διαβάζονται από το ευρετήριο του βιβλίου, χωρίς σάρωση.
+    """
+    lower_bound = ladder.lowest_buy - ladder.grid_size / 2
+    upper_bound = ladder.highest_sell + ladder.grid_size / 2
+    buy_prices = open_orders.side_prices("buy")
+    sell_prices = open_orders.side_prices("sell")
+
+    prices_to_cancel = []
+    if buy_prices and buy_prices[0] < lower_bound - tolerance:
+        logging.info(f"Buy order at price {buy_prices[0]} is out of range. "
+                     f"Lower bound (with tolerance): {lower_bound - tolerance:.4f}. It will be canceled.")
+        prices_to_cancel.append(buy_prices[0])
+    if sell_prices and sell_prices[-1] > upper_bound + tolerance:
+        logging.info(f"Sell order at price {sell_prices[-1]} is out of range. "
+                     f"Upper bound (with tolerance): {upper_bound + tolerance:.4f}. It will be canceled.")
+        prices_to_cancel.append(sell_prices[-1])
+
+    if not prices_to_cancel:
+        logging.info("No orders to cancel.")
+    return prices_to_cancel
+
+
+def process_canceled_orders(exchange, open_orders, canceled_orders, ladder):
+    """Αντικαθιστά κάθε ακυρωμένη παραγγελία με νέα, στο πλησιέστερο ελεύθερο επίπεδο της ίδιας πλευράς."""
+    for order in canceled_orders:
+        side = order["side"]
+
+        price = ladder.next_free_level(side)
+        if price is None:
+            logging.info(f"No free {side} level near {ladder.anchor:.4f} to replace canceled order {order['id']}.")
+            continue
+
+        logging.info(f"Preparing to place new {side} order at price: {price}")
+        new_order = place_order(exchange, side, price, AMOUNT)
+        if new_order:
+            open_orders[price] = new_order
+            METRICS.inc("range_adjustments_total", kind="replace_canceled", symbol=SYMBOL)
+
+
+def maintain_order_balance(exchange, open_orders, ladder):
+    """
+    Διατηρεί την ισορροπία μεταξύ buy και sell παραγγελιών, προσθέτοντας παραγγελίες στην πλευρά
+    με τις λιγότερες, χωρίς να ξεπεράσει το MAX_ORDERS.
+    """
+    if len(open_orders) >= MAX_ORDERS:
+        logging.info(f"No new orders will be placed to maintain balance. ({len(open_orders)})")
+        return
+
+    while len(open_orders) < MAX_ORDERS:
+        buys, sells = len(open_orders.side_prices("buy")), len(open_orders.side_prices("sell"))
+        if buys == sells:
+            break
+        side = "buy" if buys < sells else "sell"
+
+        price = ladder.next_free_level(side)
+        if price is None:
+            break
+
+        new_order = place_order(exchange, side, price, AMOUNT)
+        if not new_order:
+            break  # Ανεπαρκές υπόλοιπο ή σφάλμα: η place_order έχει ήδη ειδοποιήσει
+        open_orders[price] = new_order
+        METRICS.inc("range_adjustments_total", kind="balance", symbol=SYMBOL)
+        logging.info(f"Placed new {side} order at price: {price:.4f} to maintain order balance.")
+
+
+def handle_excess_orders(exchange, open_orders, current_price):
+    """
+    Ακυρώνει τις πιο απομακρυσμένες από την τρέχουσα τιμή παραγγελίες (τις λιγότερο πιθανές
+    να εκτελεστούν) όσο ο αριθμός τους υπερβαίνει το MAX_ORDERS.
+    """
+    excess = len(open_orders) - MAX_ORDERS
+    if excess <= 0:
+        logging.info(f"No excess orders detected. ({len(open_orders)})")
+        return
+
+    logging.warning(f"Excess orders detected: {excess}. Adjusting...")
+    farthest = heapq.nlargest(excess, open_orders, key=lambda price: abs(price - current_price))
+    for price in cancel_orders_batch(exchange, open_orders, farthest, reason="excess"):
+        METRICS.inc("range_adjustments_total", kind="excess", symbol=SYMBOL)
+
+
+def adjust_grid_range(exchange, open_orders, current_price, ladder):
+    """
+    Φάση προσαρμογής εύρους: ακύρωση παραγγελιών εκτός εύρους και αντικατάστασή τους,
+    ισορροπία buy / sell και ακύρωση των παραγγελιών πάνω από το MAX_ORDERS.
+    Ενημερώνει απευθείας το open_orders, οπότε οι ακυρώσεις δεν χρειάζεται να ξαναζητηθούν από το exchange.
+    """
+    tolerance = current_price * RANGE_TOLERANCE_RATIO
+    out_of_range = {price: open_orders[price] for price in find_orders_out_of_range(open_orders, ladder, tolerance)}
+    canceled_orders = []
+    for price in cancel_orders_batch(exchange, open_orders, list(out_of_range), reason="out of range"):
+        canceled_orders.append(out_of_range[price])
+        METRICS.inc("range_adjustments_total", kind="out_of_range", symbol=SYMBOL)
+
+    if canceled_orders:
+        process_canceled_orders(exchange, open_orders, canceled_orders, ladder)
+    else:
+        logging.info("No grid alteration was made. All orders are within the range.")
+
+    maintain_order_balance(exchange, open_orders, ladder)
+    handle_excess_orders(exchange, open_orders, current_price)
+
+
+
+
+# 8. ---------------------- Main Bot Logic ----------------------
+def run_grid_trading_bot(AMOUNT, exchange=None):
        
+    enter_phase("pause_wait")
     max_retries = 5  # Μέγιστος αριθμός προσπαθειών
     retries = 0
     waited_for_pause = False  # Σημαία για να ελέγξουμε αν υπήρξε αναμονή λόγω pause
@@ -871,97 +2636,118 @@ def run_grid_trading_bot(AMOUNT):
     logging.info(f"Loaded configuratio file from config file {JSON_PATH}.")
     
 
-    # Αρχικοποίηση exchange
-    exchange = initialize_exchange()  
-    logging.info(f"Connected to {EXCHANGE_NAME} - Markets loaded: {len(exchange.markets)}")
+    # Αρχικοποίηση exchange (αν δεν δόθηκε κοινή σύνδεση από το run_grid_engine)
+    if exchange is None:
+        enter_phase("initialize")
+        exchange = initialize_exchange()
+        logging.info(f"Connected to {EXCHANGE_NAME} - Markets loaded: {len(exchange.markets)}")
     
 
+    # Κλήσεις χαμηλής προτεραιότητας που αναβλήθηκαν σε προηγούμενο iteration, όσο χωράνε στο request weight
+    enter_phase("deferred_calls")
+    exchange.run_deferred_calls()
+
+
     # Εξισσοροπηση ισορροπίας κεφαλαίων
     if CHECK_BALANCE:
+        enter_phase("balance")
         logging.info("Checking currencies balances...")        
-        final_balances = balance_currencies(exchange, EXCHANGE_NAME, SYMBOL, TARGET_BALANCE)
-        logging.debug(f"Script completed. Final balances: {final_balances}")
+        try:
+            final_balances = balance_currencies(exchange, EXCHANGE_NAME, SYMBOL, TARGET_BALANCE)
+            logging.debug("Script completed. Final balances: %s", final_balances)
+        except ApiCallDeferred as e:
+            # Το weight του λεπτού μένει για τις "critical" κλήσεις: ο έλεγχος γίνεται στο επόμενο iteration
+            logging.info(f"Balance check skipped until the next iteration: {e}")
     
 
     # Φόρτωση παραγγελιών και στατιστικών από το αρχείο
-    open_orders, statistics = load_or_fetch_open_orders(exchange, SYMBOL, OPEN_ORDERS_FILE)
+    enter_phase("load_state")
+    open_orders, statistics, sections = load_or_fetch_open_orders(exchange, SYMBOL, OPEN_ORDERS_FILE)
+    ladder_state = sections.get("ladder")
+    # Οι επαναλήψεις που δεν είχαν λήξει στην προηγούμενη εκτέλεση εξυπηρετούνται όταν λήξουν (process_order_retries)
+    retries_state = sections.get("order_retries") or {}
+    restore_order_retries(retries_state)
  
 
     # Διασφάλιση consistency στα open_orders
-    open_orders = {float(k): v for k, v in open_orders.items()}  # Τιμές σε float
-        
+    open_orders = OrderBook((float(k), v) for k, v in open_orders.items())  # Τιμές σε float
+
+    # Ledger κερδών: τα statistics ενημερώνονται μόνο από εκτελέσεις
+    ledger = ProfitLedger(GRID_SIZE, statistics)
+    statistics = ledger.to_statistics()
+
+    # Η κατάσταση όπως είναι στο αρχείο: από εδώ και πέρα γράφεται μόνο αν αλλάξει (μία φορά ανά iteration)
+    saved_version = state_version(open_orders, ledger, ladder_state, retries_state)
 
     # Logging αρχικών τιμών
-    logging.info(f"Loaded statistics: {{ {', '.join(f'{key}: {round(value, 2) if isinstance(value, (int, float)) else value}' for key, value in statistics.items())} }}")
-    logging.debug(f"Loaded open orders: {open_orders}")
+    logging.info("Loaded statistics: %s", summarize_statistics(statistics))
+    logging.debug("Loaded open orders: %s", summarize_orders(open_orders))
     
 
     # Συγχρονισμός με τα πραγματικά open orders από την Binance
+    enter_phase("reconcile")
     logging.info("Reconciling local open orders with Binance...")
-    open_orders, canceled_orders = reconcile_open_orders(exchange, SYMBOL, open_orders)
-    logging.debug(f"Reconciliation complete. Active orders: {open_orders}")
+    open_orders, canceled_orders = reconcile_open_orders(exchange, SYMBOL, open_orders, ledger)
+    logging.debug("Reconciliation complete. Active orders: %s", summarize_orders(open_orders))
     
     # Αναφορά για τις ακυρωμένες παραγγελίες
     if canceled_orders:
-        for price, order in canceled_orders.items():
-            logging.debug(f"Canceled order detected: Price {price}, ID {order['id']}")    
+        logging.debug("Canceled orders detected: %s", summarize_orders(canceled_orders))
 
     # Αποθήκευση του συγχρονισμένου state
     #save_open_orders_to_file(OPEN_ORDERS_FILE, open_orders)
 
     # Βρες την τρέχουσα τιμή
+    enter_phase("ticker")
     current_price = get_current_price(exchange)
     logging.info(f"Current price: {current_price} {CRYPTO_CURRENCY}.")
 
+    # Επίπεδα του grid: η σκάλα μετακινείται μόνο όσο κινήθηκε η τιμή
+    ladder = get_grid_ladder(current_price, open_orders, ladder_state)
+
   
     
     # Αρχική τοποθέτηση εντολών (buy / sell) μόνο αν δεν υπάρχουν ήδη εντολές
     if not open_orders:
-        
+        enter_phase("initial_grid")
         logging.info("No existing open orders. Placing initial grid orders.")
         
         
         # Δημιουργία grid (παράδειγμα: 10 * 10$ πάνω/κάτω)
-        buy_prices = [round(current_price - GRID_SIZE * i, 4) for i in range(1, GRID_COUNT + 1)]
-        sell_prices = [round(current_price + GRID_SIZE * i, 4) for i in range(1, GRID_COUNT + 1)]
-        
-        logging.info(f"Generated buy prices: {buy_prices}")
-        logging.info(f"Generated sell prices: {sell_prices}")        
+        logging.info("Generated buy prices: %s", summarize_prices(ladder.levels("buy")))
+        logging.info("Generated sell prices: %s", summarize_prices(ladder.levels("sell")))
         
         all_orders_successful = True  # Flag για επιτυχία τοποθέτησης όλων των παραγγελιών
+        queued_orders = 0
 
-        for price in buy_prices:
-            if price > 0:  # Λίγο έλεγχος ότι δεν πάμε σε απίθανη αρνητική τιμή
-                order = place_order(exchange, "buy", price, AMOUNT)
-                if order:
-                    open_orders[price] = order
-                    statistics["total_buys"] += 1  # Ενημέρωση στατιστικών
-                else:
-                    logging.error(f"Stopping initial grid setup due to issue at buy price {price:.4f}.")
-                    all_orders_successful = False
-                    return
-
-        if all_orders_successful:  # Μόνο αν όλες οι αγορές ήταν επιτυχείς
-            for price in sell_prices:
-                order = place_order(exchange, "sell", price, AMOUNT)
+        # Τα επίπεδα της σκάλας (με τιμή > 0), από το κοντινότερο, πρώτα οι αγορές: μια παραγγελία που μπήκε στην
+        # ουρά επανάληψης (σφάλμα δικτύου) δεν σταματά την τοποθέτηση, τοποθετείται από το process_order_retries
+        for side in ("buy", "sell"):
+            for price in ladder.levels(side):
+                order = place_order(exchange, side, price, AMOUNT)
                 if order:
                     open_orders[price] = order
-                    statistics["total_sells"] += 1  # Ενημέρωση στατιστικών
+                elif client_order_id_for(side, price) in pending_order_retries:
+                    queued_orders += 1
                 else:
-                    logging.error(f"Stopping initial grid setup due to issue at sell price {price:.4f}.")
+                    logging.error(f"Stopping initial grid setup due to issue at {side} price {price:.4f}.")
                     all_orders_successful = False
-                    return
+                    break
+            if not all_orders_successful:
+                break
 
-        # Αποθήκευση μόνο αν όλες οι παραγγελίες τοποθετήθηκαν επιτυχώς
+        # Αποθήκευση και σε αποτυχία, ώστε οι παραγγελίες που τοποθετήθηκαν και η ουρά να μη χαθούν
+        saved_version = save_state_if_changed(OPEN_ORDERS_FILE, open_orders, ledger, saved_version, ladder)
         if all_orders_successful:
-            save_open_orders_to_file(OPEN_ORDERS_FILE, open_orders)
-            logging.info(f"Initial orders placed and saved: {open_orders}")
+            logging.info("Initial orders placed and saved: %s", summarize_orders(open_orders))
+            if queued_orders:
+                logging.info(f"{queued_orders} initial orders queued for retry.")
             
             # Send notifications on successful orders
-            send_push_notification(f"Initial orders placed and saved: {open_orders}")          
+            send_push_notification(f"Initial orders placed and saved: {summarize_orders(open_orders)}")
                        
         else:
-            logging.error("Initial grid setup incomplete. Orders not saved.")
+            logging.error("Initial grid setup incomplete. Placed orders and queued retries saved.")
             
             # Send notifications on failed orders
             send_push_notification(f"Failed to place initial orders")
@@ -978,25 +2764,24 @@ def run_grid_trading_bot(AMOUNT):
         
         
         # Έλεγχος κατάστασης παραγγελιών
-        filled_orders = check_orders_status(exchange, open_orders, current_price)
+        enter_phase("check_orders")
+        filled_orders = check_orders_status(exchange, open_orders, current_price, ledger)
         
         
         
-        # Υπολογισμός δυναμικού grid
-        buy_prices = [round(current_price - GRID_SIZE * i, 4) for i in range(1, GRID_COUNT + 1)]
-        sell_prices = [round(current_price + GRID_SIZE * i, 4) for i in range(1, GRID_COUNT + 1)] 
 
  
         # Λογική για εκτελεσμένες παραγγελίες
+        enter_phase("process_fills")
         if filled_orders:
         
             logging.info(f"Check order status has been completed")
-            logging.info(f"Orders identified as filled: {filled_orders}")
+            logging.info("Orders identified as filled: %s", summarize_prices(filled_orders))
                       
             logging.info("Recalculating grid prices to process executed orders and replenish the grid.")
 
-            logging.info(f"Adjusted Buy prices due to filled orders: {buy_prices}")
-            logging.info(f"Adjusted Sell prices due to filled orders: {sell_prices}")
+            logging.info("Grid levels: buy %.4f - %.4f, sell %.4f - %.4f.", ladder.lowest_buy,
+                         ladder.anchor - GRID_SIZE, ladder.anchor + GRID_SIZE, ladder.highest_sell)
 
             # Επεξεργασία παραγγελιών που εκτελέστηκαν
             for filled_price in filled_orders:
@@ -1004,40 +2789,15 @@ def run_grid_trading_bot(AMOUNT):
                 if rounded_filled_price in open_orders:
                     order_info = open_orders.pop(rounded_filled_price)
                     side = order_info["side"]
-                    amount = order_info["amount"]
                     new_price = round(rounded_filled_price + (GRID_SIZE if side == "buy" else -GRID_SIZE), 4)
-                    order_price = order_info["price"]  # Τιμή της παραγγελίας (αγοράς ή πώλησης)
-                    
-                    
-                    # --- NEW CODE ---
-                    # Υπολογισμός κέρδους ή ζημίας
-                    if side == "sell":
-                        buy_price = order_price  # Χρησιμοποιούμε την τιμή αγοράς από την παραγγελία
-                        profit = (rounded_filled_price - buy_price) * amount
-                        statistics["total_sells"] += 1
-                        logging.info(f"Profit from Sell Order: {profit:.2f}, Updated Net Profit: {statistics['net_profit']:.2f}")
-                    elif side == "buy":
-                        # Αύξηση total_buys
-                        statistics["total_buys"] += 1
-                    # --- END NEW CODE ---
+                    # Το κέρδος της εκτέλεσης έχει ήδη καταγραφεί στο ledger (check_orders_status)
 
-                    
 
                     # Ελέγχουμε αν η νέα παραγγελία είναι εντός του grid
-                    if (side == "buy" and new_price >= min(buy_prices)) or (side == "sell" and new_price <= max(sell_prices)):
+                    if (side == "buy" and new_price >= ladder.lowest_buy) or (side == "sell" and new_price <= ladder.highest_sell):
                         if new_price not in open_orders:
-                            try:
-                                # Ελέγχουμε αν υπάρχει ήδη παραγγελία στο exchange για αυτή την τιμή
-                                exchange_orders = fetch_open_orders_from_exchange(exchange, SYMBOL)
-                                exchange_prices = {round(float(order['price']), 4) for order in exchange_orders}
-
-                                if new_price in exchange_prices:
-                                    logging.info(f"{side.capitalize()} order at {new_price:.4f} already active on exchange. Skipping.")
-                                    continue  # Προχωράμε στην επόμενη παραγγελία
-                            except Exception as e:
-                                logging.error(f"Error verifying new order at {new_price:.4f} on exchange: {e}")
-                                continue
-
+                            # Δεν χρειάζεται έλεγχος στο exchange: μια ήδη ενεργή παραγγελία του επιπέδου έχει το ίδιο
+                            # client order ID, οπότε είτε είναι ήδη στο open_orders (reconcile) είτε την απορρίπτει το exchange
                             try:
                                 # Τοποθέτηση νέας παραγγελίας
                                 order = place_order(exchange, side, new_price, AMOUNT)
@@ -1050,7 +2810,7 @@ def run_grid_trading_bot(AMOUNT):
                                 logging.error(f"Critical error while placing {side.capitalize()} order at {new_price:.4f}: {e}")
                                 continue
                         else:
-                            logging.debug(f"{side.capitalize()} order at {new_price:.4f} already exists locally.")
+                            logging.debug("%s order at %.4f already exists locally.", side.capitalize(), new_price)
                     else:
                         logging.warning(f"New order price {new_price:.4f} is outside the dynamic grid. Skipping.")
                 else:
@@ -1061,127 +2821,76 @@ def run_grid_trading_bot(AMOUNT):
             logging.info("No orders were filled in this iteration.")
 
 
+        # Επαναλήψεις παραγγελιών που απέτυχαν (μόνο όσες έχουν λήξει, χωρίς αναμονή)
+        enter_phase("order_retries")
+        process_order_retries(exchange, open_orders)
+
+
+        # Προσαρμογή εύρους στο ίδιο βιβλίο παραγγελιών (βλ. ENABLE_RANGE_ADJUSTMENT)
+        if ENABLE_RANGE_ADJUSTMENT:
+            enter_phase("range_adjust")
+            adjust_grid_range(exchange, open_orders, current_price, ladder)
 
 
         
         # Λογική αναπλήρωσης παραγγελιών       
+        enter_phase("replenish")
         # Πρώτος έλεγχος - μέγιστος αριθμός παραγγελιών
         if len(open_orders) >= MAX_ORDERS:
             logging.info(f"Reached maximum open orders limit.")
             logging.info(f"Grid replenishment skipped to avoid exceeding the defined Grid_count ({MAX_ORDERS}) or the available capital.")
         else:
-            # Λογική αναπλήρωσης για buy και sell παραγγελίες
-            current_buy_orders = list(set(price for price, order in open_orders.items() if order["side"] == "buy"))
-            current_sell_orders = list(set(price for price, order in open_orders.items() if order["side"] == "sell"))
-
-            logging.info(f"Current grid status - Buy orders: {len(current_buy_orders)}, Sell orders: {len(current_sell_orders)} ")
-            logging.debug(f"Grid Count {GRID_COUNT}")            
-
-            logging.debug(f"Current canceled_orders: {canceled_orders}")
-
-            
-            while len(current_buy_orders) < GRID_COUNT:
-                new_buy_price = round(min(current_buy_orders or buy_prices) - GRID_SIZE, 4)
-                logging.info(f"[Buy Replenishment] Calculated new_buy_price: {new_buy_price:.4f}")
-
-                if new_buy_price > 0 and new_buy_price not in open_orders:
-                    try:
-                        skip_replenishment = False
-                        
-                        for price, order in canceled_orders.items():
-                            order_id = order.get("id")
-                            if order_id:
-                                status = get_order_status(exchange, order_id)
-                                logging.info(f"Order ID {order_id} status: {status}")
-                                if status == "canceled":
-                                    logging.info(f"[Buy Replenishment] Skipping replenishment for canceled order. Price: {price:.4f}, ID: {order_id}")
-                                    skip_replenishment = True
-                                    current_buy_orders.append(new_buy_price)
-                                    break
-                        
-                        if skip_replenishment:
-                            continue
-
-                        # Τοποθέτηση νέας παραγγελίας
-                        logging.info(f"[Buy Replenishment] Attempting to place Buy order at price {new_buy_price:.4f}")
-                        order = place_order(exchange, "buy", new_buy_price, AMOUNT)
-                        if order:
-                            logging.info(f"[Buy Replenishment] Buy order placed successfully. Price: {new_buy_price:.4f}, Order ID: {order['id']}")
-                            open_orders[new_buy_price] = order
-                            current_buy_orders.append(new_buy_price)
-                            statistics["total_buys"] += 1
-                        else:
-                            logging.warning(f"[Buy Replenishment] Failed to place Buy order at price {new_buy_price:.4f}. Exiting replenishment loop.")
-                            send_push_notification(f"Insufficient balance for buy order at {new_buy_price:.4f}")
-                            break
-
+            # Λογική αναπλήρωσης για buy και sell παραγγελίες: τα πλήθη και τα ελεύθερα επίπεδα
+            # διαβάζονται από το ευρετήριο του βιβλίου και τη σκάλα, χωρίς σάρωση του grid
+            logging.info(f"Current grid status - Buy orders: {len(open_orders.side_prices('buy'))}, Sell orders: {len(open_orders.side_prices('sell'))} ")
+            logging.debug("Grid Count %s", GRID_COUNT)
+
+            logging.debug("Current canceled_orders: %s", summarize_orders(canceled_orders))
+
+            # Παραγγελία που ακύρωσε ο worker: το status της επιβεβαιώθηκε ήδη στο reconcile (fetch_order),
+            # οπότε δεν ξαναζητείται από το exchange για κάθε παραγγελία σε κάθε επανάληψη
+            worker_canceled = next(
+                ((price, order["id"]) for price, order in canceled_orders.items() if order.get("id") and order.get("status") == "canceled"),
+                None,
+            )
 
-                    except Exception as e:
-                        logging.error(f"[Buy Replenishment] Error placing Buy order at {new_buy_price:.4f}: {e}")
-                else:
-                    logging.info(f"[Buy Replenishment] Skipping Buy order placement. Price {new_buy_price:.4f} already in open_orders or invalid.")
-                    break
+            for side in ("buy", "sell"):
+                label = f"[{side.capitalize()} Replenishment]"
+                if len(open_orders.side_prices(side)) < GRID_COUNT and worker_canceled is not None:
+                    price, order_id = worker_canceled
+                    logging.info(f"{label} Skipping replenishment for canceled order. Price: {price:.4f}, ID: {order_id}")
+                    continue
 
-            while len(current_sell_orders) < GRID_COUNT:
-                new_sell_price = round(max(current_sell_orders or sell_prices) + GRID_SIZE, 4)
-                logging.info(f"[Sell Replenishment] Calculated new_sell_price: {new_sell_price:.4f}")
+                while len(open_orders.side_prices(side)) < GRID_COUNT:
+                    # Το πλησιέστερο ελεύθερο επίπεδο της σκάλας (όσα μπήκαν με τη μετακίνησή της είναι ήδη εδώ)
+                    new_price = ladder.next_free_level(side)
+                    if new_price is None:
+                        logging.info(f"{label} No free {side} level left in the grid. Skipping {side.capitalize()} order placement.")
+                        break
 
-                if new_sell_price > 0 and new_sell_price not in open_orders:
                     try:
-                        skip_replenishment = False
-                        
-                        for price, order in canceled_orders.items():
-                            order_id = order.get("id")
-                            if order_id:
-                                status = get_order_status(exchange, order_id)
-                                logging.debug(f"Order ID {order_id} status: {status}")
-                                if status == "canceled":
-                                    logging.info(f"[Sell Replenishment] Skipping replenishment for canceled order. Price: {price:.4f}, ID: {order_id}")
-                                    skip_replenishment = True
-                                    current_sell_orders.append(new_sell_price)
-                                    break
-                        
-                        if skip_replenishment:
-                            continue
-
                         # Τοποθέτηση νέας παραγγελίας
-                        logging.info(f"[Sell Replenishment] Attempting to place Sell order at price {new_sell_price:.4f}")
-                        order = place_order(exchange, "sell", new_sell_price, AMOUNT)
+                        logging.info(f"{label} Attempting to place {side.capitalize()} order at price {new_price:.4f}")
+                        order = place_order(exchange, side, new_price, AMOUNT)
                         if order:
-                            logging.info(f"[Sell Replenishment] Sell order placed successfully. Price: {new_sell_price:.4f}, Order ID: {order['id']}")
-                            open_orders[new_sell_price] = order
-                            current_sell_orders.append(new_sell_price)
-                            statistics["total_sells"] += 1
+                            logging.info(f"{label} {side.capitalize()} order placed successfully. Price: {new_price:.4f}, Order ID: {order['id']}")
+                            open_orders[new_price] = order
                         else:
-                            logging.warning(f"[Sell Replenishment] Failed to place Sell order at price {new_sell_price:.4f}.")
-                            send_push_notification(f"Insufficient balance for sell order at {new_sell_price:.4f}")
+                            logging.warning(f"{label} Failed to place {side.capitalize()} order at price {new_price:.4f}. Exiting replenishment loop.")
+                            send_push_notification(f"Insufficient balance for {side} order at {new_price:.4f}")
                             break
-
-                            
                     except Exception as e:
-                        logging.error(f"[Sell Replenishment] Error placing Sell order at {new_sell_price:.4f}: {e}")
-                else:
-                    logging.info(f"[Sell Replenishment] Skipping Sell order placement. Price {new_sell_price:.4f} already in open_orders or invalid.")
-                    break
-
-
-
-
-
-
-
+                        logging.error(f"{label} Error placing {side.capitalize()} order at {new_price:.4f}: {e}")
+                        break
 
             logging.info(f"Grid replenishment completed.")
 
+        # Όσες επαναλήψεις έληξαν κατά τη διάρκεια του iteration
+        enter_phase("order_retries")
+        process_order_retries(exchange, open_orders)
 
         
-        
-        logging.debug(f"Open orders to be saved: {open_orders}")
-        
-        # Αποθήκευση ενημερωμένων δεδομένων
-        save_open_orders_to_file(OPEN_ORDERS_FILE, open_orders, statistics, silent=True)
-        
-        logging.info(f"Saved open orders (including canceled) and statistics to orders file {OPEN_ORDERS_FILE}.")
+        logging.debug("Open orders to be saved: %s", summarize_orders(open_orders))
        
         # Μετά την ολοκλήρωση του iteration
         iteration_end = time.time()
@@ -1190,17 +2899,99 @@ def run_grid_trading_bot(AMOUNT):
         
         
 
+    except ExchangeCircuitOpen as e:
+        # Το κύκλωμα άνοιξε στη διάρκεια του iteration: το υπόλοιπο παραλείπεται, η κατάσταση αποθηκεύεται κανονικά
+        logging.warning(f"Skipping the rest of the iteration: {e}.")
     except Exception as e:
         logging.exception(f"Error in grid trading loop: {e}")
     finally:
-        save_open_orders_to_file(OPEN_ORDERS_FILE, open_orders, statistics, silent=True)        
+        # Αποθήκευση ενημερωμένων δεδομένων: όλες οι αλλαγές του iteration σε μία εγγραφή, μόνο αν υπάρχουν
+        enter_phase("save")
+        save_state_if_changed(OPEN_ORDERS_FILE, open_orders, ledger, saved_version, ladder)
+        statistics = ledger.to_statistics()
+        update_order_metrics(open_orders, statistics, canceled_orders)
+        exchange.log_call_summary()
             
 
 
+def run_instrumented_iteration(exchange=None):
+    """Εκτελεί ένα iteration του ενεργού grid και καταγράφει διάρκεια και έκβαση στα metrics."""
+    start = time.perf_counter()
+    outcome = "success"
+    try:
+        run_grid_trading_bot(AMOUNT, exchange)
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        enter_phase(None)
+        METRICS.observe("iteration_duration_seconds", time.perf_counter() - start, symbol=SYMBOL)
+        METRICS.inc("iterations_total", outcome=outcome, symbol=SYMBOL)
+        METRICS.set("last_iteration_timestamp_seconds", time.time(), symbol=SYMBOL)
+
+
+
+# 9. ---------------------- Multi-grid Engine ----------------------
+# Μετρητής γύρων, για εναλλαγή της σειράς εκτέλεσης των grids (round-robin)
+engine_round = 0
+
+
+def run_grid_engine(exchange=None):
+    """
+    Εκτελεί ένα γύρο για όλα τα grids του GRID_CONFIG με μία κοινή σύνδεση στο exchange
+    και ένα κοινό snapshot υπολοίπων. Η σειρά εκτέλεσης περιστρέφεται σε κάθε γύρο, ώστε
+    κανένα ζεύγος να μην είναι μόνιμα τελευταίο, και ένα σφάλμα σε ένα grid δεν σταματά τα υπόλοιπα.
+    Επιστρέφει το exchange, ώστε σε daemon mode να ξαναχρησιμοποιείται στον επόμενο γύρο.
+    """
+    global engine_round
+
+    if exchange is None:
+        enter_phase("initialize")
+        exchange = initialize_exchange()
+        logging.info(f"Connected to {EXCHANGE_NAME} - Markets loaded: {len(exchange.markets)}")
+        enter_phase(None)
+
+    # Degraded mode: με ανοιχτό circuit breaker ο γύρος παραλείπεται, μόνο το health probe τρέχει
+    if not exchange.is_available():
+        logging.warning(f"{EXCHANGE_NAME} circuit is open. Skipping this round (degraded mode).")
+        return exchange
+
+    # Νέο snapshot υπολοίπων σε κάθε γύρο, κοινό για όλα τα grids
+    invalidate_balance()
+
+    start = engine_round % len(GRID_CONFIGS)
+    engine_round += 1
+    for grid in GRID_CONFIGS[start:] + GRID_CONFIGS[:start]:
+        activate_grid(grid)
+        try:
+            run_instrumented_iteration(exchange)
+        except Exception as e:
+            logging.error(f"Grid {SYMBOL} iteration failed: {e}", exc_info=True)
+
+    return exchange
+
+
+
 if __name__ == "__main__":
-    try:        
-        run_grid_trading_bot(AMOUNT)
+    if RUN_AS_DAEMON:
+        start_metrics_server(METRICS_HTTP_PORT)
+        exchange = None
+        while True:
+            try:
+                reload_config_if_changed()  # Στο όριο μεταξύ γύρων, ώστε ένας γύρος να τρέχει με ίδιες ρυθμίσεις
+                exchange = run_grid_engine(exchange)
+            except Exception as e:
+                logging.error(f"An unexpected error occurred: {e}", exc_info=True)
+            time.sleep(DAEMON_INTERVAL_SECONDS)
+    else:
+        try:
+            run_grid_engine()
 
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}", exc_info=True)
+        except Exception as e:
+            logging.error(f"An unexpected error occurred: {e}", exc_info=True)
+        finally:
+            if pending_order_retries:
+                # Η ουρά κάθε grid αποθηκεύεται στο αρχείο παραγγελιών του και εξυπηρετείται στην επόμενη εκτέλεση
+                logging.info(f"{len(pending_order_retries)} queued order retries saved for the next run.")
+            write_metrics_textfile(METRICS_TEXTFILE_PATH)
         
@@ -0,0 +1,407 @@
+import glob
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+
+from state_format import STATE_FORMATS, load_state
+
+# Logging setup
+SUPERVISOR_HOME = os.environ.get("GRID_BOT_HOME", "/opt/python/grid-trading-bot")
+LOG_FILE_PATH = os.path.join(SUPERVISOR_HOME, "grid_supervisor.log")
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(LOG_FILE_PATH),  # Αρχείο log
+        logging.StreamHandler()  # Κονσόλα
+    ]
+)
+
+
+
+
+# 1. ---------------------- Static / Global configuration ----------------------
+# Λίστα λογαριασμών: {"ACCOUNTS": [{"NAME": ..., "HOME": ..., "SCRIPTS": [...]}]}
+SUPERVISOR_CONFIG_PATH = os.environ.get("GRID_SUPERVISOR_CONFIG", os.path.join(SUPERVISOR_HOME, "supervisor.json"))
+
+# Τα scripts των workers βρίσκονται δίπλα στον supervisor
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCRIPTS = ["grid-bot.py"]
+
+# Κάθε worker παίρνει δική του θύρα metrics, ξεκινώντας από αυτή
+WORKER_METRICS_BASE_PORT = 9200
+WORKER_SCRAPE_TIMEOUT_SECONDS = 2
+
+# Metrics του supervisor (μαζί με τα συγκεντρωτικά metrics των workers)
+METRICS_PREFIX = "grid_supervisor"
+METRICS_HTTP_PORT = 9100
+
+# Έλεγχος workers και σύνοψη στατιστικών
+POLL_INTERVAL_SECONDS = 5
+STATISTICS_INTERVAL_SECONDS = 300
+
+# Επανεκκίνηση με εκθετική καθυστέρηση. Ένας worker που έτρεξε τουλάχιστον
+# RESTART_STABLE_SECONDS θεωρείται σταθερός και η καθυστέρηση μηδενίζεται.
+RESTART_BACKOFF_BASE_SECONDS = 5
+RESTART_BACKOFF_MAX_SECONDS = 600
+RESTART_STABLE_SECONDS = 600
+SHUTDOWN_TIMEOUT_SECONDS = 30
+
+
+
+# 2. ---------------------- Load Accounts from external file ----------------------
+def load_accounts():
+    """Load the account list (name, data folder, scripts to run) from the supervisor JSON file."""
+    try:
+        with open(SUPERVISOR_CONFIG_PATH, "r") as file:
+            accounts = json.load(file).get("ACCOUNTS", [])
+    except FileNotFoundError:
+        raise FileNotFoundError(f"The specified JSON file '{SUPERVISOR_CONFIG_PATH}' was not found.")
+    except json.JSONDecodeError:
+        raise ValueError(f"The JSON file '{SUPERVISOR_CONFIG_PATH}' is not properly formatted.")
+
+    if not accounts:
+        raise ValueError(f"No ACCOUNTS defined in '{SUPERVISOR_CONFIG_PATH}'.")
+
+    names = set()
+    for index, account in enumerate(accounts):
+        missing_keys = [key for key in ("NAME", "HOME") if not account.get(key)]
+        if missing_keys:
+            raise ValueError(f"Missing keys in ACCOUNTS[{index}]: {', '.join(missing_keys)}")
+        if account["NAME"] in names:
+            raise ValueError(f"Duplicate account name '{account['NAME']}'.")
+        names.add(account["NAME"])
+
+        # Κάθε λογαριασμός έχει το δικό του config.json στον φάκελό του
+        if not os.path.exists(os.path.join(account["HOME"], "config.json")):
+            raise FileNotFoundError(f"Account '{account['NAME']}' has no config.json in {account['HOME']}.")
+        account.setdefault("SCRIPTS", DEFAULT_SCRIPTS)
+
+    return accounts
+
+
+
+
+# ---------------------- Metrics ----------------------
+# Ορισμοί metrics: όνομα -> (τύπος, περιγραφή)
+METRIC_DEFINITIONS = {
+    "worker_up": ("gauge", "Whether the worker process is running."),
+    "worker_restarts_total": ("counter", "Worker restarts after an exit."),
+    "worker_exits_total": ("counter", "Worker exits per exit code."),
+    "total_buys": ("gauge", "Statistics counter total_buys per account."),
+    "total_sells": ("gauge", "Statistics counter total_sells per account."),
+    "net_profit": ("gauge", "Statistics counter net_profit per account."),
+}
+
+
+class MetricsRegistry:
+    """
+    Απλό registry για counters και gauges με labels,
+    που αποδίδεται σε Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix, definitions):
+        self.prefix = prefix
+        self.definitions = definitions
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.samples.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.samples.setdefault(name, {})[key] = value
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for name, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{name}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.samples.items()):
+                metric_type, help_text = self.definitions.get(name, ("untyped", name))
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(METRICS_PREFIX, METRIC_DEFINITIONS)
+
+
+def add_account_label(line, account_name):
+    """Προσθέτει το label account σε μία γραμμή δείγματος Prometheus."""
+    label = 'account="' + account_name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    name, separator, rest = line.partition("{")
+    if separator:
+        return f"{name}{{{label},{rest}"
+    name, _, value = line.partition(" ")
+    return f"{name}{{{label}}} {value}"
+
+
+def merge_worker_metrics(workers):
+    """
+    Συλλέγει τα metrics όλων των workers που τρέχουν και τα ενώνει ανά οικογένεια metric,
+    με label account, ώστε το Prometheus να τα αθροίζει ανά λογαριασμό ή συνολικά.
+    """
+    headers = {}
+    families = {}
+    for worker in workers:
+        text = worker.scrape()
+        if text is None:
+            continue
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = parts[2]
+                    headers.setdefault(family, {}).setdefault(parts[1], line)
+                    families.setdefault(family, [])
+            elif line.strip() and family is not None:
+                families[family].append(add_account_label(line, worker.account["NAME"]))
+
+    lines = []
+    for family, samples in families.items():
+        lines.extend(headers[family][kind] for kind in ("HELP", "TYPE") if kind in headers[family])
+        lines.extend(samples)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body = (METRICS.render() + merge_worker_metrics(WORKERS)).encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/statistics":
+            body = json.dumps(latest_statistics, indent=4).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Χωρίς access log για κάθε scrape
+
+
+def start_metrics_server(port):
+    """Ξεκινά HTTP endpoints /metrics και /statistics σε background thread (μόνο σε localhost)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Supervisor endpoint listening on http://127.0.0.1:{port}/metrics")
+    return server
+
+
+
+
+# 3. ---------------------- Worker Processes ----------------------
+class Worker:
+    """
+    Ένα script (grid-bot.py / grid-adjustment.py) ενός λογαριασμού, σε δική του διεργασία.
+    Τρέχει σε daemon mode με GRID_BOT_HOME τον φάκελο του λογαριασμού, ώστε config,
+    αρχεία παραγγελιών, pause.flag και logs να μη μοιράζονται με άλλους λογαριασμούς.
+    """
+
+    def __init__(self, account, script, metrics_port):
+        self.account = account
+        self.script = script
+        self.metrics_port = metrics_port
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.next_start = 0.0
+
+    @property
+    def name(self):
+        return f"{self.account['NAME']}/{self.script}"
+
+    def start(self):
+        env = dict(os.environ,
+                   GRID_BOT_HOME=self.account["HOME"],
+                   GRID_BOT_DAEMON="1",
+                   GRID_BOT_METRICS_PORT=str(self.metrics_port))
+        # Η έξοδος κονσόλας (και τυχόν traceback) κρατιέται σε αρχείο στον φάκελο του λογαριασμού
+        output_path = os.path.join(self.account["HOME"], os.path.splitext(self.script)[0] + ".out")
+        with open(output_path, "a") as output:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.join(SCRIPTS_DIR, self.script)],
+                cwd=self.account["HOME"], env=env, stdout=output, stderr=subprocess.STDOUT,
+            )
+        self.started_at = time.monotonic()
+        METRICS.set("worker_up", 1, account=self.account["NAME"], script=self.script)
+        logging.info(f"Started worker {self.name} (pid {self.process.pid}, metrics port {self.metrics_port}).")
+
+    def poll(self, now):
+        """Ελέγχει τη διεργασία: καταγράφει τον τερματισμό της και την ξεκινά ξανά όταν λήξει η καθυστέρηση."""
+        if self.process is not None:
+            exit_code = self.process.poll()
+            if exit_code is None:
+                return
+            METRICS.set("worker_up", 0, account=self.account["NAME"], script=self.script)
+            METRICS.inc("worker_exits_total", account=self.account["NAME"], script=self.script, code=exit_code)
+
+            if now - self.started_at >= RESTART_STABLE_SECONDS:
+                self.failures = 0
+            self.failures += 1
+            delay = min(RESTART_BACKOFF_MAX_SECONDS, RESTART_BACKOFF_BASE_SECONDS * 2 ** (self.failures - 1))
+            self.next_start = now + delay
+            self.process = None
+            logging.warning(f"Worker {self.name} exited with code {exit_code}. Restarting in {delay}s.")
+            return
+
+        if now >= self.next_start:
+            if self.failures:
+                METRICS.inc("worker_restarts_total", account=self.account["NAME"], script=self.script)
+            try:
+                self.start()
+            except Exception as e:
+                self.failures += 1
+                delay = min(RESTART_BACKOFF_MAX_SECONDS, RESTART_BACKOFF_BASE_SECONDS * 2 ** (self.failures - 1))
+                self.next_start = now + delay
+                logging.error(f"Failed to start worker {self.name}: {e}. Retrying in {delay}s.")
+
+    def stop(self):
+        """Σταματά τη διεργασία (SIGTERM και, αν δεν τερματίσει, SIGKILL)."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            logging.warning(f"Worker {self.name} did not stop in {SHUTDOWN_TIMEOUT_SECONDS}s, killing it.")
+            self.process.kill()
+            self.process.wait()
+        METRICS.set("worker_up", 0, account=self.account["NAME"], script=self.script)
+        logging.info(f"Stopped worker {self.name}.")
+
+    def scrape(self):
+        """Διαβάζει τα metrics του worker από το HTTP endpoint του (None αν δεν είναι διαθέσιμα)."""
+        if self.process is None:
+            return None
+        try:
+            with urlopen(f"http://127.0.0.1:{self.metrics_port}/metrics", timeout=WORKER_SCRAPE_TIMEOUT_SECONDS) as response:
+                return response.read().decode("utf-8")
+        except Exception as e:
+            logging.debug(f"Could not scrape metrics of worker {self.name}: {e}")
+            return None
+
+
+def build_workers(accounts):
+    """Δημιουργεί έναν worker για κάθε script κάθε λογαριασμού, με διαδοχικές θύρες metrics."""
+    workers = []
+    for account in accounts:
+        for script in account["SCRIPTS"]:
+            workers.append(Worker(account, script, WORKER_METRICS_BASE_PORT + len(workers)))
+    return workers
+
+
+# Οι workers που επιβλέπονται (διαβάζονται και από το HTTP endpoint)
+WORKERS = []
+
+
+
+
+# 4. ---------------------- Statistics ----------------------
+# Τελευταία συγκεντρωτικά στατιστικά (για το /statistics)
+latest_statistics = {}
+
+
+def collect_statistics(accounts):
+    """
+    Αθροίζει τα statistics από τα αρχεία παραγγελιών του main bot κάθε λογαριασμού
+    (ένα αρχείο ανά grid) και τα επιστρέφει ανά λογαριασμό και συνολικά.
+    """
+    per_account = {}
+    totals = {"total_buys": 0, "total_sells": 0, "net_profit": 0.0}
+    for account in accounts:
+        account_totals = {"total_buys": 0, "total_sells": 0, "net_profit": 0.0}
+        for file_path in glob.glob(os.path.join(account["HOME"], "main_open_orders*")):
+            if os.path.splitext(file_path)[1] not in STATE_FORMATS:
+                continue  # π.χ. .tmp / .bak
+            try:
+                statistics = load_state(file_path)[1].get("statistics", {})
+            except Exception as e:
+                logging.warning(f"Could not read statistics from {file_path}: {e}")
+                continue
+            for key in account_totals:
+                account_totals[key] += statistics.get(key, 0)
+
+        per_account[account["NAME"]] = account_totals
+        for key, value in account_totals.items():
+            totals[key] += value
+            METRICS.set(key, value, account=account["NAME"])
+
+    return {"accounts": per_account, "totals": totals}
+
+
+
+
+# 5. ---------------------- Supervisor Loop ----------------------
+def run_supervisor():
+    """Ξεκινά όλους τους workers, τους επανεκκινεί όταν τερματίσουν και τους σταματά με SIGTERM/SIGINT."""
+    global latest_statistics
+
+    accounts = load_accounts()
+    WORKERS[:] = build_workers(accounts)
+    logging.info(f"Supervising {len(WORKERS)} workers for {len(accounts)} accounts.")
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop_event.set())
+
+    start_metrics_server(METRICS_HTTP_PORT)
+    next_statistics = 0.0
+    try:
+        while not stop_event.is_set():
+            now = time.monotonic()
+            for worker in WORKERS:
+                worker.poll(now)
+
+            if now >= next_statistics:
+                latest_statistics = collect_statistics(accounts)
+                totals = latest_statistics["totals"]
+                logging.info(f"Totals across {len(accounts)} accounts: buys={totals['total_buys']}, "
+                             f"sells={totals['total_sells']}, net_profit={totals['net_profit']:.4f}")
+                next_statistics = now + STATISTICS_INTERVAL_SECONDS
+
+            stop_event.wait(POLL_INTERVAL_SECONDS)
+    finally:
+        logging.info("Stopping workers...")
+        for worker in WORKERS:
+            worker.stop()
+
+
+
+if __name__ == "__main__":
+    try:
+        run_supervisor()
+    except Exception as e:
+        logging.error(f"Supervisor stopped with an error: {e}", exc_info=True)
+        sys.exit(1)
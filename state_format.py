@@ -0,0 +1,419 @@
+# Μορφή και μεταφορά (migration) των αρχείων κατάστασης των bots (main_open_orders.json, worker_open_orders.json).
+#
+# Ιστορικό εκδόσεων (πεδίο "version", που γράφεται από την έκδοση 3):
+#   1: "orders" ως dict τιμή -> παραγγελία (ή λίστα, από το παλιό convert.py), "statistics" μόνο με
+#      total_buys / total_sells / net_profit και στο αρχείο του worker
+#   2: statistics από το ledger εκτελέσεων (lots, realized_pnl, fees), clientOrderId στις παραγγελίες,
+#      αρχείο worker χωρίς statistics
+#   3: lots με χρόνο ανοίγματος, ωριαία / ημερήσια rollups, πεδίο "version"
+#
+# Η μορφή ορίζεται από την κατάληξη του αρχείου (βλ. STATE_FORMATS): ".json" ή ".msgpack" (συμπαγές binary
+# snapshot, απαιτεί το msgpack). Τα bots φορτώνουν / αποθηκεύουν ολόκληρο το αρχείο (load_state / save_state),
+# ενώ το convert.py διαβάζει και γράφει σειριακά (μία παραγγελία τη φορά), χωρίς όλο το αρχείο στη μνήμη.
+import json
+import os
+import shutil
+
+try:
+    import orjson  # Γρηγορότερο JSON, αν είναι εγκατεστημένο
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Χωρίς msgpack υποστηρίζονται μόνο αρχεία .json
+    msgpack = None
+
+STATE_VERSION = 3
+
+
+class StateFileError(ValueError):
+    """Ένα αρχείο κατάστασης δεν μπορεί να διαβαστεί (κατεστραμμένο ή σε μη υποστηριζόμενη μορφή)."""
+
+# Τα πεδία κάθε παραγγελίας όπως τα αποθηκεύουν τα bots
+ORDER_FIELDS = ("id", "clientOrderId", "symbol", "price", "side", "status", "amount", "remaining", "datetime", "timestamp")
+
+# Τα statistics της έκδοσης 1 (χωρίς ledger), που κρατιούνται ως legacy_* όταν το ledger ξεκινά από το μηδέν
+LEGACY_STATISTICS = ("total_buys", "total_sells", "net_profit")
+
+# Μέγεθος (χαρακτήρες) κάθε ανάγνωσης από το αρχείο
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class JsonStreamReader:
+    """
+    Σειριακός αναγνώστης JSON πάνω στο json.JSONDecoder.raw_decode: διαβάζει το αρχείο σε κομμάτια
+    και αποκωδικοποιεί μία τιμή τη φορά, οπότε στη μνήμη βρίσκεται μόνο η τρέχουσα τιμή.
+    """
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Ο επόμενος χαρακτήρας που δεν είναι κενό (χωρίς να καταναλωθεί)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input.")
+
+    def expect(self, chars):
+        """Καταναλώνει τον επόμενο χαρακτήρα, που πρέπει να είναι ένας από τους chars, και τον επιστρέφει."""
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} but found {char!r}.")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Αποκωδικοποιεί ολόκληρη την επόμενη τιμή."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # Μια τιμή που φτάνει στο τέλος του buffer μπορεί να συνεχίζεται (π.χ. αριθμός)
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def iter_object(self):
+        """Διατρέχει ένα object και δίνει κάθε κλειδί του· ο καλών διαβάζει την τιμή (value() ή iter_*)."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def iter_array(self):
+        """Διατρέχει ένα array και δίνει κάθε στοιχείο του αποκωδικοποιημένο."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_json_state(f):
+    """
+    Διαβάζει σειριακά ένα αρχείο κατάστασης JSON και δίνει τα τμήματά του ως (όνομα, τιμή):
+    ("orders_format", "dict" | "list"), ("order", (τιμή, παραγγελία)) για κάθε παραγγελία,
+    και (κλειδί, τιμή) για τα υπόλοιπα κλειδιά ("version", "statistics", ...).
+    """
+    reader = JsonStreamReader(f)
+    for key in reader.iter_object():
+        if key != "orders":
+            yield key, reader.value()
+        elif reader.peek() == "[":
+            yield "orders_format", "list"
+            for order in reader.iter_array():
+                yield "order", (float(order["price"]), order)
+        else:
+            yield "orders_format", "dict"
+            for price in reader.iter_object():
+                yield "order", (float(price), reader.value())
+
+
+def durable_replace(f, temp_file_path, file_path):
+    """
+    Ολοκληρώνει μια αποθήκευση: fsync και κλείσιμο του (ανοιχτού) προσωρινού αρχείου f, αντικατάσταση του
+    τελικού και fsync του φακέλου, ώστε μετά από διακοπή ρεύματος να υπάρχει είτε το παλιό είτε το νέο αρχείο.
+    """
+    try:
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+    os.replace(temp_file_path, file_path)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+    except OSError:  # π.χ. στα Windows οι φάκελοι δεν ανοίγουν έτσι· το os.replace αρκεί
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class JsonStateWriter:
+    """
+    Γράφει σειριακά ένα αρχείο κατάστασης JSON στη μορφή των bots, σε προσωρινό αρχείο που αντικαθιστά
+    το τελικό στο close(). Οι παραγγελίες γράφονται αμέσως, τα statistics και τα υπόλοιπα κλειδιά στο τέλος.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._temp_path = file_path + ".tmp"
+        self._f = open(self._temp_path, "w")
+        self._f.write(f'{{\n    "version": {STATE_VERSION},\n    "orders": {{')
+        self._first = True
+
+    def write_order(self, price, order):
+        entry = json.dumps(order, indent=4).replace("\n", "\n        ")
+        self._f.write(f'{"" if self._first else ","}\n        {json.dumps(str(price))}: {entry}')
+        self._first = False
+
+    def close(self, statistics=None, extra=None):
+        self._f.write("\n    }" if not self._first else "}")
+        sections = dict(extra or {})
+        if statistics is not None:
+            sections["statistics"] = statistics
+        for key, value in sections.items():
+            self._f.write(f",\n    {json.dumps(key)}: " + json.dumps(value, indent=4).replace("\n", "\n    "))
+        self._f.write("\n}\n")
+        durable_replace(self._f, self._temp_path, self.file_path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self._temp_path)
+
+
+# Binary snapshot (.msgpack): μια σειρά από αντικείμενα msgpack, ώστε να γράφεται και να διαβάζεται σειριακά
+# χωρίς να είναι γνωστό από πριν το πλήθος των παραγγελιών:
+#   {"version": N}, [τιμή, παραγγελία] για κάθε παραγγελία, {"statistics": ..., <υπόλοιπα κλειδιά>}
+# Οι τιμές αποθηκεύονται ως float, οπότε δεν χρειάζεται μετατροπή από string στη φόρτωση.
+def iter_msgpack_state(f):
+    """Διαβάζει σειριακά ένα binary snapshot και δίνει τα τμήματά του όπως το iter_json_state."""
+    unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+    header = next(unpacker, None)
+    if not isinstance(header, dict) or "version" not in header:
+        raise StateFileError("Missing snapshot header.")
+    yield "version", header["version"]
+    yield "orders_format", "dict"
+    for item in unpacker:
+        if isinstance(item, list):
+            yield "order", (float(item[0]), item[1])
+        else:
+            yield from item.items()
+
+
+class MsgpackStateWriter:
+    """Γράφει σειριακά ένα binary snapshot, σε προσωρινό αρχείο που αντικαθιστά το τελικό στο close()."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._temp_path = file_path + ".tmp"
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._f = open(self._temp_path, "wb")
+        self._f.write(self._packer.pack({"version": STATE_VERSION}))
+
+    def write_order(self, price, order):
+        self._f.write(self._packer.pack([float(price), order]))
+
+    def close(self, statistics=None, extra=None):
+        trailer = dict(extra or {})
+        if statistics is not None:
+            trailer["statistics"] = statistics
+        self._f.write(self._packer.pack(trailer))
+        durable_replace(self._f, self._temp_path, self.file_path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self._temp_path)
+
+
+# Μορφές αρχείων κατάστασης ανά κατάληξη: (αναγνώστης, κλάση εγγραφής, binary αρχείο)
+STATE_FORMATS = {
+    ".json": (iter_json_state, JsonStateWriter, False),
+    ".msgpack": (iter_msgpack_state, MsgpackStateWriter, True),
+}
+
+
+def state_format_for(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in STATE_FORMATS:
+        raise ValueError(f"Unsupported state file format '{extension}'. Supported: {', '.join(sorted(STATE_FORMATS))}.")
+    if extension == ".msgpack" and msgpack is None:
+        raise ValueError(f"State file {file_path} needs the msgpack package (pip install msgpack).")
+    return STATE_FORMATS[extension]
+
+
+def load_state(file_path):
+    """
+    Φορτώνει ολόκληρο ένα αρχείο κατάστασης. Επιστρέφει (παραγγελίες {τιμή: παραγγελία}, υπόλοιπα κλειδιά).
+    Πετάει FileNotFoundError αν δεν υπάρχει και StateFileError αν δεν διαβάζεται.
+    """
+    read_state, _, binary = state_format_for(file_path)
+    try:
+        if not binary:
+            with open(file_path, "rb") as f:
+                data = orjson.loads(f.read()) if orjson is not None else json.loads(f.read())
+            if not isinstance(data, dict):
+                raise StateFileError(f"{file_path} is not a state file.")
+            orders = data.pop("orders", {})
+            if isinstance(orders, list):
+                return {float(order["price"]): order for order in orders}, data
+            return {float(price): order for price, order in orders.items()}, data
+
+        orders, sections = {}, {}
+        with open(file_path, "rb") as f:
+            for section, value in read_state(f):
+                if section == "order":
+                    orders[value[0]] = value[1]
+                elif section != "orders_format":
+                    sections[section] = value
+        return orders, sections
+    except FileNotFoundError:
+        raise
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        # Τα σφάλματα αποκωδικοποίησης του json, orjson και msgpack είναι ValueError
+        raise StateFileError(f"Failed to read state file {file_path}: {e}") from e
+
+
+def save_state(file_path, orders, sections):
+    """
+    Αποθηκεύει ένα αρχείο κατάστασης (παραγγελίες {τιμή: παραγγελία} και τα υπόλοιπα κλειδιά, π.χ. statistics)
+    στη μορφή της κατάληξής του, μέσω προσωρινού αρχείου (με fsync, βλ. durable_replace).
+    """
+    _, writer_class, binary = state_format_for(file_path)
+    if binary:
+        writer = writer_class(file_path)
+        try:
+            for price, order in orders.items():
+                writer.write_order(price, order)
+            writer.close(extra=sections)
+        except BaseException:
+            writer.abort()
+            raise
+        return
+
+    data = {"version": STATE_VERSION, "orders": {str(price): order for price, order in orders.items()}, **sections}
+    content = orjson.dumps(data, option=orjson.OPT_INDENT_2) if orjson is not None else json.dumps(data, indent=4).encode()
+    temp_file_path = file_path + ".tmp"
+    f = open(temp_file_path, "wb")
+    try:
+        f.write(content)
+    except BaseException:
+        f.close()
+        raise
+    durable_replace(f, temp_file_path, file_path)
+
+
+def statistics_version(statistics):
+    """Η έκδοση στην οποία αντιστοιχούν τα statistics ενός αρχείου (None αν δεν υπάρχουν)."""
+    if statistics is None:
+        return None
+    if "lots" not in statistics:
+        return 1
+    if "rollups" not in statistics:
+        return 2
+    return 3
+
+
+def migrate_order(price, order):
+    """Μια παραγγελία οποιασδήποτε έκδοσης με όλα τα ORDER_FIELDS (όσα λείπουν γίνονται None)."""
+    migrated = {field: order.get(field) for field in ORDER_FIELDS}
+    migrated["price"] = float(order.get("price") or price)
+    return migrated
+
+
+def legacy_statistics(statistics):
+    """Τα statistics με τους μετρητές και το net_profit της έκδοσης 1 μετονομασμένα σε legacy_* (αν δεν υπάρχουν ήδη)."""
+    statistics = dict(statistics)
+    for key in LEGACY_STATISTICS:
+        if key in statistics:
+            statistics.setdefault(f"legacy_{key}", statistics.pop(key))
+    return statistics
+
+
+def migrate_statistics(statistics, kind):
+    """Τα statistics στην έκδοση STATE_VERSION. Το αρχείο του worker δεν κρατά statistics από την έκδοση 2."""
+    if kind == "worker" or statistics is None:
+        return None
+    statistics = dict(statistics)
+    if "lots" not in statistics:
+        # 1 -> 2: χωρίς ledger τα παλιά σύνολα δεν αντιστοιχούν σε lots, οπότε (όπως και το ProfitLedger)
+        # το ledger ξεκινά από το μηδέν· οι παλιοί μετρητές και το net_profit κρατιούνται ως legacy_*
+        statistics = legacy_statistics(statistics)
+        statistics.update({"total_buys": 0, "total_sells": 0, "net_profit": 0.0, "realized_pnl": 0.0, "fees": 0.0})
+        statistics["lots"] = {"long": [], "short": []}
+    # 2 -> 3: χρόνος ανοίγματος στα lots (άγνωστος για τα παλιά) και κενά rollups
+    statistics["lots"] = {
+        direction: [list(lot) + [None] * (4 - len(lot)) for lot in statistics["lots"].get(direction, [])]
+        for direction in ("long", "short")
+    }
+    statistics.setdefault("closed_qty", 0.0)
+    statistics.setdefault("hold_seconds", 0.0)
+    statistics.setdefault("rollups", {"hourly": {}, "daily": {}})
+    return statistics
+
+
+def state_kind(file_path):
+    """Το είδος ενός αρχείου κατάστασης από το όνομά του: "worker" ή "main"."""
+    return "worker" if "worker" in os.path.basename(file_path) else "main"
+
+
+def migrate_state_file(source, destination=None, kind=None):
+    """
+    Μεταφέρει ένα αρχείο κατάστασης στην έκδοση STATE_VERSION και στη μορφή της κατάληξης του destination
+    (ίδιο αρχείο αν δεν δοθεί, με αντίγραφο ασφαλείας source + ".bak"). Επιστρέφει (αρχική έκδοση, πλήθος παραγγελιών).
+    """
+    destination = destination or source
+    kind = kind or state_kind(source)
+    read_state, _, binary = state_format_for(source)
+    _, writer_class, _ = state_format_for(destination)
+
+    if os.path.abspath(destination) == os.path.abspath(source):
+        shutil.copy2(source, source + ".bak")
+
+    explicit_version = None
+    versions = []
+    statistics = None
+    extra = {}
+    orders = 0
+    writer = writer_class(destination)
+    try:
+        with open(source, "rb" if binary else "r") as f:
+            for section, value in read_state(f):
+                if section == "order":
+                    writer.write_order(value[0], migrate_order(*value))
+                    orders += 1
+                elif section == "orders_format":
+                    versions.append(1 if value == "list" else 2)
+                elif section == "version":
+                    explicit_version = value
+                elif section == "statistics":
+                    statistics = value
+                else:
+                    extra[section] = value
+        writer.close(migrate_statistics(statistics, kind), extra)
+    except BaseException:
+        writer.abort()
+        raise
+
+    if explicit_version is None:
+        if kind == "worker":
+            versions.append(1 if statistics is not None else 2)
+        elif statistics is not None:
+            versions.append(statistics_version(statistics))
+    from_version = explicit_version or min(versions, default=STATE_VERSION)
+    return from_version, orders
@@ -0,0 +1,187 @@
+# Τοπικό αρχείο εκτελέσεων και γεγονότων παραγγελιών, κοινό για grid-bot.py, grid-adjustment.py και το dashboard.
+#
+# Κάθε γεγονός είναι μια εγγραφή σταθερού μεγέθους (RECORD_SIZE bytes) σε ένα αρχείο ανά ζεύγος και ημέρα (UTC):
+#   <root>/<ζεύγος>/<YYYY-MM-DD>.bin
+# Οι εγγραφές μόνο προστίθενται στο τέλος του αρχείου, οπότε ένα αρχείο διαβάζεται απευθείας ως πίνακας
+# (np.memmap με το RECORD_DTYPE όταν υπάρχει numpy, αλλιώς struct.iter_unpack) χωρίς parsing.
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy as np
+except ImportError:  # Το numpy είναι προαιρετικό: χωρίς αυτό οι στήλες επιστρέφονται ως λίστες
+    np = None
+
+
+# timestamp (ms), price, amount, fee, pnl, order_id, side, event, padding σε πολλαπλάσιο του 8
+RECORD_FORMAT = "<qddddqbb6x"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RECORD_FIELDS = ("timestamp", "price", "amount", "fee", "pnl", "order_id", "side", "event")
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ("timestamp", "<i8"), ("price", "<f8"), ("amount", "<f8"), ("fee", "<f8"), ("pnl", "<f8"),
+        ("order_id", "<i8"), ("side", "i1"), ("event", "i1"), ("_padding", "V6"),
+    ])
+
+# Κωδικοί γεγονότων και πλευρών όπως αποθηκεύονται
+EVENTS = {"fill": 0, "placed": 1, "canceled": 2, "amended": 3}
+SIDES = {"buy": 1, "sell": -1}
+
+# Διάρκεια (σε ms) των διαστημάτων του aggregate
+BUCKET_MS = {"hour": 3600 * 1000, "day": 86400 * 1000}
+
+
+def market_key(symbol):
+    """Το όνομα του φακέλου ενός ζεύγους (π.χ. "XRP/USDT" -> "XRPUSDT")."""
+    return "".join(c for c in symbol if c.isalnum())
+
+
+def numeric_order_id(order_id):
+    """Τα IDs του Binance είναι αριθμοί και αποθηκεύονται ως int64· τα υπόλοιπα (π.χ. mock) ως 0."""
+    return int(order_id) if isinstance(order_id, (int, str)) and str(order_id).isdigit() else 0
+
+
+class TradeArchive:
+    """
+    Αρχείο εκτελέσεων και γεγονότων παραγγελιών με στήλες σταθερού μεγέθους, χωρισμένο ανά ημέρα.
+    Η append() δεν πετάει ποτέ σφάλμα (το αρχείο δεν πρέπει να σταματά το trading)· οι query() και aggregate()
+    διαβάζουν μόνο τα αρχεία των ημερών του διαστήματος.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _partition_path(self, symbol, timestamp):
+        day = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+        return os.path.join(self.root, market_key(symbol), f"{day}.bin")
+
+    def append(self, symbol, event, side, price, amount, fee=0.0, pnl=0.0, order_id=None, timestamp=None):
+        """Προσθέτει ένα γεγονός ("fill", "placed", "canceled", "amended") με ένα write στο αρχείο της ημέρας του."""
+        timestamp = int(timestamp or time.time() * 1000)
+        try:
+            record = struct.pack(
+                RECORD_FORMAT, timestamp, float(price), float(amount), float(fee or 0.0), float(pnl or 0.0),
+                numeric_order_id(order_id), SIDES.get(side, 0), EVENTS[event],
+            )
+            path = self._partition_path(symbol, timestamp)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # O_APPEND: κάθε εγγραφή γράφεται ολόκληρη στο τέλος, ακόμη κι αν γράφουν δύο processes
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+        except (OSError, ValueError, TypeError, KeyError, struct.error) as e:
+            logging.warning(f"Failed to archive {event} event for {symbol}: {e}")
+
+    def _partitions(self, symbol, start, end):
+        """Τα υπάρχοντα αρχεία ημερών του ζεύγους που επικαλύπτουν το [start, end) (ms, None = χωρίς όριο)."""
+        folder = os.path.join(self.root, market_key(symbol))
+        try:
+            names = sorted(name for name in os.listdir(folder) if name.endswith(".bin"))
+        except FileNotFoundError:
+            return []
+        first = datetime.fromtimestamp(start / 1000, tz=timezone.utc).strftime("%Y-%m-%d") if start is not None else None
+        last = datetime.fromtimestamp((end - 1) / 1000, tz=timezone.utc).strftime("%Y-%m-%d") if end is not None else None
+        return [
+            os.path.join(folder, name) for name in names
+            if (first is None or name[:10] >= first) and (last is None or name[:10] <= last)
+        ]
+
+    def _read_partition(self, path):
+        """Οι εγγραφές ενός αρχείου ημέρας· μια μισογραμμένη τελευταία εγγραφή αγνοείται."""
+        count = os.path.getsize(path) // RECORD_SIZE
+        if np is not None:
+            if count == 0:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+        with open(path, "rb") as f:
+            data = f.read(count * RECORD_SIZE)
+        return list(struct.iter_unpack(RECORD_FORMAT, data))
+
+    def query(self, symbol, start=None, end=None, event=None, side=None):
+        """
+        Τα γεγονότα του ζεύγους στο [start, end) (timestamps σε ms), προαιρετικά μόνο ενός είδους / μιας πλευράς.
+        Επιστρέφει στήλες: {"timestamp": ..., "price": ..., ...}, ως numpy arrays αν υπάρχει numpy, αλλιώς ως λίστες.
+        """
+        event_code = EVENTS[event] if event is not None else None
+        side_code = SIDES[side] if side is not None else None
+        partitions = [self._read_partition(path) for path in self._partitions(symbol, start, end)]
+
+        if np is not None:
+            records = np.concatenate(partitions) if partitions else np.empty(0, dtype=RECORD_DTYPE)
+            mask = np.ones(len(records), dtype=bool)
+            if start is not None:
+                mask &= records["timestamp"] >= start
+            if end is not None:
+                mask &= records["timestamp"] < end
+            if event_code is not None:
+                mask &= records["event"] == event_code
+            if side_code is not None:
+                mask &= records["side"] == side_code
+            selected = records[mask]
+            return {field: np.asarray(selected[field]) for field in RECORD_FIELDS}
+
+        columns = {field: [] for field in RECORD_FIELDS}
+        for records in partitions:
+            for record in records:
+                if start is not None and record[0] < start or end is not None and record[0] >= end:
+                    continue
+                if event_code is not None and record[7] != event_code or side_code is not None and record[6] != side_code:
+                    continue
+                for field, value in zip(RECORD_FIELDS, record):
+                    columns[field].append(value)
+        return columns
+
+    def aggregate(self, symbol, start=None, end=None, bucket="day"):
+        """
+        Σύνολα των εκτελέσεων ανά ώρα ή ημέρα (UTC) στο [start, end): πλήθος buy / sell, όγκος, αξία,
+        fees και πραγματοποιημένο κέρδος. Επιστρέφει λίστα από dicts, ταξινομημένη κατά διάστημα.
+        """
+        width = BUCKET_MS[bucket]
+        fills = self.query(symbol, start, end, event="fill")
+        if not len(fills["timestamp"]):
+            return []
+
+        if np is not None:
+            keys = fills["timestamp"] // width
+            buckets, index = np.unique(keys, return_inverse=True)
+            sums = {
+                "buys": np.bincount(index, weights=fills["side"] == SIDES["buy"], minlength=len(buckets)),
+                "sells": np.bincount(index, weights=fills["side"] == SIDES["sell"], minlength=len(buckets)),
+                "volume": np.bincount(index, weights=fills["amount"], minlength=len(buckets)),
+                "notional": np.bincount(index, weights=fills["amount"] * fills["price"], minlength=len(buckets)),
+                "fees": np.bincount(index, weights=fills["fee"], minlength=len(buckets)),
+                "pnl": np.bincount(index, weights=fills["pnl"], minlength=len(buckets)),
+            }
+            return [
+                {
+                    "start": int(key * width),
+                    "buys": int(sums["buys"][i]),
+                    "sells": int(sums["sells"][i]),
+                    **{name: float(sums[name][i]) for name in ("volume", "notional", "fees", "pnl")},
+                }
+                for i, key in enumerate(buckets)
+            ]
+
+        rows = {}
+        for timestamp, price, amount, fee, pnl, side in zip(
+            fills["timestamp"], fills["price"], fills["amount"], fills["fee"], fills["pnl"], fills["side"]
+        ):
+            row = rows.setdefault(timestamp // width, {"buys": 0, "sells": 0, "volume": 0.0, "notional": 0.0, "fees": 0.0, "pnl": 0.0})
+            row["buys" if side == SIDES["buy"] else "sells"] += 1
+            row["volume"] += amount
+            row["notional"] += amount * price
+            row["fees"] += fee
+            row["pnl"] += pnl
+        return [{"start": key * width, **row} for key, row in sorted(rows.items())]
+
+
+def day_start(days_ago=0):
+    """Timestamp (ms) της αρχής της ημέρας (UTC) πριν από days_ago ημέρες, για τα όρια των query."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((today - timedelta(days=days_ago)).timestamp() * 1000)